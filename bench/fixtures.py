@@ -0,0 +1,85 @@
+# imports - fixtures.py, by McSnurtle
+import functools
+import random
+
+from typing import Callable, Optional
+
+# ===== Variables =====
+# (ID, name, chapters) of every book, in canonical order and named the way bible-api.com names them
+CANON: list[tuple[str, str, int]] = [
+    ("GEN", "Genesis", 50), ("EXO", "Exodus", 40), ("LEV", "Leviticus", 27), ("NUM", "Numbers", 36),
+    ("DEU", "Deuteronomy", 34), ("JOS", "Joshua", 24), ("JDG", "Judges", 21), ("RUT", "Ruth", 4),
+    ("1SA", "1 Samuel", 31), ("2SA", "2 Samuel", 24), ("1KI", "1 Kings", 22), ("2KI", "2 Kings", 25),
+    ("1CH", "1 Chronicles", 29), ("2CH", "2 Chronicles", 36), ("EZR", "Ezra", 10), ("NEH", "Nehemiah", 13),
+    ("EST", "Esther", 10), ("JOB", "Job", 42), ("PSA", "Psalms", 150), ("PRO", "Proverbs", 31),
+    ("ECC", "Ecclesiastes", 12), ("SNG", "Song of Solomon", 8), ("ISA", "Isaiah", 66), ("JER", "Jeremiah", 52),
+    ("LAM", "Lamentations", 5), ("EZK", "Ezekiel", 48), ("DAN", "Daniel", 12), ("HOS", "Hosea", 14),
+    ("JOL", "Joel", 3), ("AMO", "Amos", 9), ("OBA", "Obadiah", 1), ("JON", "Jonah", 4), ("MIC", "Micah", 7),
+    ("NAM", "Nahum", 3), ("HAB", "Habakkuk", 3), ("ZEP", "Zephaniah", 3), ("HAG", "Haggai", 2),
+    ("ZEC", "Zechariah", 14), ("MAL", "Malachi", 4), ("MAT", "Matthew", 28), ("MRK", "Mark", 16),
+    ("LUK", "Luke", 24), ("JHN", "John", 21), ("ACT", "Acts", 28), ("ROM", "Romans", 16),
+    ("1CO", "1 Corinthians", 16), ("2CO", "2 Corinthians", 13), ("GAL", "Galatians", 6), ("EPH", "Ephesians", 6),
+    ("PHP", "Philippians", 4), ("COL", "Colossians", 4), ("1TH", "1 Thessalonians", 5),
+    ("2TH", "2 Thessalonians", 3), ("1TI", "1 Timothy", 6), ("2TI", "2 Timothy", 4), ("TIT", "Titus", 3),
+    ("PHM", "Philemon", 1), ("HEB", "Hebrews", 13), ("JAS", "James", 5), ("1PE", "1 Peter", 5), ("2PE", "2 Peter", 3),
+    ("1JN", "1 John", 5), ("2JN", "2 John", 1), ("3JN", "3 John", 1), ("JUD", "Jude", 1), ("REV", "Revelation", 22)
+]
+WORDS: list[str] = (
+    "and the of that unto he shall lord his they be is him them not in it all thou thy which was for god said "
+    "i have will ye from as with were upon people house day son came earth land king before had hand even out "
+    "there then father one also are over up israel children against when make man now at go great say name"
+).split()
+
+
+# ===== Classes =====
+class Fixture:
+    """The books and verses of one translation, served by `server.FakeApi` in place of bible-api.com's.
+
+    Chapters come from `loader` on demand and are remembered, so a synthetic Bible costs nothing until it's read."""
+    translation: str
+    name: str
+    books: list[dict]
+
+    def __init__(self, translation: str, name: str, books: list[dict],
+                 loader: Callable[[str, int], Optional[list[dict]]]):
+        self.translation = translation.lower()
+        self.name = name
+        self.books = books  # {"id", "name", "chapters"} of each book, in order
+        self._positions: dict[str, int] = {book["id"]: idx for idx, book in enumerate(books)}
+        self.chapter = functools.lru_cache(maxsize=None)(loader)
+
+    @classmethod
+    def synthetic(cls, translation: str = "kjv", seed: int = 0) -> "Fixture":
+        """A made up translation with the real books and chapter counts, and 10 to 40 verses of filler per chapter.
+        The same `seed` always makes the same text, so runs can be compared."""
+        books: list[dict] = [{"id": book_id, "name": name, "chapters": chapters} for book_id, name, chapters in CANON]
+        names: dict[str, str] = {book_id: name for book_id, name, chapters in CANON}
+        counts: dict[str, int] = {book_id: chapters for book_id, name, chapters in CANON}
+
+        def loader(book: str, chapter: int) -> Optional[list[dict]]:
+            if not 0 < chapter <= counts.get(book, 0):
+                return None
+            rng = random.Random(f"{seed}:{translation}:{book}:{chapter}")
+            return [{"book_id": book, "book_name": names[book], "chapter": chapter, "verse": verse,
+                     "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))).capitalize() + ".\n"}
+                    for verse in range(1, rng.randint(10, 40) + 1)]
+
+        return cls(translation, f"Synthetic {translation.upper()}", books, loader)
+
+    @classmethod
+    def from_bundle(cls, path: str) -> "Fixture":
+        """Real text, from a translation downloaded with `bible download <translation>`."""
+        from utils.bundle import Bundle
+
+        bundle = Bundle(path)
+        books: list[dict] = [{"id": book["id"], "name": book["name"], "chapters": len(book["chapters"])}
+                             for book in bundle.books]
+        return cls(bundle.translation, bundle.translation.upper(), books, bundle.chapter)
+
+    def book(self, book: str) -> Optional[dict]:
+        """Returns the book with the canonical ID `book`, if there is one."""
+        return self.books[self._positions[book]] if book in self._positions else None
+
+    @property
+    def chapter_counts(self) -> dict[str, int]:
+        return {book["id"]: book["chapters"] for book in self.books}
@@ -0,0 +1,484 @@
+# imports - run.py, by McSnurtle
+"""Benchmarks of the hot paths of cli-bible, run against the fake services of `server.py` rather than the real ones.
+
+Every case runs in a fresh interpreter with an empty cache and a config of its own, so one case's warm caches never
+flatter the next. Requests go through the same rate limiters as always, but with their limits lifted: otherwise every
+request benchmark would just measure bible-api.com's 15 requests per 30 seconds. The "throttled" case measures the
+cost of being limited instead.
+
+    python bench/run.py                          # every case
+    python bench/run.py --only frame,references  # just these
+    python bench/run.py --quick --json new.json  # fewer iterations, and keep the numbers...
+    python bench/run.py --compare new.json       # ...to see what changed since
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Callable, Optional
+
+BENCH_DIR: str = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR: str = os.path.join(BENCH_DIR, "..", "src", "cli_bible")
+sys.path[:0] = [BENCH_DIR, SOURCE_DIR]
+
+# ===== Variables =====
+TRANSLATION: str = "kjv"
+UNLIMITED: int = 1_000_000
+REFERENCES: list[str] = [
+    "gen 1", "Genesis 1:1", "matt 6:3-5,8", "1 John 3", "Song of Solomon 2", "John 3:16-4:2", "Gen 1; Exo 2",
+    "ps 23", "II Kings 2:11", "rev 22:21", "1cor13", "First Thessalonians 4:13-18", "jud 1:3", "phil 4:6-7",
+    "Ecclesiastes 3:1-8", "psalm 119:105", "Mk 1:1-8", "hb 2:4", "Lamentations 3:22-23,25"
+]
+MISSPELLINGS: list[str] = ["genisis", "mathew", "1 jhon", "revelations", "pslams", "exodsu", "phillipians",
+                           "eclesiastes", "habakuk", "1 thesalonians"]
+CASES: dict[str, tuple[Callable[[argparse.Namespace], list[dict]], dict, dict]] = {}
+
+
+# ===== Functions =====
+def case(name: str, server: Optional[dict] = None, config: Optional[dict] = None) -> Callable:
+    """Register a benchmark, run with the fake server set up as `server` and with `config` merged into its
+    `etc/conf.json`."""
+
+    def register(function: Callable[[argparse.Namespace], list[dict]]) -> Callable:
+        CASES[name] = (function, server or {}, config or {})
+        return function
+
+    return register
+
+
+def result(name: str, samples: list[float], total: Optional[float] = None, **extra) -> dict:
+    """Summarise the seconds each of `samples` took. `total` is the wall time of all of them, if it isn't their sum
+    (i.e. when they overlap, or there's work between them)."""
+    ordered: list[float] = sorted(samples)
+
+    def percentile(percent: float) -> float:
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+    total = total if total is not None else sum(samples)
+    return {"name": name, "n": len(samples), "total": total, "ops": len(samples) / total if total else 0,
+            "mean": statistics.fmean(samples), "p50": percentile(50), "p90": percentile(90), "p99": percentile(99),
+            **extra}
+
+
+def timed(function: Callable, *args, **kwargs) -> tuple[float, object]:
+    start: float = time.perf_counter()
+    value = function(*args, **kwargs)
+    return time.perf_counter() - start, value
+
+
+def unthrottle() -> None:
+    """Lift the client side rate limits, see the module docstring."""
+    from utils import getter
+
+    for limiter in (getter.scheduler, *getter._schedulers.values()):
+        limiter.limit = UNLIMITED
+
+
+def walk(step: Callable[[str, int], tuple[int, dict]], book: str, chapter: int, count: int,
+         between: Optional[Callable[[str, int], None]] = None) -> list[float]:
+    """Turn `count` pages with `step`, starting from `book` `chapter`. Returns how long each page turn took."""
+    samples: list[float] = []
+    for _ in range(count):
+        seconds, (code, response) = timed(step, book, chapter)
+        if code != 200:
+            raise RuntimeError(f"Page turn after {book} {chapter} failed with {code}")
+        samples.append(seconds)
+        first: dict = response["verses"][0]
+        book, chapter = first["book_id"], int(first["chapter"])
+        if between is not None:
+            between(book, chapter)
+    return samples
+
+
+class FakeWindow:
+    """Just enough of a curses window for a `ScrollableFrame`, counting what's drawn rather than drawing it."""
+
+    def __init__(self, height: int, width: int, *args):
+        self.height, self.width = height, width
+        self.cells: int = 0
+
+    def addstr(self, y: int, x: int, text: str, *args) -> None:
+        self.cells += len(text)
+
+    def erase(self) -> None:
+        self.cells += self.height * self.width
+
+    def scroll(self, lines: int = 1) -> None:
+        pass
+
+    def border(self, *args) -> None:
+        self.cells += 2 * (self.height + self.width)
+
+    def scrollok(self, flag: bool) -> None:
+        pass
+
+    def idlok(self, flag: bool) -> None:
+        pass
+
+    def setscrreg(self, top: int, bottom: int) -> None:
+        pass
+
+    def noutrefresh(self) -> None:
+        pass
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+
+def fake_frame(lines: list[str], width: int = 100, height: int = 40):
+    import curses
+    from widgets import ScrollableFrame
+
+    curses.newwin = FakeWindow  # a real window needs a real terminal
+    return ScrollableFrame(None, 0, 0, width, height, lines)
+
+
+def draw(widget) -> None:
+    """Redraw `widget` if it needs it, as `Screen.update()` does."""
+    if widget.needs_redraw():
+        widget.update()
+        widget.validate()
+
+
+# ===== Cases =====
+@case("next_chapter", server={"latency": 0.005})
+def next_chapter(args: argparse.Namespace) -> list[dict]:
+    """Page turns through `getter.get_next_chapter()`, from bible-api.com, then from the cache, and through the
+    `Prefetcher` while "reading" for a little while between page turns."""
+    from utils import getter
+    from utils.prefetch import Prefetcher
+
+    count: int = 20 if args.quick else 80
+    canon_seconds, _ = timed(getter.get_canon, TRANSLATION)
+    unthrottle()
+
+    def step(book: str, chapter: int) -> tuple[int, dict]:
+        return getter.get_next_chapter(TRANSLATION, book, chapter, 1)
+
+    results: list[dict] = [result("canon (cold)", [canon_seconds]),
+                           result("get_next_chapter (cold)", walk(step, "GEN", 1, count)),
+                           result("get_next_chapter (cached)", walk(step, "GEN", 1, count))]
+
+    prefetcher = Prefetcher(TRANSLATION, window=1)
+    hits: int = 0
+
+    def prefetched_step(book: str, chapter: int) -> tuple[int, dict]:
+        nonlocal hits
+        target = getter.get_canon(TRANSLATION).step(book, chapter, 1)
+        hits += target is not None and prefetcher.get(*target) is not None
+        return prefetcher.get_next_chapter(book, chapter, 1)
+
+    def read(book: str, chapter: int) -> None:
+        prefetcher.focus(book, chapter)
+        time.sleep(0.03)  # long enough to read a chapter, by the server's standards
+
+    prefetcher.focus("ISA", 1)
+    samples: list[float] = walk(prefetched_step, "ISA", 1, count, between=read)
+    prefetcher.stop()
+    results.append(result("Prefetcher.get_next_chapter (cold)", samples, hit_ratio=round(hits / count, 2)))
+    return results
+
+
+@case("backends", server={"latency": 0.005, "jitter": 0.1},
+      config={"backends": {"order": ["bible-api", "jsdelivr"]}})
+def backends(args: argparse.Namespace) -> list[dict]:
+    """Chapters from `backends.fetch_chapter()` against a server with a long latency tail, so hedging kicks in."""
+    from utils import getter
+    from utils.backends import get_backends
+
+    count: int = 20 if args.quick else 80
+    getter.get_canon(TRANSLATION)
+    get_backends()
+    unthrottle()
+    samples: list[float] = walk(lambda book, chapter: getter.get_next_chapter(TRANSLATION, book, chapter, 1),
+                                "MAT", 1, count)
+    return [result("fetch_chapter (hedged)", samples,
+                   **{backend.name: str(backend.stats.p90 and round(backend.stats.p90 * 1000, 1))
+                      for backend in get_backends()})]
+
+
+@case("load_book", server={"latency": 0.005})
+def load_book(args: argparse.Namespace) -> list[dict]:
+    """Whole books streamed into a frame the way `Main.load_book()` does after `find_prompt()`: time to the first
+    chapter on screen, and to the whole book, from bible-api.com and then from the cache."""
+    from utils import getter
+    from utils.config import get_config
+    from utils.verses import Chapter
+
+    books: list[str] = ["GEN", "MAT"] if args.quick else ["GEN", "PSA", "ISA", "MAT", "ROM"]
+    batch: int = get_config().get("book_batch", 1)
+    getter.get_canon(TRANSLATION)
+    unthrottle()
+
+    results: list[dict] = []
+    for label in ("cold", "cached"):
+        firsts: list[float] = []
+        totals: list[float] = []
+        for book in books:
+            view = fake_frame([])
+            start: float = time.perf_counter()
+            final: int = getter.get_final_chapter_id(TRANSLATION, book)
+            for code, response in getter.iter_book(TRANSLATION, book, batch=batch):
+                chapter: Chapter = Chapter.from_verses(response["verses"])
+                view.lines.append(f"Chapter {chapter.number}")
+                view.lines.extend(getter.chapter_to_lines(chapter))
+                draw(view)
+                if chapter.number == 1:
+                    firsts.append(time.perf_counter() - start)
+            if chapter.number != final:
+                raise RuntimeError(f"Only loaded {chapter.number} of {final} chapters of {book}")
+            totals.append(time.perf_counter() - start)
+        results.append(result(f"load_book first chapter ({label})", firsts))
+        results.append(result(f"load_book whole book ({label})", totals))
+    return results
+
+
+@case("references")
+def references(args: argparse.Namespace) -> list[dict]:
+    """Reference resolution: `reference.parse_reference()` on its own, book names misspelt or half typed, and
+    `getter.get_raw()` once the chapters it needs are cached."""
+    from utils import getter
+    from utils.reference import complete_book, parse_reference, resolve_book
+
+    rounds: int = 50 if args.quick else 500
+    canon = getter.get_canon(TRANSLATION)
+    unthrottle()
+
+    samples: list[float] = []
+    for _ in range(rounds):
+        for reference in REFERENCES:
+            seconds, spans = timed(parse_reference, canon, reference)
+            if spans is None:
+                raise RuntimeError(f"Couldn't parse {reference}")
+            samples.append(seconds)
+    results: list[dict] = [result("parse_reference", samples)]
+
+    canon.book_index.nearest(MISSPELLINGS[0])  # builds the misspelling index, once per translation
+    samples = [timed(resolve_book, canon, text)[0] for _ in range(rounds) for text in MISSPELLINGS]
+    if any(resolve_book(canon, text) is None for text in MISSPELLINGS):
+        raise RuntimeError("A misspelling didn't resolve")
+    results.append(result("resolve_book (misspelt)", samples))
+    samples = [timed(complete_book, canon, text[:4])[0] for _ in range(rounds) for text in MISSPELLINGS]
+    results.append(result("complete_book", samples))
+
+    for reference in REFERENCES:
+        getter.get_raw(TRANSLATION, reference)  # fill the cache
+    samples = [timed(getter.get_raw, TRANSLATION, reference)[0]
+               for _ in range(max(rounds // 10, 5)) for reference in REFERENCES]
+    results.append(result("get_raw (cached)", samples))
+    return results
+
+
+@case("frame")
+def frame_updates(args: argparse.Namespace) -> list[dict]:
+    """`ScrollableFrame` layout, update and scrolling on documents of various sizes, drawn to a `FakeWindow`. "cells"
+    is how many characters each operation drew on average, which is what ends up sent to the terminal."""
+    rng = random.Random(0)
+    words: list[str] = "in the beginning god created heaven and earth was without form void darkness".split()
+    sizes: list[int] = [100, 1_000, 10_000] if args.quick else [100, 1_000, 10_000, 100_000]
+    chapter: list[str] = [" ".join(rng.choice(words) for _ in range(rng.randint(8, 60))) for _ in range(30)]
+
+    results: list[dict] = []
+    for size in sizes:
+        lines: list[str] = [" ".join(rng.choice(words) for _ in range(rng.randint(8, 60))) for _ in range(size)]
+        seconds, view = timed(fake_frame, lines)
+        layout, _ = timed(draw, view)
+        results.append(result(f"frame {size} lines: first update", [seconds + layout]))
+
+        def operation(name: str, repeat: int, action: Callable[[], None]) -> None:
+            view._window.cells = 0
+            samples: list[float] = []
+            for _ in range(repeat):
+                start: float = time.perf_counter()
+                action()
+                draw(view)
+                samples.append(time.perf_counter() - start)
+            results.append(result(f"frame {size} lines: {name}", samples, cells=view._window.cells // repeat))
+
+        def scroll(rows: int) -> None:
+            if view.rows_below:
+                view.scroll_down(rows)
+            else:
+                view.scroll_to_line(0)  # back to the top, rather than measure scrolling that goes nowhere
+
+        operation("scroll 1 row", 500, lambda: scroll(1))
+        operation("page down", 200, lambda: scroll(view.height - 2))
+        operation("append chapter", 50, lambda: view.lines.extend(chapter))
+        operation("insert chapter above", 5, lambda: view.insert_lines(0, chapter))
+        operation("delete chapter above", 5, lambda: view.delete_lines(0, len(chapter)))
+    return results
+
+
+@case("export", server={"latency": 0.005})
+def export_books(args: argparse.Namespace) -> list[dict]:
+    """`export.export()` of the first few books to a file: the first time (so fetching them, in batches), then in each
+    format once they're cached. "chapters" is how many each export wrote."""
+    from utils import export, getter
+    from utils.reference import Span
+
+    canon = getter.get_canon(TRANSLATION)
+    unthrottle()
+    spans: list[Span] = [Span(book) for book in canon.book_ids[:2 if args.quick else 5]]
+    results: list[dict] = []
+    for label, fmt in [("cold", "txt"), *(("cached", fmt) for fmt in export.FORMATS)]:
+        path: str = os.path.join(tempfile.mkdtemp(prefix="cli-bible-export-"), f"out.{fmt}")
+        seconds, chapters = timed(export.export, TRANSLATION, spans, path, fmt)
+        results.append(result(f"export {fmt} ({label})", [seconds], chapters=chapters))
+    return results
+
+
+@case("metrics")
+def metrics_overhead(args: argparse.Namespace) -> list[dict]:
+    """What `utils.metrics` costs the hot paths it's in: a `clock()` and `record()` pair, timed in batches of
+    `batch`, with metrics off and on, and `getter.get_raw()` from the cache with metrics on (see "references" for it
+    with them off)."""
+    from utils import getter, metrics
+
+    batch: int = 1_000
+    rounds: int = 50 if args.quick else 500
+
+    def pairs() -> None:
+        for _ in range(batch):
+            metrics.record("bench", metrics.clock())
+
+    results: list[dict] = []
+    for label in ("off", "on"):
+        if label == "on":
+            metrics.enable()
+        samples: list[float] = [timed(pairs)[0] / batch for _ in range(rounds)]
+        results.append(result(f"clock + record (metrics {label})", samples))
+
+    getter.get_canon(TRANSLATION)
+    unthrottle()
+    for reference in REFERENCES:
+        getter.get_raw(TRANSLATION, reference)  # fill the cache
+    samples = [timed(getter.get_raw, TRANSLATION, reference)[0]
+               for _ in range(max(rounds // 10, 5)) for reference in REFERENCES]
+    results.append(result("get_raw (cached, metrics on)", samples))
+    return results
+
+
+@case("throttled", server={"latency": 0.005, "error_rate": 0.05, "retry_after": 1})
+def throttled(args: argparse.Namespace) -> list[dict]:
+    """Page turns while the server answers 5% of requests with a 429, and while the client keeps to bible-api.com's
+    real limit, sped up from 15 per 30 seconds to 15 per second."""
+    from utils import getter
+
+    count: int = 20 if args.quick else 60
+    getter.get_canon(TRANSLATION)
+    unthrottle()
+
+    def step(book: str, chapter: int) -> tuple[int, dict]:
+        return getter.get_next_chapter(TRANSLATION, book, chapter, 1)
+
+    results: list[dict] = [result("get_next_chapter (5% 429s)", walk(step, "EXO", 1, count))]
+    getter.scheduler = getter.RequestScheduler(limit=getter.RATE_LIMIT, period=1.0)
+    results.append(result("get_next_chapter (15/s limit)", walk(step, "JOB", 1, count)))
+    return results
+
+
+# ===== Running =====
+def run_case(name: str, server_url: str, args: argparse.Namespace) -> list[dict]:
+    """Run case `name` in this interpreter, from a scratch directory holding its own `etc/conf.json`."""
+    function, _, overrides = CASES[name]
+    workdir: str = tempfile.mkdtemp(prefix="cli-bible-bench-")
+    config: dict = {
+        "translation": TRANSLATION, "book": "gen", "chapter": 1, "verse": None, "prefetch": 1, "book_batch": 5,
+        "data_dir": os.path.join(workdir, "data"),
+        "cache": {"enabled": True, "path": os.path.join(workdir, "cache.sqlite3"), "max_size_mb": 64},
+        "backends": {"order": ["bible-api"], "bible-api": {"url": server_url},
+                     "jsdelivr": {"url": f"{server_url}/gh/wldeh/bible-api/bibles",
+                                  "translations": {TRANSLATION: f"en-{TRANSLATION}"}}},
+        "session": {"enabled": False}
+    }
+    for key, value in overrides.items():
+        config[key] = {**config[key], **value} if isinstance(value, dict) else value
+    os.makedirs(os.path.join(workdir, "etc"))
+    with open(os.path.join(workdir, "etc", "conf.json"), "w") as fp:
+        json.dump(config, fp)
+    os.chdir(workdir)  # the config is read from `etc/conf.json` relative to where we are
+    return function(args)
+
+
+def spawn(name: str, args: argparse.Namespace) -> list[dict]:
+    """Run case `name` in a fresh interpreter, against a fake server set up for it."""
+    from fixtures import Fixture
+    from server import FakeApi
+
+    settings: dict = {"retry_after": 1, **CASES[name][1]}
+    if args.latency is not None and "latency" in settings:
+        settings["latency"] = args.latency
+    server = FakeApi([Fixture.synthetic(TRANSLATION)], **settings).start()
+    try:
+        command: list[str] = [sys.executable, os.path.abspath(__file__), "--case", name, "--server", server.url]
+        process = subprocess.run(command + (["--quick"] if args.quick else []), capture_output=True, text=True)
+    finally:
+        server.stop()
+    if process.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{process.stderr}")
+    results: list[dict] = json.loads(process.stdout.splitlines()[-1])
+    for row in results:
+        row["case"] = name
+    if server.stats["injected"] or server.stats["rate_limited"]:
+        results[0]["429s"] = server.stats["injected"] + server.stats["rate_limited"]
+    return results
+
+
+def report(results: list[dict], baseline: dict[str, dict], threshold: float) -> None:
+    """Print `results` as a table, compared against `baseline` where it has the same benchmark."""
+    for row in results:
+        change: str = ""
+        if row["name"] in baseline and baseline[row["name"]]["p50"]:
+            ratio: float = row["p50"] / baseline[row["name"]]["p50"] - 1
+            change = f"{ratio:+.0%}" + (" !" if ratio > threshold else "")
+        notes: str = " ".join(f"{key}={value}" for key, value in row.items() if key not in
+                              ("case", "name", "n", "total", "ops", "mean", "p50", "p90", "p99"))
+        print(f"{row['name']:<44} {row['n']:>6} {row['ops']:>10.1f} {row['p50'] * 1000:>9.3f} "
+              f"{row['p90'] * 1000:>9.3f} {row['p99'] * 1000:>9.3f} {change:>8}  {notes}", flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark cli-bible against a local stand-in for bible-api.com.")
+    parser.add_argument("--only", help=f"comma separated cases to run, of {', '.join(CASES)}")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations and smaller documents")
+    parser.add_argument("--latency", type=float, help="override the server latency of every case, in seconds")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="compare against the results of an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="flag benchmarks whose p50 grew by more than this fraction (default 0.2)")
+    parser.add_argument("--case", help=argparse.SUPPRESS)  # used by `spawn()`
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.server, args)))
+        return
+
+    names: list[str] = args.only.split(",") if args.only else list(CASES)
+    unknown: list[str] = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    baseline: dict[str, dict] = {}
+    if args.compare:
+        with open(args.compare, "r") as fp:
+            baseline = {row["name"]: row for row in json.load(fp)}
+
+    print(f"{'benchmark':<44} {'n':>6} {'ops/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'vs base':>8}  notes")
+    results: list[dict] = []
+    for name in names:
+        rows: list[dict] = spawn(name, args)
+        report(rows, baseline, args.threshold)
+        results.extend(rows)
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=1)
+
+
+if __name__ == "__main__":
+    main()
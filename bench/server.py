@@ -0,0 +1,334 @@
+# imports - server.py, by McSnurtle
+"""A local stand-in for bible-api.com and the jsDelivr mirror, serving `fixtures.Fixture` translations.
+
+Answers in the same JSON shapes as the real services do, sends ETags and honours `If-None-Match`, and can be made slow
+(`latency`, `jitter`) or unreliable (`rate_limit` and `error_rate`, both answered with 429 and a `Retry-After`), so
+the request paths of `utils/getter.py` can be exercised and timed without touching the real thing.
+
+Run it on its own with i.e. `python bench/server.py --port 8000 --latency 0.05 --error-rate 0.1`, and point
+"backends" -> "bible-api" -> "url" (and "jsdelivr" -> "url") of `etc/conf.json` at it."""
+import argparse
+import collections
+import hashlib
+import http.server
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "cli_bible"))
+
+from fixtures import Fixture  # noqa: E402
+
+# ===== Variables =====
+JSDELIVR_PATH: str = "/gh/wldeh/bible-api/bibles"
+# bible-api.com's grammar, kept apart from `utils.reference` on purpose: the client's parser answering its own queries
+# would agree with it whatever it got wrong. A book, then comma separated C, C-C, C:V, C:V-V or C:V-C:V, or just V and
+# V-V after a verse (within its chapter). Only book IDs and full names are understood, which is all the client sends.
+_REFERENCE = re.compile(r"^\s*((?:[1-3]\s*)?[a-z][a-z ]*?)\s*((?:\d[\d:\-]*,?)*)\s*$")
+_RANGE = re.compile(r"^(\d+)(?::(\d+))?(?:-(\d+)(?::(\d+))?)?$")
+
+
+# ===== Classes =====
+class FakeApi(http.server.ThreadingHTTPServer):
+    """The server itself. Its settings can be changed while it's running, i.e. between benchmarks.
+
+    :param fixtures: The translations to serve.
+    :type fixtures: list[Fixture]
+    :param port: The port to listen on, 0 for any free one (see `url`).
+    :type port: int
+    :param latency: Seconds to wait before answering each request.
+    :type latency: float
+    :param jitter: Up to this many seconds more are added to `latency` at random.
+    :type jitter: float
+    :param error_rate: The chance of answering any request with a 429, regardless of `rate_limit`.
+    :type error_rate: float
+    :param rate_limit: Answer with a 429 once more than this many requests arrive within `rate_period` seconds.
+    :type rate_limit: int
+    :param retry_after: The `Retry-After` sent with every 429, in seconds.
+    :type retry_after: float
+    """
+    daemon_threads = True
+
+    def __init__(self, fixtures: list[Fixture], port: int = 0, latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, rate_limit: Optional[int] = None, rate_period: float = 30.0,
+                 retry_after: float = 1, seed: int = 0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.fixtures: dict[str, Fixture] = {fixture.translation: fixture for fixture in fixtures}
+        self.names: dict[str, dict[str, dict]] = {
+            fixture.translation: {key: book for book in fixture.books
+                                  for key in (book["id"].lower(), book["name"].lower(),
+                                              book["name"].lower().replace(" ", ""))}
+            for fixture in fixtures}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.retry_after = retry_after
+        self.stats: collections.Counter[str] = collections.Counter()
+        self._random = random.Random(seed)
+        self._arrivals: collections.deque[float] = collections.deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The base URL standing in for https://bible-api.com."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def jsdelivr_url(self) -> str:
+        """The base URL standing in for https://cdn.jsdelivr.net/gh/wldeh/bible-api/bibles."""
+        return f"{self.url}{JSDELIVR_PATH}"
+
+    def start(self) -> "FakeApi":
+        """Serve on a background thread until `stop()`."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def throttled(self) -> bool:
+        """Returns whether the request arriving now should be answered with a 429, and counts it."""
+        now: float = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._arrivals and self._arrivals[0] <= now - self.rate_period:
+                self._arrivals.popleft()
+            if self.rate_limit is not None and len(self._arrivals) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return True
+            self._arrivals.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats["injected"] += 1
+                return True
+            return False
+
+    def handle_error(self, request, client_address) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients hanging up on a keep-alive connection is fine
+            super().handle_error(request, client_address)
+
+    def fixture(self, translation: str) -> Optional[Fixture]:
+        return self.fixtures.get(translation.lower())
+
+    def jsdelivr_fixture(self, identifier: str) -> Optional[Fixture]:
+        """The mirror names translations i.e. "en-kjv", see `JsDelivrBackend`."""
+        return self.fixture(identifier.rsplit("-", 1)[-1])
+
+    @staticmethod
+    def ranges(passage: str, chapters: int, indifferent: bool) -> Optional[list[tuple[int, int, int, int]]]:
+        """Returns the (first chapter, first verse, last chapter, last verse) of each comma separated part of
+        `passage`, in a book of `chapters` chapters, or None if any part isn't understood or is past its last chapter.
+        Open ended verses are 999, as bible-api.com just stops at the end of the chapter.
+
+        If the book has a single chapter and the query is `indifferent` (single_chapter_book_matching=indifferent),
+        a passage of bare numbers other than "1" is verses, i.e. "Jude 3" is Jude 1:3."""
+        if not passage:
+            return [(1, 1, chapters, 999)]
+        if indifferent and chapters == 1 and ":" not in passage and passage != "1":
+            passage = "1:" + passage
+        ranges: list[tuple[int, int, int, int]] = []
+        chapter: Optional[int] = None  # the chapter a bare number is a verse of, once a verse was given
+        for part in passage.split(","):
+            match = _RANGE.match(part)
+            if match is None:
+                return None
+            a, b, c, d = (int(group) if group is not None else None for group in match.groups())
+            if b is not None:
+                last: tuple[int, int] = (c, d) if d is not None else (a, c if c is not None else b)
+                ranges.append((a, b, *last))
+                chapter = last[0]
+            elif chapter is not None:
+                ranges.append((chapter, a, c, d) if d is not None else (chapter, a, chapter, c or a))
+                chapter = c if d is not None else chapter
+            else:
+                ranges.append((a, 1, c or a, d or 999))
+                chapter = c if d is not None else None
+            if not 1 <= ranges[-1][0] <= ranges[-1][2] <= chapters:
+                return None
+        return ranges
+
+    def passage(self, translation: str, reference: str, indifferent: bool = False) -> Optional[dict]:
+        """Answer a reference the way bible-api.com does, or return None if there's nothing there."""
+        fixture: Optional[Fixture] = self.fixture(translation)
+        if fixture is None:
+            return None
+        match = _REFERENCE.match(reference.lower())
+        book: Optional[dict] = self.names[fixture.translation].get(" ".join(match.group(1).split())) \
+            if match is not None else None
+        if book is None:
+            return None
+        passage: str = match.group(2).rstrip(",")
+        ranges: Optional[list[tuple[int, int, int, int]]] = self.ranges(passage, book["chapters"], indifferent)
+        if ranges is None:
+            return None
+
+        verses: list[dict] = []
+        for first_chapter, first_verse, last_chapter, last_verse in ranges:
+            for chapter in range(first_chapter, last_chapter + 1):
+                verses.extend(verse for verse in fixture.chapter(book["id"], chapter) or []
+                              if (first_chapter, first_verse) <= (chapter, verse["verse"])
+                              <= (last_chapter, last_verse))
+        if not verses:
+            return None
+        return {
+            "reference": f"{book['name']} {passage}".strip(),
+            "verses": verses,
+            "text": "".join(verse["text"] for verse in verses),
+            "translation_id": fixture.translation,
+            "translation_name": fixture.name,
+            "translation_note": "Fixture"
+        }
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    server: FakeApi
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+    disable_nagle_algorithm = True  # or every answer waits out the client's delayed ACK of its headers
+
+    def do_GET(self) -> None:
+        delay: float = self.server.delay()
+        if delay:
+            time.sleep(delay)
+        if self.server.throttled():
+            self._send(429, {"error": "Too many requests"},
+                       {"Retry-After": f"{self.server.retry_after:g}"})
+            return
+
+        url = urllib.parse.urlsplit(self.path)
+        path: str = urllib.parse.unquote_plus(url.path)
+        query: dict[str, list[str]] = urllib.parse.parse_qs(url.query)
+        if path.startswith(JSDELIVR_PATH + "/"):
+            body: Optional[dict] = self._jsdelivr(path[len(JSDELIVR_PATH) + 1:].split("/"))
+        elif path == "/data" or path.startswith("/data/"):
+            body = self._data([part for part in path.split("/")[2:] if part])
+        else:
+            translation: str = query.get("translation", [next(iter(self.server.fixtures))])[0]
+            body = self.server.passage(translation, path.lstrip("/"),
+                                       query.get("single_chapter_book_matching", [""])[0] == "indifferent")
+        if body is None:
+            self.server.stats["not_found"] += 1
+            self._send(404, {"error": "not found"})
+        else:
+            self._send(200, body)
+
+    def _data(self, parts: list[str]) -> Optional[dict]:
+        """/data, /data/<translation>, /data/<translation>/random and /data/<translation>/<book>."""
+        if not parts:
+            return {"translations": [{"identifier": fixture.translation, "name": fixture.name, "language": "English",
+                                      "language_code": "eng", "license": "Public Domain",
+                                      "url": f"{self.server.url}/data/{fixture.translation}"}
+                                     for fixture in self.server.fixtures.values()]}
+        fixture: Optional[Fixture] = self.server.fixture(parts[0])
+        if fixture is None or len(parts) > 2:
+            return None
+        about: dict = {"identifier": fixture.translation, "name": fixture.name, "language": "English",
+                       "language_code": "eng", "license": "Public Domain"}
+        if len(parts) == 1:
+            return {"translation": about, "books": [
+                {"id": book["id"], "name": book["name"], "url": f"{self.server.url}/data/{fixture.translation}/"
+                                                                  f"{book['id']}"} for book in fixture.books]}
+        if parts[1] == "random":
+            with self.server._lock:
+                book: dict = self.server._random.choice(fixture.books)
+                chapter: int = self.server._random.randint(1, book["chapters"])
+                verse: dict = self.server._random.choice(fixture.chapter(book["id"], chapter))
+            return {"translation": about, "random_verse": {**verse, "book": verse["book_name"]}}
+
+        book = fixture.book(parts[1].upper())
+        if book is None:
+            return None
+        return {"translation": about, "chapters": [
+            {"book_id": book["id"], "book": book["name"], "chapter": chapter,
+             "url": f"{self.server.url}/data/{fixture.translation}/{book['id']}/{chapter}"}
+            for chapter in range(1, book["chapters"] + 1)]}
+
+    def _jsdelivr(self, parts: list[str]) -> Optional[dict]:
+        """<translation>/books/<book>/chapters/<chapter>.json and .../chapters/<chapter>/verses/<verse>.json."""
+        if len(parts) not in (5, 7) or parts[1] != "books" or parts[3] != "chapters":
+            return None
+        fixture: Optional[Fixture] = self.server.jsdelivr_fixture(parts[0])
+        if fixture is None:
+            return None
+        book: Optional[dict] = next((book for book in fixture.books
+                                     if book["name"].lower().replace(" ", "") == parts[2]), None)
+        try:
+            chapter: int = int(parts[4].removesuffix(".json"))
+            number: Optional[int] = int(parts[6].removesuffix(".json")) if len(parts) == 7 else None
+        except ValueError:
+            return None
+        verses: Optional[list[dict]] = fixture.chapter(book["id"], chapter) if book is not None else None
+        if not verses:
+            return None
+
+        data: list[dict] = [{"book": book["name"], "chapter": str(chapter), "verse": str(verse["verse"]),
+                             "text": verse["text"].strip()} for verse in verses]
+        if number is None:
+            return {"data": data}
+        return next((verse for verse in data if verse["verse"] == str(number)), None)
+
+    def _send(self, status: int, body: dict, headers: Optional[dict[str, str]] = None) -> None:
+        content: bytes = json.dumps(body).encode("utf-8")
+        etag: str = f'"{hashlib.sha1(content).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.server.stats["not_modified"] += 1
+            status, content = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # a request log would only slow the benchmarks down
+
+
+# ===== Functions =====
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve fixture translations the way bible-api.com and jsDelivr do.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--translations", default="kjv,web", help="synthetic translations to serve, comma separated")
+    parser.add_argument("--bundle", action="append", default=[],
+                        help="serve a downloaded translation (see `bible download`) instead, can be repeated")
+    parser.add_argument("--latency", type=float, default=0, help="seconds to wait before each answer")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many extra seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0, help="chance of answering any request with a 429")
+    parser.add_argument("--rate-limit", type=int, help="429 past this many requests per --rate-period seconds")
+    parser.add_argument("--rate-period", type=float, default=30)
+    parser.add_argument("--retry-after", type=float, default=1, help="the Retry-After of every 429, in seconds")
+    args = parser.parse_args()
+
+    fixtures: list[Fixture] = [Fixture.from_bundle(path) for path in args.bundle] or \
+                              [Fixture.synthetic(translation) for translation in args.translations.split(",")]
+    server = FakeApi(fixtures, port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     rate_limit=args.rate_limit, rate_period=args.rate_period, retry_after=args.retry_after)
+    print(f"Serving {', '.join(server.fixtures)} on {server.url} (jsDelivr at {server.jsdelivr_url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
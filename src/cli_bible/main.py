@@ -1,145 +1,185 @@
 # cli-bible main.py - by Mc_Snurtle
 
 # ===== Imports =====
-import curses
+# Kept deliberately light: the TUI (and with it curses) is only imported when there's no reference to print, and
+# requests only once something actually has to be fetched, so `bible John 3:16` answers from the cache in no time.
+import argparse
+import json
 import sys
+import threading
 
-from typing import Callable
-
-from utils.config import get_config, set_config
-from utils.getter import get_chapter, chapter_to_lines, get_raw, get_random_verse, verse_to_string, \
-    get_book, get_next_chapter
-from widgets import (Screen, ScrollableFrame, Entry)
-
-# ===== Variables =====
-RUNNING: bool = True
-config = get_config()
-books: list[str] = []
+from collections import deque
+from typing import Iterable, Iterator
 
 
 # ===== Functions =====
-class Main(Screen):
-    def __init__(self, stdscr):
-        super().__init__(stdscr)
-
-        height, width = self.stdscr.getmaxyx()
-        self.binds: dict[int, Callable] = {
-            ord("q"): stop,
-            ord("f"): self.find_prompt,
-            ord("n"): self.next_chapter,
-            ord("p"): self.prev_chapter,
-            ord("h"): self.prev_chapter,
-            ord("l"): self.next_chapter,
-            9: self.focus_next,
-            curses.KEY_RESIZE: self.update  # PLACEHOLDER FOR LIVE RESIZING METHOD
-        }
-        tips: list[str] = ["[Q]uit", "[F]ind", "[N]ext", "[P]revious"]
-        tip_str = "     ".join(tips)
-        self.frame = ScrollableFrame(stdscr, 0, 0, width, height - 3,
-                                     [verse_to_string(get_random_verse(config["translation"])[1]["random_verse"])])
-        tips_win = curses.newwin(3, width, height - 3, 0)
-        try:
-            tips_win.addstr(
-                1, (width // 2) - (len(tip_str) // 2), tip_str
-            )
-        except curses.error:
-            pass
-        tips_win.border()
-
-        self.search = Entry(stdscr=stdscr, title="", width=20, y=height // 2, x=width // 2 - 10, prompt="i.e. John 3")
-
-        self.add_window(tips_win, fill=[])
-        self.add_widget(self.search)
-        self.add_widget(self.frame)
-
-        self.focus_next()
-        self.update()
-
-        try:
-            while RUNNING:
-                event = self.stdscr.getch()
-                self.event_loop(event)
-
-        except KeyboardInterrupt:
-            stop()
-
-    def event_loop(self, key: int) -> None:
-        if key in self.binds:
-            self.binds[key]()
-        elif len(self.widgets) > 0:
-            self.widgets[self.current_widget].handle_event(key)
-        self.update()
-
-    def find_prompt(self) -> bool:
-        # This is actually the most disgusting code I've ever written other than the 200 if statements that one time
-        # I kind of can't believe I'm including this in this project
-        result: str = self.focus_to(self.search)
-        if not 3 > len(result.split(" ")):
-            return self._end_search(success=False)
-
-        code, response = get_raw(translation=config["translation"], raw=result)
-        if code != 200:
-            if len(result.split(" ")) == 1:
-                code, response = get_book(translation=config["translation"], book=result)
-                if code != 200:
-                    return self._end_search(success=False)
-                else:
-                    self.frame.lines.clear()
-                    for chapter in response["chapters"]:
-                        self.frame.lines.append(f"Chapter {chapter['chapter']}")
-                        code, verses = get_chapter(translation=config["translation"], book=chapter["book"],
-                                                   chapter=chapter["chapter"])
-                        if "verses" in verses.keys():
-                            for verse in chapter_to_lines(verses["verses"]):
-                                self.frame.lines.append(verse)
-                    config["book"] = result
-                    config["chapter"] = None
-                    config["verse"] = None
-                    set_config(config)
-            else:
-                return self._end_search(success=False)
-                # I'm physically cringing right now
+def download(translation: str) -> None:
+    """Download a whole translation for offline reading, i.e. `bible download kjv`."""
+    from utils.getter import download_translation
+
+    def progress(book: str, chapter: int, final: int) -> None:
+        print(f"\rDownloading {book} {chapter}/{final}".ljust(48), end="", flush=True)
+
+    try:
+        path: str = download_translation(translation, progress=progress)
+    except ValueError as e:
+        print(f"\n{e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nSaved {translation} to {path}")
+
+
+def export(argv: list[str]) -> int:
+    """Export books, passages or a whole translation to a file or stdout, i.e. `bible export Psalms -o psalms.md`.
+
+    :returns: The exit code, 1 if the export couldn't be finished and 2 if a reference couldn't be understood or isn't
+        in the translation."""
+    from utils.config import get_config
+    from utils.export import FORMATS, check, checkpoint_path, export as export_spans
+    from utils.getter import CanonIndex, get_canon
+    from utils.reference import Span, parse_reference
+
+    parser = argparse.ArgumentParser(prog="bible export", description="Export books, passages or a whole translation "
+                                                                      "as plain text, Markdown or JSON Lines. An "
+                                                                      "interrupted export to a file carries on where it "
+                                                                      "left off when run again.")
+    parser.add_argument("reference", nargs="*", help="what to export, i.e. Genesis; Psalms 1-10; John 3:16-18, "
+                                                     "separated with ;. Defaults to the whole translation")
+    parser.add_argument("--stdin", action="store_true", help="read references from stdin, one per line, i.e. a "
+                                                             "reading plan")
+    parser.add_argument("-o", "--output", help="file to write to instead of stdout")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="output format, by default guessed from the extension "
+                                                                "of the output file, or txt")
+    parser.add_argument("-t", "--translation", help="translation to use instead of the configured one")
+    parser.add_argument("--no-numbers", action="store_true", help="leave verse numbers out")
+    parser.add_argument("--restart", action="store_true", help="start over rather than carry on from a checkpoint")
+    args = parser.parse_args(argv)
+
+    translation: str = args.translation if args.translation else get_config()["translation"]
+    canon: CanonIndex = get_canon(translation)
+    text: str = "; ".join(line.strip() for line in sys.stdin if line.strip()) if args.stdin else " ".join(args.reference)
+    spans: list[Span] | None = parse_reference(canon, text) if text.strip() else [Span(book) for book in canon.book_ids]
+    if not spans:
+        print(f"Couldn't understand {text}" if text.strip() else f"No translation {translation} found.",
+              file=sys.stderr)
+        return 2
+    try:
+        check(canon, spans)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    extension: str = args.output.rsplit(".", 1)[-1].lower() if args.output and "." in args.output else ""
+    fmt: str = args.format if args.format else extension if extension in FORMATS else "txt"
+
+    def progress(done: int, total: int | None, book: str, chapter: int) -> None:
+        if args.output:  # otherwise stderr is likely the same terminal the export is going to
+            print(f"\rExporting {canon.names.get(book, book)} {chapter} ({done}/{total or '?'})".ljust(48), end="",
+                  file=sys.stderr, flush=True)
+
+    try:
+        done: int = export_spans(translation, spans, path=args.output, fmt=fmt, include_numbers=not args.no_numbers,
+                                 restart=args.restart, progress=progress)
+    except ValueError as e:  # a chapter missing from the translation after all, which running it again won't fix
+        print(f"\n{e}" if args.output else e, file=sys.stderr)
+        return 2
+    except (KeyboardInterrupt, ConnectionError) as e:
+        if args.output:
+            print(f"\n{str(e) or 'Interrupted'}, run it again to carry on from {checkpoint_path(args.output)}",
+                  file=sys.stderr)
         else:
-            self.frame.lines = chapter_to_lines(response["verses"])
-            new_data = result.split(" ")
-            config["book"] = new_data[0]
-            config["chapter"] = int(new_data[1])
-            set_config(config)
-        return self._end_search(success=True)
-
-    def _end_search(self, success: bool = False) -> bool:
-        if not success:
-            curses.beep()
-        else:
-            self.frame.offset = 1  # scroll to top of new page if successful
-        self.focus_to(self.frame)
-        self.search.contents = ""
-        return success
-
-    def _next_chapter(self, steps: int = 1) -> None:
-        code, response = get_next_chapter(translation=config["translation"], book=config["book"],
-                                          chapter=config["chapter"], steps=steps)
-        if code == 200:
-            book, chapter = response["reference"].split(" ")
-            config["book"], config["chapter"] = book, int(chapter)
-            self.frame.lines = chapter_to_lines(response["verses"])
-            self.update()
-
-    def prev_chapter(self) -> None:
-        self._next_chapter(-1)
-
-    def next_chapter(self) -> None:
-        self._next_chapter(1)
-
+            print(str(e) or "Interrupted", file=sys.stderr)
+        return 1
+    if args.output:
+        print(f"\nExported {done} chapters to {args.output}", file=sys.stderr)
+    return 0
+
+
+def resolve(translation: str, references: Iterable[str], workers: int = 4) -> Iterator[tuple[str, int, dict]]:
+    """Yields the reference, status code and response of every reference in `references`, in order.
+
+    Up to `workers` references are looked up ahead of the one being yielded, so results stream out as soon as they're
+    ready without waiting on the whole input (i.e. while stdin is still being read)."""
+    from utils.getter import get_raw
+
+    def lookup(reference: str, result: list) -> None:
+        result.extend(get_raw(translation=translation, raw=reference))
+
+    pending: deque[tuple[str, threading.Thread, list]] = deque()
+    for reference in references:
+        result: list = []
+        thread = threading.Thread(target=lookup, args=(reference, result), daemon=True)
+        thread.start()
+        pending.append((reference, thread, result))
+        if len(pending) >= workers:
+            reference, thread, result = pending.popleft()
+            thread.join()
+            yield reference, *result
+    while pending:
+        reference, thread, result = pending.popleft()
+        thread.join()
+        yield reference, *result
+
+
+def headless(args: argparse.Namespace) -> int:
+    """Print the references given on the command line (or stdin) instead of opening the TUI.
+
+    :returns: The exit code, 1 if any reference couldn't be found."""
+    from utils.config import get_config
+    from utils.getter import chapter_to_lines
+
+    translation: str = args.translation if args.translation else get_config()["translation"]
+    if args.stdin:
+        references: Iterable[str] = (line.strip() for line in sys.stdin if line.strip())
+    else:
+        references = [reference.strip() for reference in " ".join(args.reference).split(";") if reference.strip()]
+
+    code: int = 0
+    first: bool = True
+    for reference, status, response in resolve(translation, references):
+        if status != 200:
+            code = 1
+            if args.json:
+                print(json.dumps({"reference": reference, "error": status}), flush=True)
+            else:
+                print(f"No passage found for {reference}", file=sys.stderr, flush=True)
+            continue
 
-def stop(code: int = 0) -> None:
-    if code != 0: curses.beep()
-    set_config(config)
-    sys.exit(code)
+        if args.json:
+            print(json.dumps(response), flush=True)
+        else:
+            print(("" if first else "\n") + "\n".join(chapter_to_lines(response["verses"], not args.no_numbers)),
+                  flush=True)
+            first = False
+    return code
 
 
 def launch() -> None:
-    curses.wrapper(Main)
+    if len(sys.argv) == 3 and sys.argv[1] == "download":
+        return download(sys.argv[2])
+    if len(sys.argv) >= 2 and sys.argv[1] == "export":
+        sys.exit(export(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(prog="bible", description="Read the Bible in your terminal. Opens the TUI when "
+                                                               "no references are given.")
+    parser.add_argument("reference", nargs="*", help="references to print, i.e. John 3:16-18; separate several with ;")
+    parser.add_argument("--stdin", action="store_true", help="read references from stdin, one per line")
+    parser.add_argument("--json", action="store_true", help="print one JSON response per line")
+    parser.add_argument("-t", "--translation", help="translation to use instead of the configured one")
+    parser.add_argument("--no-numbers", action="store_true", help="leave verse numbers out of plain text output")
+    parser.add_argument("--metrics", metavar="PATH", help="measure requests, the cache and rendering, and write what "
+                                                          "was measured to PATH as JSON on exit")
+    parser.add_argument("--profile", metavar="PATH", help="write a cProfile dump of the main thread to PATH on exit")
+    args = parser.parse_args()
+
+    from utils import metrics
+    from utils.config import get_config
+    metrics.configure(get_config().get("metrics", {}), export_path=args.metrics, profile_path=args.profile)
+
+    if args.reference or args.stdin:
+        sys.exit(headless(args))
+
+    import tui
+    tui.launch()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,512 @@
+# cli-bible tui.py - by Mc_Snurtle
+
+# ===== Imports =====
+import curses
+import sys
+
+from typing import Any, Callable
+
+from utils.agetter import gather_translations
+from utils.config import flush_config, get_config, set_config
+from utils.getter import CanonIndex, align_chapters, chapter_to_lines, get_chapter, get_raw, get_random_verse, \
+    verse_to_string, close_sessions, get_bundle, get_canon, get_final_chapter_id, iter_book, known_canon, \
+    remember_canon
+from utils.prefetch import Prefetcher
+from utils.reference import Span, complete_book, parse_reference
+from utils.search import SearchIndex
+from utils.session import flush_session, load_session, save_offset, save_session
+from utils.verses import Chapter
+from widgets import (Screen, ScrollableFrame, ParallelFrame, Entry, MetricsOverlay)
+
+# ===== Variables =====
+RUNNING: bool = True
+READ_AHEAD: int = 20  # rows from either end of the frame at which continuous reading loads the next chapter over
+READ_WINDOW: int = 5  # chapters kept in the frame while reading continuously, the furthest from view is dropped
+config = get_config()
+books: list[str] = []
+index: SearchIndex | None = None
+prefetcher = Prefetcher(config["translation"], window=config.get("prefetch", 1))
+
+
+# ===== Functions =====
+class Main(Screen):
+    def __init__(self, stdscr):
+        super().__init__(stdscr)
+
+        height, width = self.stdscr.getmaxyx()
+        self.binds: dict[int, Callable] = {
+            ord("q"): stop,
+            ord("f"): self.find_prompt,
+            ord("n"): self.next_chapter,
+            ord("p"): self.prev_chapter,
+            ord("h"): self.prev_chapter,
+            ord("l"): self.next_chapter,
+            ord("t"): self.toggle_parallel,
+            ord("c"): self.toggle_continuous,
+            ord("m"): self.toggle_metrics,
+            9: self.focus_next,
+            curses.KEY_RESIZE: lambda: self.update(force=True)  # PLACEHOLDER FOR LIVE RESIZING METHOD
+        }
+        tips: list[str] = ["[Q]uit", "[F]ind", "[N]ext", "[P]revious", "[T]ranslations", "[C]ontinuous", "[M]etrics"]
+        gap: int = min(max((width - 2 - sum(len(tip) for tip in tips)) // (len(tips) - 1), 1), 5)  # fit 80 columns
+        self.tip_str = (" " * gap).join(tips)
+        snapshot: dict | None = load_session(config["translation"])  # what was on screen when the app last closed
+        self.frame = ScrollableFrame(stdscr, 0, 0, width, height - 3, snapshot["lines"] if snapshot else ["..."])
+        self.parallel: ParallelFrame | None = None  # shown in place of `frame` while comparing translations
+        self.tips_win = curses.newwin(3, width, height - 3, 0)
+        self.set_status(None)
+
+        self.loading: int = 0  # generation of whatever is being loaded into the frame, see `show_lines()`
+        self.navigating: bool = False
+        self.pending_steps: int = 0  # chapters to move once the current page turn finishes, see `_next_chapter()`
+        self.showing: tuple[str, int | None] | None = None  # the (book, chapter) in the frame, if it's a book or chapter
+        self._saved: tuple | None = None  # what the last session snapshot was of, see `save_snapshot()`
+        self.continuous: bool = False  # whether neighbouring chapters are loaded as the frame is scrolled to its ends
+        self.loaded_chapters: list[list] = []  # [book, chapter, line count] of each chapter in the frame, in order
+        self.chapter_ends: list[bool] = [False, False]  # whether the first and last chapter of the canon are loaded
+        self.extending: bool = False  # whether a neighbouring chapter is on its way, see `extend()`
+
+        self.search = Entry(stdscr=stdscr, title="", width=20, y=height // 2, x=width // 2 - 10, prompt="i.e. John 3",
+                            completer=self.complete_book)
+
+        self.metrics = MetricsOverlay(stdscr, x=max(width - MetricsOverlay.width - 1, 0), y=1)
+
+        self.add_window(self.tips_win, fill=[])
+        self.add_widget(self.search)
+        self.add_widget(self.frame)
+        self.add_overlay(self.metrics)
+
+        if snapshot is not None:
+            self.restore_snapshot(snapshot)
+        self.focus_next()
+        self.update()
+        if snapshot is None:
+            self.run_in_background(lambda: get_random_verse(config["translation"]), self._show_random_verse)
+        if known_canon(config["translation"]) is None:  # ready before the first search, see `complete_book()`
+            self.run_in_background(lambda: get_canon(config["translation"]))
+
+        try:
+            while RUNNING:
+                for event in self.wait_for_events(self.metrics.refresh if self.metrics.visible else None):
+                    self.event_loop(event)
+                self.update()  # for anything posted by background work
+                self.extend()
+                self.save_snapshot()
+
+        except KeyboardInterrupt:
+            stop()
+
+    def event_loop(self, key: int) -> None:
+        if key in self.binds:
+            self.binds[key]()
+        elif len(self.widgets) > 0:
+            self.widgets[self.current_widget].handle_event(key)
+        self.update()
+
+    def find_prompt(self) -> None:
+        result: str = self.focus_to(self.search)
+        self.focus_to(self.view)
+        self.search.contents = ""
+        self.set_status(f"Finding {result}...")
+        self.run_in_background(lambda: self._find(result), self._found, lambda error: self._found(None))
+
+    def complete_book(self, text: str) -> list[str]:
+        """Returns the names of the books `text` could be the start of, for the search box to offer. Only ever uses the
+        canon already in memory, so typing never waits on a request."""
+        canon: CanonIndex | None = known_canon(config["translation"])
+        if canon is None or not text.strip() or text.startswith("?"):
+            return []
+        return [canon.names[book] for book in complete_book(canon, text)]
+
+    def _find(self, result: str) -> tuple[str, Any] | None:
+        """Work out what the user searched for, off the UI thread. See `_found()`."""
+        if result.startswith("?"):  # i.e. "?love one another", see `SearchIndex` for the query syntax
+            lines: list[str] | None = self.search_text(result[1:])
+            return ("lines", lines) if lines else None
+
+        spans: list[Span] | None = parse_reference(get_canon(config["translation"]), result)
+        if spans is not None and len(spans) == 1 and spans[0].chapter is None:  # a whole book, i.e. "Song of Solomon"
+            return "book", spans[0].book
+
+        code, response = get_raw(translation=config["translation"], raw=result)
+        if code != 200:
+            return None
+        return "chapter", response
+
+    def _found(self, found: tuple[str, Any] | None) -> None:
+        self.set_status(None)
+        if found is None:
+            self._end_search(success=False)
+            return
+
+        kind, data = found
+        if kind == "lines":
+            self.show_lines(data)
+        elif kind == "book":
+            self.load_book(data)
+            self.showing = (data, None)
+            config["book"] = data
+            config["chapter"] = None
+            config["verse"] = None
+            set_config(config)
+        else:
+            first: dict = data["verses"][0]
+            config["book"] = first["book_id"]
+            config["chapter"] = int(first["chapter"])
+            set_config(config)
+            if self.parallel is not None:
+                self.open_parallel(config["book"], config["chapter"])
+            else:
+                self.show_chapter_lines(data["verses"])
+            prefetcher.focus(config["book"], config["chapter"])
+        self._end_search(success=True)
+
+    def search_text(self, query: str) -> list[str] | None:
+        """Returns the lines listing the verses best matching `query` in the downloaded copy of the current
+        translation, or None if there are none."""
+        global index
+
+        bundle = get_bundle(config["translation"])
+        if bundle is None or not query.strip():
+            return None
+        if index is None or index.bundle is not bundle:
+            index = SearchIndex.open(bundle)
+
+        results: list[tuple[int, float]] = index.search(query)
+        if not results:
+            return None
+        lines: list[str] = [f"Results for {query.strip()}:"]
+        for verse_id, score in results:
+            verse: dict = bundle.verse(verse_id)
+            lines.append(f"{verse['book_name']} {verse['chapter']}:{verse_to_string(verse)}")
+        return lines
+
+    def _show_random_verse(self, result: tuple[int, dict]) -> None:
+        code, response = result
+        if code == 200 and self.loading == 0:  # unless the user already went somewhere else
+            self.show_lines([verse_to_string(response["random_verse"])])
+
+    def show_lines(self, lines: list[str]) -> None:
+        """Replace the contents of the frame, abandoning any book still being loaded into it."""
+        self.loading += 1
+        self.set_status(None)
+        if self.parallel is not None:
+            self._show_view(None)
+        self.frame.lines = lines
+        self.showing = None
+        self.loaded_chapters = []
+
+    def show_chapter_lines(self, verses: list[dict]) -> None:
+        """Show the chapter made up of `verses` in the frame, as the start of continuous reading if that's on."""
+        first: dict = verses[0]
+        self.show_lines(chapter_to_lines(verses))
+        self.showing = (first["book_id"], int(first["chapter"]))
+        if self.continuous:
+            self.loaded_chapters = [[first["book_id"], int(first["chapter"]), len(self.frame.lines)]]
+            self.chapter_ends = [False, False]
+
+    def toggle_continuous(self) -> None:
+        """Switch continuous reading on or off: while on, the chapters either side of the one being read are loaded
+        into the frame as it's scrolled towards them, across the ends of books."""
+        self.continuous = not self.continuous
+        self.set_status(f"Continuous reading {'on' if self.continuous else 'off'}")
+        if self.continuous and self.showing is not None and self.showing[1] is not None:
+            self.loaded_chapters = [[self.showing[0], self.showing[1], len(self.frame.lines)]]
+            self.chapter_ends = [False, False]
+        elif self.continuous:  # not reading a chapter right now, so start from the last one read
+            book, chapter = config["book"], config["chapter"] or 1
+            generation: int = self.loading
+            self.run_in_background(lambda: get_chapter(translation=config["translation"], book=book, chapter=chapter),
+                                   self._show_chapter,
+                                   lambda error: self.set_status(None) if generation == self.loading else None)
+        else:
+            self.loaded_chapters = []
+
+    def toggle_metrics(self) -> None:
+        """Show or hide the live metrics overlay, see `widgets.MetricsOverlay`."""
+        self.metrics.toggle()
+        if not self.metrics.visible:
+            self.view.invalidate()  # uncover whatever it was drawn over
+
+    def _chapter_at(self, line: int) -> int:
+        """Returns the index (in `loaded_chapters`) of the chapter line `line` of the frame belongs to."""
+        for idx, (_, _, count) in enumerate(self.loaded_chapters):
+            if line < count:
+                return idx
+            line -= count
+        return len(self.loaded_chapters) - 1
+
+    def _current_chapter(self) -> int:
+        """Returns the index (in `loaded_chapters`) of the chapter at the top of the view."""
+        return self._chapter_at(self.frame.top_line()[0])
+
+    def extend(self) -> None:
+        """Load the next (or previous) chapter into the frame if it's scrolled near the end (or start) of what's loaded,
+        and drop the chapter furthest from view once there are more than `READ_WINDOW`."""
+        if not self.loaded_chapters or self.extending or self.parallel is not None:
+            return
+
+        current: list = self.loaded_chapters[self._current_chapter()]
+        if (current[0], current[1]) != (config["book"], config["chapter"]):  # scrolled into another chapter
+            config["book"], config["chapter"] = current[0], current[1]
+            self.showing = (current[0], current[1])
+            set_config(config)
+            prefetcher.focus(current[0], current[1])
+
+        if self.frame.rows_below < READ_AHEAD and not self.chapter_ends[1]:
+            steps, (book, chapter, _) = 1, self.loaded_chapters[-1]
+        elif self.frame.rows_above < READ_AHEAD and not self.chapter_ends[0]:
+            steps, (book, chapter, _) = -1, self.loaded_chapters[0]
+        else:
+            return
+
+        self.extending = True
+        generation: int = self.loading
+        self.run_in_background(lambda: prefetcher.get_next_chapter(book=book, chapter=chapter, steps=steps),
+                               lambda result: self._extended(generation, steps, result),
+                               lambda error: self._extended(generation, steps, (404, {})))
+
+    def _extended(self, generation: int, steps: int, result: tuple[int, dict]) -> None:
+        self.extending = False
+        if generation != self.loading or not self.loaded_chapters:
+            return  # the frame was replaced in the meantime
+        code, response = result
+        if code != 200:
+            self.chapter_ends[steps > 0] = True  # past the end of the canon, or it can't be fetched right now
+            return
+
+        first: dict = response["verses"][0]
+        lines: list[str] = chapter_to_lines(response["verses"])
+        chapter: list = [first["book_id"], int(first["chapter"]), len(lines)]
+        if steps > 0:
+            self.frame.lines.extend(lines)
+            self.loaded_chapters.append(chapter)
+        else:
+            self.frame.insert_lines(0, lines)
+            self.loaded_chapters.insert(0, chapter)
+
+        # Drop chapters from the other end while there are too many, but never so many that it's left within
+        # `READ_AHEAD` rows of the view, or they'd only be loaded straight back in (i.e. when chapters are very short)
+        while len(self.loaded_chapters) > READ_WINDOW:
+            if steps > 0:
+                count: int = self.loaded_chapters[0][2]
+                if self.frame.rows_above - self.frame.line_rows(0, count) < READ_AHEAD:
+                    break
+                self.frame.delete_lines(0, count)
+                self.loaded_chapters.pop(0)
+                self.chapter_ends[0] = False
+            else:
+                count = self.loaded_chapters[-1][2]
+                end: int = len(self.frame.lines)
+                if self.frame.rows_below - self.frame.line_rows(end - count, end) < READ_AHEAD:
+                    break
+                self.frame.delete_lines(end - count, end)
+                self.loaded_chapters.pop()
+                self.chapter_ends[1] = False
+
+    def restore_snapshot(self, snapshot: dict) -> None:
+        """Carry on where the last session left off: `snapshot` is already painted, so just pick its state back up, and
+        refresh the chapter it shows in the background in case it's changed since."""
+        self.frame.offset = snapshot["offset"]
+        if snapshot.get("canon"):
+            remember_canon(CanonIndex.from_dict(snapshot["canon"]))
+        if snapshot["book"] is None:
+            return
+        config["book"], config["chapter"] = snapshot["book"], snapshot["chapter"]
+        self.showing = (snapshot["book"], snapshot["chapter"])
+        if snapshot["chapter"] is None:
+            return
+        prefetcher.focus(snapshot["book"], snapshot["chapter"])
+
+        generation: int = self.loading
+        book, chapter = snapshot["book"], snapshot["chapter"]
+
+        def refresh(result: tuple[int, dict]) -> None:
+            code, response = result
+            if code == 200 and generation == self.loading:  # unless the user already went somewhere else
+                lines: list[str] = chapter_to_lines(response["verses"])
+                if lines != self.frame.lines:
+                    self.frame.lines = lines
+                    # It may be shorter than it was, so don't leave the view scrolled past its end
+                    self.frame.offset = max(self.frame.offset, min(self.frame.height - self.frame.content_length, 1))
+
+        self.run_in_background(lambda: get_chapter(translation=config["translation"], book=book, chapter=chapter),
+                               refresh)
+
+    def save_snapshot(self) -> None:
+        """Snapshot the frame for the next launch if it changed, see `session.save_session()`. The lines are only
+        copied when they change, so scrolling just records the new offset (see `session.save_offset()`)."""
+        lines: list[str] = self.frame.lines
+        if len(lines) == 1 and lines[0] == "...":
+            return
+        offset: int = self.frame.offset
+        start, stop = 0, len(lines)
+        if self.loaded_chapters:  # reading continuously, so keep just the chapter in view, as that's what's restored
+            current: int = self._current_chapter()
+            start = sum(count for _, _, count in self.loaded_chapters[:current])
+            stop = start + self.loaded_chapters[current][2]
+            offset += self.frame.line_rows(0, start)
+        content: tuple = (id(lines), len(lines), start, stop, self.showing)
+        if self._saved is not None and self._saved[0] == content:
+            if self._saved[1] != offset:
+                save_offset(offset)
+                self._saved = (content, offset)
+            return
+        self._saved = (content, offset)
+        canon: CanonIndex | None = known_canon(config["translation"])
+        book, chapter = self.showing if self.showing is not None else (None, None)
+        save_session(config["translation"], book, chapter, lines[start:stop] if self.loaded_chapters else lines,
+                     offset, canon.to_dict() if canon is not None else None)
+
+    @property
+    def view(self) -> ScrollableFrame:
+        """Returns whichever frame is on screen, the single translation one or the parallel one."""
+        return self.parallel if self.parallel is not None else self.frame
+
+    def _show_view(self, parallel: ParallelFrame | None) -> None:
+        """Put `parallel` on screen in place of the current view, or the single translation frame if it's None."""
+        current: ScrollableFrame = self.view
+        self.parallel = parallel
+        self.widgets[self.widgets.index(current)] = self.view
+        if current.focused:
+            current.unfocus()
+            self.view.focus()
+        self.view.invalidate()
+
+    def toggle_parallel(self) -> None:
+        """Compare the current chapter across the translations listed under "parallel" in the config, or go back to
+        the single translation view."""
+        if self.parallel is not None:
+            self.loading += 1  # abandon a parallel chapter still on its way
+            self._show_view(None)
+            return
+        self.open_parallel(config["book"], config["chapter"] or 1)
+
+    def open_parallel(self, book: str, chapter: int) -> None:
+        """Fetch `book` `chapter` in every parallel translation at once, then show them side by side."""
+        translations: list[str] = config.get("parallel", [])[:4]
+        if len(translations) < 2:
+            curses.beep()
+            return
+        self.loading += 1
+        generation: int = self.loading
+        self.set_status(f"Loading {', '.join(translations).upper()}...")
+        self.run_in_background(lambda: gather_translations(translations, book, chapter),
+                               lambda results: self._show_parallel(generation, translations, results),
+                               lambda error: self.set_status(None) if generation == self.loading else None)
+
+    def _show_parallel(self, generation: int, translations: list[str], results: list[tuple[int, dict]]) -> None:
+        if generation != self.loading:
+            return  # the user went elsewhere in the meantime
+        self.set_status(None)
+        lines: list[tuple[str, ...]] = align_chapters([Chapter.from_verses(response["verses"]) if code == 200 else None
+                                                       for code, response in results])
+        if not lines:
+            self._end_search(success=False)
+            return
+        lines.insert(0, tuple(translation.upper() for translation in translations))
+
+        if self.parallel is not None and self.parallel.columns == len(translations):
+            self.parallel.lines = lines
+            self.parallel.offset = 1
+        else:
+            height, width = self.stdscr.getmaxyx()
+            self._show_view(ParallelFrame(self.stdscr, 0, 0, width, height - 3, lines, columns=len(translations)))
+
+    def set_status(self, status: str | None) -> None:
+        """Show `status` in place of the key tips, or the tips again if `status` is None."""
+        height, width = self.tips_win.getmaxyx()
+        text: str = self.tip_str if status is None else status
+        self.tips_win.erase()
+        try:
+            self.tips_win.addstr(1, max((width // 2) - (len(text) // 2), 1), text[:width - 2])
+        except curses.error:
+            pass
+        self.invalidate_window(self.tips_win)
+
+    def load_book(self, book: str) -> None:
+        """Stream every chapter of `book` into the frame on a background thread, so the first chapters can be read
+        while the rest are still being fetched."""
+        self.show_lines([])
+        generation: int = self.loading
+
+        def work() -> None:
+            try:
+                final: int = get_final_chapter_id(config["translation"], book)
+                for code, response in iter_book(config["translation"], book, batch=config.get("book_batch", 1)):
+                    if generation != self.loading:
+                        return  # the user went elsewhere
+                    if code == 200:
+                        chapter: Chapter = Chapter.from_verses(response["verses"])  # packed before it's kept around
+                        self.post(lambda chapter=chapter: self._add_chapter(generation, chapter, final))
+            except (KeyError, ValueError):
+                pass
+            self.post(lambda: self.set_status(None) if generation == self.loading else None)
+
+        self.run_in_background(work, failed=lambda error: self.set_status(None) if generation == self.loading else None)
+
+    def _add_chapter(self, generation: int, chapter: Chapter, final: int) -> None:
+        if generation != self.loading:
+            return
+        self.frame.lines.append(f"Chapter {chapter.number}")
+        self.frame.lines.extend(chapter_to_lines(chapter))
+        self.set_status(f"Loading {chapter.book_name}: {chapter.number}/{final}")
+
+    def _end_search(self, success: bool = False) -> bool:
+        if not success:
+            curses.beep()
+        else:
+            self.frame.offset = 1  # scroll to top of new page if successful
+        return success
+
+    def _next_chapter(self, steps: int = 1) -> None:
+        if self.loaded_chapters and self.parallel is None:  # reading continuously, jump within the frame if possible
+            target: int = self._current_chapter() + steps
+            if 0 <= target < len(self.loaded_chapters):
+                self.frame.scroll_to_line(sum(count for _, _, count in self.loaded_chapters[:target]))
+                return
+        self.pending_steps += steps
+        if not self.navigating:  # otherwise it'll pick up the extra steps once the current page turn is done
+            self._navigate()
+
+    def _navigate(self) -> None:
+        steps, self.pending_steps = self.pending_steps, 0
+        if steps == 0:
+            return
+        self.navigating = True
+        book, chapter = config["book"], config["chapter"] or 1  # i.e. from the start of a whole book
+        self.run_in_background(lambda: prefetcher.get_next_chapter(book=book, chapter=chapter, steps=steps),
+                               self._show_chapter, lambda error: self._show_chapter((404, {})))
+
+    def _show_chapter(self, result: tuple[int, dict]) -> None:
+        self.navigating = False
+        code, response = result
+        if code == 200:
+            first: dict = response["verses"][0]  # "reference" can't be split for books like "1 John" or "Song of Solomon"
+            config["book"], config["chapter"] = first["book_id"], int(first["chapter"])
+            if self.parallel is not None:
+                self.open_parallel(config["book"], config["chapter"])
+            else:
+                self.show_chapter_lines(response["verses"])
+            prefetcher.focus(config["book"], config["chapter"])
+        self._navigate()
+
+    def prev_chapter(self) -> None:
+        self._next_chapter(-1)
+
+    def next_chapter(self) -> None:
+        self._next_chapter(1)
+
+
+def stop(code: int = 0) -> None:
+    if code != 0: curses.beep()
+    prefetcher.stop()
+    close_sessions()
+    set_config(config)
+    flush_config()
+    flush_session()
+    sys.exit(code)
+
+
+def launch() -> None:
+    curses.wrapper(Main)
@@ -0,0 +1,106 @@
+# imports - agetter.py, by McSnurtle
+import asyncio
+import threading
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+from utils import getter
+from utils.config import get_config
+
+# ===== Variables =====
+# The getter functions block on their requests, so they run on this pool while the event loop carries on. How many
+# run at once is capped by a per event loop semaphore, and how fast they actually go out by `getter.scheduler`.
+CONCURRENCY: int = get_config().get("http", {}).get("concurrency", 4)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()  # event loops may run on several threads, each making the first call at once
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(CONCURRENCY)
+    return _semaphores[loop]
+
+
+async def _run(func: Callable, *args: Any, level: int = getter.INTERACTIVE) -> Any:
+    """Run the blocking getter function `func` on the worker pool at request priority `level`."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="agetter")
+
+    def call() -> Any:
+        with getter.priority(level):
+            return func(*args)
+
+    async with _semaphore():
+        return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+# ===== Functions =====
+async def available_books(translation: str, level: int = getter.INTERACTIVE) -> tuple[int, list[dict]]:
+    return await _run(getter.available_books, translation, level=level)
+
+
+async def get_random_verse(translation: str, level: int = getter.INTERACTIVE) -> tuple[int, dict]:
+    return await _run(getter.get_random_verse, translation, level=level)
+
+
+async def get_book(translation: str, book: str, level: int = getter.INTERACTIVE) -> tuple[int, dict]:
+    return await _run(getter.get_book, translation, book, level=level)
+
+
+async def get_chapter(translation: str, book: str, chapter: int,
+                      level: int = getter.INTERACTIVE) -> tuple[int, dict]:
+    return await _run(getter.get_chapter, translation, book, chapter, level=level)
+
+
+async def get_raw(translation: str, raw: str, level: int = getter.INTERACTIVE) -> tuple[int, dict]:
+    return await _run(getter.get_raw, translation, raw, level=level)
+
+
+async def get_verse(translation: str, book: str, chapter: int, verse: int,
+                    level: int = getter.INTERACTIVE) -> tuple[int, dict]:
+    return await _run(getter.get_verse, translation, book, chapter, verse, level=level)
+
+
+def gather_raw(translation: str, references: Iterable[str],
+               level: int = getter.INTERACTIVE) -> list[tuple[int, dict]]:
+    """Synchronously look up every reference in `references` at once, i.e. for scripts pulling whole reading lists.
+
+    :returns: The status code and response of each reference, in the same order as `references`.
+    """
+    async def fetch() -> list[tuple[int, dict]]:
+        return list(await asyncio.gather(*[get_raw(translation, raw, level=level) for raw in references]))
+
+    return asyncio.run(fetch())
+
+
+def gather_chapters(translation: str, chapters: Iterable[tuple[str, int]],
+                    level: int = getter.INTERACTIVE) -> list[tuple[int, dict]]:
+    """Synchronously fetch every (book, chapter) pair in `chapters` at once.
+
+    :returns: The status code and response of each chapter, in the same order as `chapters`.
+    """
+    async def fetch() -> list[tuple[int, dict]]:
+        return list(await asyncio.gather(*[get_chapter(translation, book, chapter, level=level)
+                                           for book, chapter in chapters]))
+
+    return asyncio.run(fetch())
+
+
+def gather_translations(translations: Iterable[str], book: str, chapter: int,
+                        level: int = getter.INTERACTIVE) -> list[tuple[int, dict]]:
+    """Synchronously fetch `book` `chapter` in every translation in `translations` at once, i.e. for the parallel view.
+
+    :returns: The status code and response of each translation, in the same order as `translations`.
+    """
+    async def fetch() -> list[tuple[int, dict]]:
+        return list(await asyncio.gather(*[get_chapter(translation, book, chapter, level=level)
+                                           for translation in translations]))
+
+    return asyncio.run(fetch())
@@ -0,0 +1,302 @@
+# imports - backends.py, by McSnurtle
+import abc
+import queue
+import threading
+import time
+
+from collections import deque
+from typing import Optional
+
+from utils import getter, metrics
+from utils.bundle import Bundle
+from utils.config import get_config
+
+# ===== Variables =====
+WINDOW: int = 64  # how many recent requests the latency and error statistics of a backend cover
+MIN_SAMPLES: int = 5  # below this many, a backend's p90 is just a guess, so `HEDGE_AFTER` is used instead
+HEDGE_AFTER: float = 1.5  # seconds to wait on a backend before hedging, until its own p90 is known
+_backends: Optional[list["Backend"]] = None
+_backends_lock = threading.Lock()
+
+
+# ===== Classes =====
+class LatencyStats:
+    """Rolling latency and error rate of the last `WINDOW` requests sent to one backend. Thread safe."""
+
+    def __init__(self, window: int = WINDOW):
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._errors: deque[bool] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._errors.append(not ok)
+            if ok:  # a failure's latency says more about the failure than about the backend's speed
+                self._latencies.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Returns the `percent`th percentile of recent successful request latencies, or None if there are too few."""
+        with self._lock:
+            if len(self._latencies) < MIN_SAMPLES:
+                return None
+            latencies: list[float] = sorted(self._latencies)
+        return latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)]
+
+    @property
+    def p90(self) -> Optional[float]:
+        return self.percentile(90)
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            return sum(self._errors) / len(self._errors) if self._errors else 0
+
+    def score(self) -> float:
+        """Returns how costly the backend is expected to be, lower is better: its median latency, inflated by how
+        often it fails."""
+        median: Optional[float] = self.percentile(50)
+        return (median if median is not None else HEDGE_AFTER) / max(1 - self.error_rate, 0.05)
+
+
+class Backend(abc.ABC):
+    """A source of chapters. Subclasses answer in the shape of bible-api.com responses, whatever their source's own
+    format is, so callers never need to know which one answered."""
+    name: str = ""
+    stats: LatencyStats
+
+    def __init__(self, settings: Optional[dict] = None):
+        self.settings = settings if settings is not None else {}
+        self.stats = LatencyStats()
+
+    @abc.abstractmethod
+    def available(self, translation: str) -> bool:
+        """Returns whether this backend has `translation` at all."""
+
+    @abc.abstractmethod
+    def lookup(self, translation: str, book: str, chapter: int) -> Optional[tuple[int, dict]]:
+        """Returns what `chapter()` would if it can answer without sending a request (i.e. from the cache), otherwise
+        None."""
+
+    @abc.abstractmethod
+    def chapter(self, translation: str, book: str, chapter: int) -> tuple[int, dict]:
+        """Returns the status code and bible-api.com shaped response of `book` `chapter` in `translation`."""
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} p90={self.stats.p90} errors={self.stats.error_rate:.0%}>"
+
+
+class LocalBackend(Backend):
+    """Chapters from a translation downloaded with `getter.download_translation()`."""
+    name = "local"
+
+    def available(self, translation: str) -> bool:
+        return getter.get_bundle(translation) is not None
+
+    def lookup(self, translation: str, book: str, chapter: int) -> Optional[tuple[int, dict]]:
+        return self.chapter(translation, book, chapter) if self.available(translation) else None
+
+    def chapter(self, translation: str, book: str, chapter: int) -> tuple[int, dict]:
+        bundle: Optional[Bundle] = getter.get_bundle(translation)
+        if bundle is None:
+            return 404, {}
+        try:
+            book = getter.get_canonical_of_book(translation, book)
+        except KeyError:
+            return 404, {}
+        verses: Optional[list[dict]] = bundle.chapter(book, int(chapter))
+        if verses is None:
+            return 404, {}
+        return 200, getter._local_response(bundle.translation, verses, f"{verses[0]['book_name']} {chapter}")
+
+
+class BibleApiBackend(Backend):
+    """bible-api.com, the original source of everything."""
+    name = "bible-api"
+
+    def available(self, translation: str) -> bool:
+        return True  # it's where the translation list comes from in the first place
+
+    def lookup(self, translation: str, book: str, chapter: int) -> Optional[tuple[int, dict]]:
+        store = getter._get_cache()
+        hit = store.get(getter.cache_key(translation, f"{book} {chapter}")) if store is not None else None
+        if hit is None or not hit[1]:
+            return None
+        return hit[0].status_code, hit[0].json() if hit[0].status_code == 200 else {}
+
+    def chapter(self, translation: str, book: str, chapter: int) -> tuple[int, dict]:
+        response = getter.get(
+            f"{getter.api_url()}/{book}+{chapter}?translation={translation}&single_chapter_book_matching=indifferent",
+            key=getter.cache_key(translation, f"{book} {chapter}"))
+        return response.status_code, response.json() if response.status_code == 200 else {}
+
+
+class JsDelivrBackend(Backend):
+    """The jsDelivr CDN mirror of github.com/wldeh/bible-api. It names translations differently (i.e. "en-kjv"), so
+    only translations mapped under "translations" in its settings are looked up there."""
+    name = "jsdelivr"
+    url: str
+    rate_limit: int = 60  # a CDN, not bible-api.com's 15 per 30 seconds
+    rate_period: float = 30.0
+
+    def __init__(self, settings: Optional[dict] = None):
+        super().__init__(settings)
+        self.url = self.settings.get("url", getter.jsdelivr_url()).rstrip("/")
+        self.translations: dict[str, str] = self.settings.get("translations", {})
+        getter.limit_host(self.url, self.settings.get("rate_limit", self.rate_limit), self.rate_period)
+
+    def available(self, translation: str) -> bool:
+        return translation.lower() in self.translations
+
+    def _key(self, translation: str, book: str, chapter: int) -> str:
+        return getter.cache_key(translation, f"{book} {chapter}@jsdelivr")
+
+    def lookup(self, translation: str, book: str, chapter: int) -> Optional[tuple[int, dict]]:
+        store = getter._get_cache()
+        if store is None:
+            return None
+        canon: getter.CanonIndex = getter.get_canon(translation)
+        try:
+            book = canon.canonical(book)
+        except KeyError:
+            return None
+        hit = store.get(self._key(translation, book, chapter))
+        if hit is None or not hit[1]:
+            return None
+        return self._answer(translation, canon, book, chapter, hit[0])
+
+    def chapter(self, translation: str, book: str, chapter: int) -> tuple[int, dict]:
+        canon: getter.CanonIndex = getter.get_canon(translation)
+        try:
+            book = canon.canonical(book)
+        except KeyError:
+            return 404, {}
+        response = getter.get(
+            f"{self.url}/{self.translations[translation.lower()]}/books/"
+            f"{canon.names[book].lower().replace(' ', '')}/chapters/{chapter}.json",
+            key=self._key(translation, book, chapter))
+        return self._answer(translation, canon, book, chapter, response)
+
+    @staticmethod
+    def _answer(translation: str, canon: "getter.CanonIndex", book: str, chapter: int,
+                response) -> tuple[int, dict]:
+        """Returns the mirror's `response` for `book` (a canonical ID) `chapter` in the shape of bible-api.com's."""
+        if response.status_code != 200:
+            return response.status_code, {}
+        name: str = canon.names[book]
+        verses: list[dict] = []
+        for verse in response.json().get("data", []):
+            if verses and int(verse["verse"]) == verses[-1]["verse"]:
+                continue  # the mirror repeats a verse here and there
+            verses.append({"book_id": book, "book_name": name, "chapter": int(verse["chapter"]),
+                           "verse": int(verse["verse"]), "text": verse["text"]})
+        if not verses:
+            return 404, {}
+        return 200, getter._local_response(translation, verses, f"{name} {chapter}")
+
+
+BACKENDS: dict[str, type[Backend]] = {
+    LocalBackend.name: LocalBackend,
+    BibleApiBackend.name: BibleApiBackend,
+    JsDelivrBackend.name: JsDelivrBackend
+}
+
+
+# ===== Functions =====
+def get_backends() -> list[Backend]:
+    """Returns the backends named under "backends" -> "order" in `etc/conf.json`, in order of preference."""
+    global _backends
+    with _backends_lock:
+        if _backends is None:
+            settings: dict = get_config().get("backends", {})
+            _backends = [BACKENDS[name](settings.get(name, {}))
+                         for name in settings.get("order", ["local", "bible-api"]) if name in BACKENDS]
+        return _backends
+
+
+def fetch_chapter(translation: str, book: str, chapter: int) -> tuple[int, dict]:
+    """Fetch `book` `chapter` from whichever backend answers it first.
+
+    A backend which can answer without a request (i.e. from a download or the cache) always does. Otherwise the
+    backend expected to be fastest is asked first, and if it takes longer than its usual p90, the same chapter is
+    requested from the next best backend as well and the first answer wins. A backend that fails outright is
+    followed up by the next one straight away. Only interactive requests are hedged; background ones just fail over.
+
+    :param translation: The translation identifier to search in.
+    :type translation: str
+    :param book: The book to search in, any valid identifier.
+    :type book: str
+    :param chapter: The chapter to fetch.
+    :type chapter: int
+
+    :returns: The status code and response of the chapter, or of the last backend to fail if none had it.
+    :rtype tuple[int, dict]:
+    """
+    candidates: list[Backend] = [backend for backend in get_backends() if backend.available(translation)]
+    if not candidates:
+        return 404, {}
+    for backend in candidates:
+        try:
+            answer: Optional[tuple[int, dict]] = backend.lookup(translation, book, chapter)
+        except (KeyError, ValueError):
+            answer = None  # i.e. an unreadable cache entry, so ask for it again
+        if answer is not None:
+            if not isinstance(backend, LocalBackend):  # i.e. as `getter.get()` would have counted it
+                metrics.count("cache.hit")
+            return answer
+
+    ranked: list[Backend] = sorted(candidates, key=lambda backend: backend.stats.score())  # ties keep config order
+    level: int = getattr(getter._priority, "level", getter.INTERACTIVE)
+    results: queue.Queue[tuple[int, dict]] = queue.Queue()
+
+    def attempt(backend: Backend) -> tuple[int, dict]:
+        start: float = time.monotonic()
+        code, response = 503, {}
+        try:
+            with getter.priority(level):
+                code, response = backend.chapter(translation, book, chapter)
+        except (KeyError, ValueError):
+            code, response = 404, {}
+        except Exception:
+            pass  # i.e. a connection error or a payload it couldn't make sense of, which counts as a 503
+        finally:
+            backend.stats.record(time.monotonic() - start, code < 500 and code != 429)
+        return code, response
+
+    failure: tuple[int, dict] = (503, {})
+    if level != getter.INTERACTIVE or len(ranked) == 1:  # nothing to hedge, so no thread needed to race it either
+        for backend in ranked:
+            code, response = attempt(backend)
+            if code < 500 and code != 429:
+                return code, response
+            failure = (code, response)
+        return failure
+
+    launched: int = 0
+    pending: int = 0
+
+    def launch() -> None:
+        nonlocal launched, pending
+        backend: Backend = ranked[launched]
+        threading.Thread(target=lambda: results.put(attempt(backend)), name="backend", daemon=True).start()
+        launched += 1
+        pending += 1
+
+    launch()
+    while pending > 0:
+        timeout: Optional[float] = None
+        if launched < len(ranked) and level == getter.INTERACTIVE:
+            p90: Optional[float] = ranked[launched - 1].stats.p90
+            timeout = p90 if p90 is not None else HEDGE_AFTER
+        try:
+            code, response = results.get(timeout=timeout)
+        except queue.Empty:  # slower than usual, hedge with the next backend
+            launch()
+            continue
+
+        pending -= 1
+        if code < 500 and code != 429:  # an answer, even if it's that the chapter doesn't exist
+            return code, response
+        failure = (code, response)
+        if pending == 0 and launched < len(ranked):
+            launch()  # fail over to the next backend
+    return failure
@@ -0,0 +1,138 @@
+# imports - broker.py, by McSnurtle
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # i.e. Windows, where every process keeps to its own rate limit as before
+    fcntl = None
+
+
+# ===== Functions =====
+def supported() -> bool:
+    """Returns whether this platform has the file locks a `Broker` needs."""
+    return fcntl is not None
+
+
+@contextlib.contextmanager
+def _locked(path: str) -> Iterator[int]:
+    """Hold an exclusive lock on the file at `path`, created if need be, and yield its file descriptor."""
+    fd: int = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)  # which releases the lock too
+
+
+# ===== Classes =====
+class Broker:
+    """Lets every cli-bible process on a machine share one rate limit per host, and one download of each response.
+
+    Works through files under `path` rather than a daemon, so there's nothing to start or clean up after:
+
+    - Each host has a budget file holding the tokens spent within the last period, and until when a `Retry-After`
+      holds every request back, see `reserve()`. `getter.RequestScheduler` still orders requests within
+      a process, and asks the broker before sending each one.
+    - A response being downloaded is locked by a file of its own, so anyone else wanting it waits for it to land in the
+      (already shared) response cache rather than downloading it again, see `coalesce()`."""
+    path: str
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.join(self.path, "fetching"), exist_ok=True)
+
+    @contextlib.contextmanager
+    def _budget(self, host: str) -> Iterator[dict]:
+        """Hold the budget of `host` locked, and yield its state to change, which is written back afterwards.
+
+        "spent" lists a [time, pid] pair per token in use: the pid of the process its request is in flight in, until
+        `release()` sets it to 0, at which time its cooldown starts."""
+        with _locked(os.path.join(self.path, f"{host.replace(':', '_') or 'default'}.budget")) as fd:
+            try:
+                state: dict = json.loads(os.pread(fd, os.fstat(fd).st_size, 0) or b"{}")
+            except ValueError:
+                state = {}  # torn by a crash mid-write, start over
+            state.setdefault("spent", [])
+            state.setdefault("paused_until", 0)
+            yield state
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, json.dumps(state).encode(), 0)
+
+    def reserve(self, host: str, limit: int, period: float) -> float:
+        """Spend one of the `limit` tokens `host` gets every `period` seconds, across every process, if one is free.
+        Like `getter.RequestScheduler`'s, a token only comes back `period` seconds after its request finished, see
+        `release()`.
+
+        :returns: 0 if a token was spent and the request may go ahead, otherwise how many seconds to wait before trying
+            again.
+        :rtype float:
+        """
+        now: float = time.time()  # not monotonic, which isn't comparable between processes everywhere
+        with self._budget(host) as state:
+            # Tokens of requests still in flight in a process that's gone (i.e. killed) are let go of after a period
+            state["spent"] = sorted(token for token in state["spent"] if token[0] > now - period)
+            if state["paused_until"] > now:
+                return state["paused_until"] - now
+            if len(state["spent"]) >= limit:
+                in_use: list[list] = state["spent"][len(state["spent"]) - limit:]
+                if all(pid for _, pid in in_use):
+                    return period / limit  # all in flight, so there's no telling when one comes back yet
+                return max(min(stamp for stamp, pid in in_use if not pid) + period - now, 0.01)
+            state["spent"].append([now, os.getpid()])
+            return 0
+
+    def release(self, host: str) -> None:
+        """Start the cooldown of a token this process spent with `reserve()`, once its request has finished."""
+        pid: int = os.getpid()
+        with self._budget(host) as state:
+            for token in state["spent"]:
+                if token[1] == pid:
+                    token[0], token[1] = time.time(), 0
+                    break
+
+    def pause(self, host: str, seconds: float) -> None:
+        """Hold every process' requests to `host` back for `seconds`, i.e. because it answered with a `Retry-After`."""
+        with self._budget(host) as state:
+            state["paused_until"] = max(state["paused_until"], time.time() + seconds)
+
+    @contextlib.contextmanager
+    def coalesce(self, key: str) -> Iterator[bool]:
+        """Hold the download of the response cached under `key`, waiting first if anyone (any process or thread) is
+        already downloading it.
+
+        Yields whether it had to wait, in which case the response is likely in the cache by now and should be looked
+        up again before downloading it. i.e.
+
+            with broker.coalesce(key) as waited:
+                if waited and cached(key): return it
+                else: download and cache it"""
+        path: str = os.path.join(self.path, "fetching", hashlib.sha1(key.encode()).hexdigest())
+        waited: bool = False
+        while True:
+            fd: int = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                waited = True
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)  # its last holder removed it while we waited, so lock whatever's there now instead
+
+        try:
+            yield waited
+        finally:
+            try:
+                os.unlink(path)  # before unlocking, so nobody locks a file that's about to go
+            except FileNotFoundError:
+                pass
+            os.close(fd)
@@ -0,0 +1,120 @@
+# imports - bundle.py, by McSnurtle
+import json
+import mmap
+import os
+import struct
+
+from typing import Optional
+
+# ===== Variables =====
+# File layout, all little endian:
+#   header   MAGIC, format version, length of the metadata blob, number of verses
+#   metadata UTF-8 JSON: translation, books (id, name) and per chapter [first verse index, verse count]
+#   verses   one VERSE record (book index, chapter, verse, text offset, text length) per verse, in canonical order
+#   text     every verse's UTF-8 text, back to back
+MAGIC: bytes = b"CLIBIBLE"
+VERSION: int = 1
+HEADER = struct.Struct("<8sHII")
+VERSE = struct.Struct("<HHHII")
+
+
+# ===== Classes =====
+class BundleWriter:
+    """Incrementally collects the verses of a translation, then writes them out as a compact bundle file."""
+    translation: str
+
+    def __init__(self, translation: str):
+        self.translation = translation
+        self._books: list[dict] = []
+        self._records: bytearray = bytearray()
+        self._text: bytearray = bytearray()
+        self._count: int = 0
+
+    def add_book(self, book_id: str, name: str) -> None:
+        self._books.append({"id": book_id, "name": name, "chapters": []})
+
+    def add_chapter(self, verses: list[dict]) -> None:
+        """Append the verses of one chapter (as returned by `getter.get_chapter`) to the most recently added book."""
+        book: dict = self._books[-1]
+        book["chapters"].append([self._count, len(verses)])
+        for verse in verses:
+            text: bytes = verse["text"].encode("utf-8")
+            self._records += VERSE.pack(len(self._books) - 1, int(verse["chapter"]), int(verse["verse"]),
+                                        len(self._text), len(text))
+            self._text += text
+            self._count += 1
+
+    def write(self, path: str) -> None:
+        """Atomically write the bundle to `path`."""
+        meta: bytes = json.dumps({"translation": self.translation, "books": self._books}).encode("utf-8")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.part", "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, VERSION, len(meta), self._count))
+            fp.write(meta)
+            fp.write(self._records)
+            fp.write(self._text)
+        os.replace(f"{path}.part", path)
+
+
+class Bundle:
+    """A read only, memory mapped view of a bundle written by `BundleWriter`.
+
+    Only the header and metadata are parsed up front; verse records and text are sliced out of the mapping on demand,
+    so the OS only ever pages in the parts of the file that are actually read."""
+    path: str
+    translation: str
+    books: list[dict]
+    verse_count: int
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fp = open(path, "rb")
+        self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, version, meta_length, self.verse_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a cli-bible bundle.")
+        meta: dict = json.loads(str(self._view[HEADER.size:HEADER.size + meta_length], "utf-8"))
+        self.translation = meta["translation"]
+        self.books = meta["books"]
+        self._positions: dict[str, int] = {book["id"]: idx for idx, book in enumerate(self.books)}
+
+        self._records_start: int = HEADER.size + meta_length
+        self._text_start: int = self._records_start + VERSE.size * self.verse_count
+
+    def __len__(self) -> int:
+        return self.verse_count
+
+    def verse(self, idx: int) -> dict:
+        """Returns verse number `idx` (counting from the start of the bundle) shaped like a bible-api.com verse."""
+        book_idx, chapter, verse, offset, length = VERSE.unpack_from(self._map, self._records_start + VERSE.size * idx)
+        start: int = self._text_start + offset
+        book: dict = self.books[book_idx]
+        return {
+            "book_id": book["id"],
+            "book_name": book["name"],
+            "chapter": chapter,
+            "verse": verse,
+            "text": str(self._view[start:start + length], "utf-8")
+        }
+
+    def chapter_range(self, book: str, chapter: int) -> Optional[range]:
+        """Returns the range of verse indices making up `chapter` of `book` (a canonical ID), or None if absent."""
+        if book not in self._positions:
+            return None
+        chapters: list[list[int]] = self.books[self._positions[book]]["chapters"]
+        if not 0 < chapter <= len(chapters):
+            return None
+        first, count = chapters[chapter - 1]
+        return range(first, first + count)
+
+    def chapter(self, book: str, chapter: int) -> Optional[list[dict]]:
+        verses: Optional[range] = self.chapter_range(book, chapter)
+        return [self.verse(idx) for idx in verses] if verses is not None else None
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+        self._fp.close()
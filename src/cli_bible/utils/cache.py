@@ -0,0 +1,119 @@
+# imports - cache.py, by McSnurtle
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from typing import Optional
+
+
+# ===== Classes =====
+class CachedResponse:
+    """A minimal stand-in for `requests.Response` served from the on-disk cache."""
+    status_code: int
+    content: bytes
+    headers: dict[str, str]
+
+    def __init__(self, status_code: int, content: bytes, headers: Optional[dict[str, str]] = None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """A persistent, size-capped, least-recently-used response cache backed by SQLite.
+
+    Entries are keyed by an arbitrary string (see `getter.cache_key`), and store the response body alongside its
+    `ETag` so that stale entries can be cheaply revalidated instead of re-downloaded."""
+    path: str
+    max_size: int
+    ttl: Optional[float]
+
+    def __init__(self, path: str, max_size: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, status INTEGER, body BLOB, etag TEXT, stored REAL, accessed REAL, size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def get(self, key: str) -> Optional[tuple[CachedResponse, bool]]:
+        """Returns the cached response for `key` and whether it is still fresh, or None if nothing is cached."""
+        with self._lock:
+            row = self._db.execute("SELECT status, body, etag, stored FROM entries WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        status, body, etag, stored = row
+        headers: dict[str, str] = {"ETag": etag} if etag else {}
+        fresh: bool = self.ttl is None or time.time() - stored < self.ttl
+        return CachedResponse(status, bytes(body), headers), fresh
+
+    def put(self, key: str, status: int, body: bytes, etag: Optional[str] = None) -> None:
+        """Store `body` under `key`, evicting the least recently used entries if the cache grows past `max_size`."""
+        if len(body) > self.max_size:
+            return
+        now: float = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, status, body, etag, stored, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, status, body, etag, now, now, len(body))
+            )
+            self._evict()
+
+    def touch(self, key: str) -> None:
+        """Mark `key` as freshly stored, i.e. after the server answered a revalidation with 304 Not Modified."""
+        now: float = time.time()
+        with self._lock:
+            self._db.execute("UPDATE entries SET stored = ?, accessed = ? WHERE key = ?", (now, now, key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @property
+    def size(self) -> int:
+        """Returns the total size in bytes of all cached bodies."""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self) -> None:
+        total: int = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        freed: int = 0
+        victims: list[str] = []
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if total - freed <= self.max_size:
+                break
+            victims.append(key)
+            freed += size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in victims])
@@ -1,14 +1,96 @@
 # imports
+import atexit
 import json
+import os
+import threading
+import time
 
-from typing import Union
+from typing import Optional
 
+# ===== Variables =====
+CONFIG_PATH: str = "etc/conf.json"
+WRITE_DELAY: float = 0.5  # seconds a write-behind waits for more changes before actually writing
 
-def get_config(path: str = "etc/conf.json") -> dict:
+
+# ===== Functions =====
+def write_json(path: str, data: dict) -> None:
+    """Atomically replace the contents of `path` with `data`, so a crash mid-write never leaves a truncated file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.part", "w") as fp:
+        json.dump(data, fp)
+    os.replace(f"{path}.part", path)
+
+
+# ===== Classes =====
+class WriteBehind:
+    """Writes JSON documents to a file on a background thread, coalescing bursts of writes.
+
+    Each `write()` just hands the latest document over; once no newer one has arrived for `delay` seconds, it's written
+    out with `write_json()`. Anything still pending is written at exit, see `flush()`."""
+    path: str
+    delay: float
+
+    def __init__(self, path: str, delay: float = WRITE_DELAY):
+        self.path = path
+        self.delay = delay
+        self._pending: Optional[dict] = None
+        self._due: float = 0
+        self._lock = threading.Condition()
+        self._io_lock = threading.Lock()  # so the worker and `flush()` never write at the same time, or out of order
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def write(self, data: dict) -> None:
+        """Schedule `data` to be written. It's only read once it's written, so pass a copy if it's still changing."""
+        with self._lock:
+            self._pending = data
+            self._due = time.monotonic() + self.delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="write-behind", daemon=True)
+                self._thread.start()
+            self._lock.notify()
+
+    def flush(self) -> None:
+        """Write whatever is pending right now, on the calling thread."""
+        with self._io_lock:
+            self._take_and_save()
+
+    def _take_and_save(self) -> None:
+        with self._lock:
+            data, self._pending = self._pending, None
+        if data is not None:
+            try:
+                write_json(self.path, data)
+            except (OSError, TypeError, ValueError):
+                pass  # nothing worth crashing over, the next write will try again
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                while self._pending is None:
+                    self._lock.wait()
+                while time.monotonic() < self._due:  # wait out the burst
+                    self._lock.wait(self._due - time.monotonic())
+            with self._io_lock:
+                self._take_and_save()
+
+
+_writer: Optional[WriteBehind] = None
+
+
+def get_config(path: str = CONFIG_PATH) -> dict:
     with open(path, "r") as fp:
         return json.load(fp)
 
 
-def set_config(new_config: dict) -> int:
-    with open("etc/conf.json", "w") as fp:
-        return fp.write(json.dumps(new_config))
+def set_config(new_config: dict) -> None:
+    """Save `new_config` in the background, see `WriteBehind`. Call `flush_config()` to make sure it's on disk."""
+    global _writer
+    if _writer is None:
+        _writer = WriteBehind(CONFIG_PATH)
+    _writer.write(json.loads(json.dumps(new_config)))  # a copy, as the caller carries on changing it
+
+
+def flush_config() -> None:
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,258 @@
+# imports - export.py, by McSnurtle
+import collections
+import json
+import os
+import sys
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from utils import getter
+from utils.config import get_config, write_json
+from utils.getter import CanonIndex, chapter_to_lines, verse_to_string
+from utils.reference import Span
+
+# ===== Variables =====
+FORMATS: tuple[str, ...] = ("txt", "md", "jsonl")
+VERSION: int = 1  # of the checkpoint files, see `export()`
+CHECKPOINT_EVERY: float = 1.0  # seconds between checkpoints of an export to a file
+BUFFER_SIZE: int = 1 << 16
+
+
+# ===== Functions =====
+def plan(canon: CanonIndex, spans: Iterable[Span]) -> Iterator[tuple[str, int, Optional[Span]]]:
+    """Yields the (book ID, chapter, span) of every chapter `spans` touch, in order. The span is there to pick the
+    verses of chapters only partly exported, and None when the whole chapter is."""
+    for span in spans:
+        if span.chapter is None:
+            for chapter in range(1, canon.final_chapter(span.book) + 1):
+                yield span.book, chapter, None
+        else:
+            for chapter in span.chapters:
+                yield span.book, chapter, span
+
+
+def check(canon: CanonIndex, spans: Iterable[Span]) -> None:
+    """Make sure every chapter `spans` name is in its book, so an export of one that isn't fails before anything is
+    written rather than partway through. Whole books always are, see `plan()`.
+
+    :raises ValueError: If a span reaches past the last chapter of its book, or its book can't be found.
+    """
+    for span in spans:
+        if span.chapter is None:
+            continue
+        final: int = canon.final_chapter(span.book)
+        if span.end_chapter > final:
+            raise ValueError(f"{canon.names.get(span.book, span.book)} has only {final} "
+                             f"chapter{'' if final == 1 else 's'}")
+
+
+def _fetch_group(translation: str, book: str, chapters: list[int]) -> list[tuple[int, dict]]:
+    """Fetch `chapters` of `book`, as one multi-chapter request if there are several, see `getter.iter_book()`."""
+    fetched: dict[int, dict] = getter.fetch_batch(translation, book, chapters) if len(chapters) > 1 else {}
+    return [(200, fetched[chapter]) if chapter in fetched else getter.get_chapter(translation, book, chapter)
+            for chapter in chapters]
+
+
+def _groups(translation: str, pieces: Iterator[tuple[str, int, Optional[Span]]],
+            batch: int) -> Iterator[list[tuple[str, int, Optional[Span]]]]:
+    """Gather runs of up to `batch` chapters of the same book which all need a request. Chapters that don't (cached or
+    downloaded) go on their own, as they're as cheap as they get already."""
+    group: list[tuple[str, int, Optional[Span]]] = []
+    for piece in pieces:
+        book, chapter, _ = piece
+        if batch <= 1 or getter.is_cached(translation, book, chapter):
+            if group:
+                yield group
+                group = []
+            yield [piece]
+            continue
+        if group and (group[0][0] != book or len(group) >= batch):
+            yield group
+            group = []
+        group.append(piece)
+    if group:
+        yield group
+
+
+def fetch(translation: str, pieces: Iterator[tuple[str, int, Optional[Span]]], workers: int = 4,
+          batch: int = 1) -> Iterator[tuple[tuple[str, int, Optional[Span]], int, dict]]:
+    """Yields each of `pieces` (see `plan()`) with the status code and response of its chapter, in order.
+
+    Up to `workers` groups of up to `batch` chapters are fetched at once, and only that many more are ever waiting to be
+    written, so however much is exported only a handful of chapters are held in memory. How fast requests go out is
+    still up to `getter.RequestScheduler`."""
+    pending: collections.deque[tuple[list, Future]] = collections.deque()
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="export")
+    try:
+        for group in _groups(translation, pieces, batch if getter.get_bundle(translation) is None else 1):
+            pending.append((group, executor.submit(_fetch_group, translation, group[0][0],
+                                                   [chapter for _, chapter, _ in group])))
+            while len(pending) > max(workers, 1) * 2 or (pending and pending[0][1].done()):
+                yield from _results(*pending.popleft())
+        while pending:
+            yield from _results(*pending.popleft())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)  # i.e. interrupted, don't wait on what's left
+
+
+def _results(group: list, future: Future) -> Iterator[tuple[tuple[str, int, Optional[Span]], int, dict]]:
+    for piece, (code, response) in zip(group, future.result()):
+        yield piece, code, response
+
+
+def render(fmt: str, translation: str, fetched: Iterator[tuple[tuple[str, int, Optional[Span]], int, dict]],
+           include_numbers: bool = True, book: Optional[str] = None) -> Iterator[tuple[str, int, bytes]]:
+    """Yields the book ID, chapter number and text of each fetched chapter, formatted as `fmt` (see `FORMATS`) and
+    encoded as UTF-8. The text is empty if none of the chapter's verses were asked for.
+
+    :param book: The book exported just before these chapters, if any, so a Markdown export doesn't head a book twice.
+    :type book: str
+
+    :raises ValueError: If a chapter isn't in the translation.
+    :raises ConnectionError: If a chapter couldn't be fetched right now, i.e. rate limited or the server is down.
+    """
+    for (book_id, chapter, span), code, response in fetched:
+        if code == 404:
+            raise ValueError(f"There's no {book_id} {chapter} in the {translation} translation")
+        if code != 200:
+            raise ConnectionError(f"Could not fetch {book_id} {chapter} from the {translation} translation ({code})")
+        verses: list[dict] = [verse for verse in response["verses"] if span is None or
+                              span.contains(int(verse["chapter"]), int(verse["verse"]))]
+        if not verses:
+            yield book_id, chapter, b""
+            continue
+        name: str = verses[0]["book_name"]
+
+        if fmt == "jsonl":
+            text: str = "".join(json.dumps({"translation": translation, "book_id": verse["book_id"], "book_name": name,
+                                            "chapter": int(verse["chapter"]), "verse": int(verse["verse"]),
+                                            "text": verse["text"].strip()}) + "\n" for verse in verses)
+        elif fmt == "md":
+            heading: str = f"# {name}\n\n" if book_id != book else ""
+            text = heading + f"## {name} {chapter}\n\n" + "".join(
+                (f"**{verse['verse']}** " if include_numbers else "") + verse_to_string(verse, False) + "\n\n"
+                for verse in verses)
+        else:
+            text = "\n".join(chapter_to_lines(verses, include_numbers)) + "\n\n"
+        book = book_id
+        yield book_id, chapter, text.encode("utf-8")
+
+
+def checkpoint_path(path: str) -> str:
+    """Returns where the checkpoint of an export to `path` is kept while it's unfinished."""
+    return f"{path}.checkpoint"
+
+
+def export(translation: str, spans: list[Span], path: Optional[str] = None, fmt: str = "txt",
+           include_numbers: bool = True, restart: bool = False,
+           progress: Optional[Callable[[int, Optional[int], str, int], None]] = None) -> int:
+    """Export `spans` of `translation` to the file at `path` (or stdout) as `fmt`, see `FORMATS`.
+
+    Chapters stream through `plan()`, `fetch()` and `render()` into a buffered writer, so memory use stays flat however
+    much is exported. An export to a file is checkpointed next to it (see `checkpoint_path()`) every
+    `CHECKPOINT_EVERY` seconds and whenever it stops early; running the same export again then carries on from there,
+    unless `restart` is True.
+
+    :param translation: The translation identifier to export from.
+    :type translation: str
+    :param spans: What to export, i.e. as parsed by `reference.parse_reference()`. Whole books are `Span(book)`.
+    :type spans: list[Span]
+    :param path: The file to write to, or None for stdout.
+    :type path: str
+    :param fmt: One of `FORMATS`.
+    :type fmt: str
+    :param include_numbers: Whether to number each verse.
+    :type include_numbers: bool
+    :param restart: Whether to start over even if a checkpoint of the same export is found.
+    :type restart: bool
+    :param progress: Called with how many chapters are done, how many there are (if known), and the book ID and
+        chapter number just written, after every chapter.
+    :type progress: Callable[[int, Optional[int], str, int], None]
+
+    :returns: How many chapters were exported, including any exported before resuming.
+    :rtype int:
+
+    :raises ValueError: If a chapter isn't in the translation, see `check()`. Nothing is written if that's known
+        upfront.
+    :raises ConnectionError: If a chapter couldn't be fetched right now. The checkpoint is kept, so it can be retried.
+    """
+    translation = translation.lower()
+    canon: CanonIndex = getter.get_canon(translation)
+    check(canon, spans)
+    # Only counted upfront if every chapter count is known already, or it'd cost a request per book before the first
+    # chapter is even fetched
+    total: Optional[int] = sum(1 for _ in plan(canon, spans)) \
+        if all(span.chapter is not None or span.book in canon.chapters for span in spans) else None
+    job: dict = {"version": VERSION, "translation": translation, "format": fmt, "numbers": include_numbers,
+                 "spans": [list(span) for span in spans]}
+    state: dict = {"done": 0, "offset": 0, "book": None}  # chapters written, the size of what they came to, last book
+
+    checkpoint: Optional[str] = checkpoint_path(path) if path is not None else None
+    if checkpoint is not None and not restart and os.path.exists(checkpoint) and os.path.exists(path):
+        try:
+            with open(checkpoint, "r") as fp:
+                saved: dict = json.load(fp)
+            if saved["job"] == job and os.path.getsize(path) >= saved["state"]["offset"]:
+                state = saved["state"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # unreadable, so start over
+
+    if path is None:
+        out: BinaryIO = sys.stdout.buffer
+    elif state["done"]:
+        out = open(path, "r+b", buffering=BUFFER_SIZE)
+        out.truncate(state["offset"])  # anything after the checkpoint may be half a chapter
+        out.seek(state["offset"])
+    else:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        out = open(path, "wb", buffering=BUFFER_SIZE)
+
+    def save() -> None:
+        out.flush()
+        write_json(checkpoint, {"job": job, "state": state})
+
+    settings: dict = get_config()
+    pieces: Iterator[tuple[str, int, Optional[Span]]] = plan(canon, spans)
+    for _ in range(state["done"]):  # written before the checkpoint
+        next(pieces)
+    fetched = fetch(translation, pieces, workers=settings.get("http", {}).get("concurrency", 4),
+                    batch=getter.book_batch())
+    chapters: Iterator[tuple[str, int, bytes]] = render(fmt, translation, fetched, include_numbers, state["book"])
+
+    saved_at: float = time.monotonic()
+    finished: bool = False
+    missing: bool = False  # a chapter the translation doesn't have, which carrying on from a checkpoint won't fix
+    try:
+        for book, chapter, data in chapters:
+            out.write(data)
+            state["done"] += 1
+            if data:
+                state["book"] = book
+            if checkpoint is not None:
+                state["offset"] = out.tell()
+                if time.monotonic() - saved_at >= CHECKPOINT_EVERY:
+                    save()
+                    saved_at = time.monotonic()
+            if progress is not None:
+                progress(state["done"], total, book, chapter)
+        finished = True
+    except ValueError:
+        missing = True
+        raise
+    finally:
+        chapters.close()
+        fetched.close()  # and with it any fetching still going on
+        if checkpoint is None:
+            out.flush()
+        elif finished or missing:
+            out.close()
+            try:
+                os.remove(checkpoint)
+            except FileNotFoundError:
+                pass
+        else:
+            save()  # interrupted, or a chapter couldn't be fetched
+            out.close()
+    return state["done"]
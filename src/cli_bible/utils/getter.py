@@ -1,72 +1,620 @@
 # imports - getter.py, by McSnurtle
-import requests
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
 import time
-import curses
+import urllib.parse
 
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, Union
+
+from utils import broker as brokers, metrics
+from utils.broker import Broker
+from utils.bundle import Bundle, BundleWriter
+from utils.cache import CachedResponse, ResponseCache
+from utils.config import get_config
+from utils.reference import BookIndex, Span, format_reference, parse_reference
+from utils.verses import Chapter, Verse
+
+if TYPE_CHECKING:  # requests (and curses) are only imported once a request is actually sent, see `_fetch()`
+    import requests
 
 # ===== Variables =====
-MIN_DELAY: float = 0.6  # 15 requests / 30 seconds = 0.5 theoretical limit, +0.1 for variation
+API_URL: str = "https://bible-api.com"
+JSDELIVR_URL: str = "https://cdn.jsdelivr.net/gh/wldeh/bible-api/bibles"
+RATE_LIMIT: int = 15  # bible-api.com allows 15 requests...
+RATE_PERIOD: float = 30.0  # ...every 30 seconds, per IP
 MAX_RETRIES: int = 5
-_last_request_time: float = time.time()
+INTERACTIVE: int = 0  # request priorities, lower goes first
+BACKGROUND: int = 10
+_cache: Optional[ResponseCache] = None
+_cache_loaded: bool = False
+_broker: Optional[Broker] = None
+_broker_loaded: bool = False
+_loading_lock = threading.RLock()  # so threads racing to the first request don't see a half loaded cache or broker
+_bundles: dict[str, Optional[Bundle]] = {}
+
+
+def _get_cache() -> Optional[ResponseCache]:
+    """Lazily open the on-disk response cache described by the "cache" section of `etc/conf.json`, if enabled."""
+    global _cache, _cache_loaded
+    if not _cache_loaded:
+        with _loading_lock:
+            if not _cache_loaded:
+                settings: dict = get_config().get("cache", {})
+                if settings.get("enabled", False):
+                    _cache = ResponseCache(path=settings.get("path", "~/.cache/cli-bible/cache.sqlite3"),
+                                           max_size=int(settings.get("max_size_mb", 64) * 1024 * 1024),
+                                           ttl=settings.get("ttl"))
+                _cache_loaded = True
+    return _cache
+
+
+def _get_broker() -> Optional[Broker]:
+    """Lazily set up the broker described by the "broker" section of `etc/conf.json`, if enabled and supported here.
+    Only of use alongside the response cache, which is what it shares responses through."""
+    global _broker, _broker_loaded
+    if not _broker_loaded:
+        with _loading_lock:
+            if not _broker_loaded:
+                settings: dict = get_config().get("broker", {})
+                if settings.get("enabled", False) and brokers.supported() and _get_cache() is not None:
+                    try:
+                        _broker = Broker(settings.get("path", "~/.cache/cli-bible/broker"))
+                    except OSError:
+                        _broker = None  # i.e. a read-only home, carry on alone
+                _broker_loaded = True
+    return _broker
+
+
+def cache_key(translation: str, reference: str) -> str:
+    """Returns the cache key for `reference` in `translation`, normalized so that i.e. 'John  3' and 'john 3' match."""
+    return f"{translation.lower()}:{' '.join(reference.lower().replace('+', ' ').split())}"
+
+
+def bundle_path(translation: str) -> str:
+    """Returns where the offline bundle of `translation` lives, under the "data_dir" of `etc/conf.json`."""
+    data_dir: str = os.path.expanduser(get_config().get("data_dir", "~/.local/share/cli-bible"))
+    return os.path.join(data_dir, f"{translation.lower()}.bible")
+
+
+def get_bundle(translation: str) -> Optional[Bundle]:
+    """Returns the memory mapped offline bundle of `translation`, or None if it hasn't been downloaded."""
+    translation = translation.lower()
+    if translation not in _bundles:
+        path: str = bundle_path(translation)
+        try:
+            _bundles[translation] = Bundle(path) if os.path.exists(path) else None
+        except (OSError, ValueError):
+            _bundles[translation] = None
+    return _bundles[translation]
+
+
+def _local_response(translation: str, verses: list[dict], reference: str) -> dict:
+    """Shape `verses` read from an offline bundle, or split out of a larger response, like a bible-api.com passage."""
+    return {
+        "reference": reference,
+        "verses": verses,
+        "text": "".join(verse["text"] for verse in verses),
+        "translation_id": translation
+    }
+
+
+def get(url: str, params: Optional[dict] = None, key: Optional[str] = None,
+        cache: bool = True) -> Union["requests.Response", CachedResponse]:
+    """Send a rate limited GET request to `url`, served from the on-disk cache whenever possible.
+
+    :param url: The URL to request.
+    :type url: str
+    :param params: Optional query parameters to send alongside the request.
+    :type params: dict
+    :param key: The cache key to store the response under, see `cache_key()`. Defaults to the URL itself.
+    :type key: str
+    :param cache: Whether the response may be served from or stored in the cache at all.
+    :type cache: bool
+
+    :returns: The response of the request, the cached response if a fresh (or revalidated) one is available, or a
+        `FailedResponse` if the request couldn't be completed.
+    """
+    store: Optional[ResponseCache] = _get_cache() if cache and params is None else None
+    key = key if key is not None else url
+    stale: Optional[CachedResponse] = None
+    if store is not None:
+        hit = store.get(key)
+        if hit is None:
+            metrics.count("cache.miss")
+        else:
+            cached, fresh = hit
+            if fresh:
+                metrics.count("cache.hit")
+                return cached
+            stale = cached
+
+    broker: Optional[Broker] = _get_broker() if store is not None else None
+    if broker is None:
+        return _download(url, params, key, store, stale)
+    with broker.coalesce(key) as waited:
+        if waited:  # someone else was just downloading it, most likely into the cache
+            hit = store.get(key)
+            if hit is not None and hit[1]:
+                metrics.count("http.coalesced")
+                return hit[0]
+            stale = hit[0] if hit is not None else stale
+        return _download(url, params, key, store, stale)
+
+
+def _download(url: str, params: Optional[dict], key: str, store: Optional[ResponseCache],
+              stale: Optional[CachedResponse]) -> Union["requests.Response", CachedResponse]:
+    """The rest of `get()` once the cache can't answer on its own: revalidate `stale` or download the response anew,
+    and cache it under `key`."""
+    headers: dict[str, str] = {}
+    if stale is not None and "ETag" in stale.headers:
+        headers["If-None-Match"] = stale.headers["ETag"]
+
+    response = _fetch(url, params=params, headers=headers)
+    if store is not None:
+        if response.status_code == 304 and stale is not None:
+            metrics.count("cache.revalidated")
+            store.touch(key)
+            return stale
+        if stale is not None:
+            metrics.count("cache.miss")  # stale, and changed (or unreachable) since
+        if response.status_code == 200:
+            store.put(key, response.status_code, response.content, response.headers.get("ETag"))
+    if stale is not None and response.status_code != 200:
+        return stale  # better an outdated chapter than none at all
+    return response
+
+
+class FailedResponse(CachedResponse):
+    """Returned by `get()` in place of a response once it gives up on a request, so callers can still just check
+    `status_code`."""
+    reason: str
+
+    def __init__(self, status_code: int, reason: str):
+        super().__init__(status_code, b"{}")
+        self.reason = reason
+
+
+class RequestScheduler:
+    """A thread safe rate limiter shared by every request `get()` sends to one host, see `limit_host()`.
+
+    Works as a token bucket of `limit` tokens, where each spent token comes back `period` seconds after the request
+    that spent it finished, so no `period` long window ever sees more than `limit` requests. Waiting requests are
+    served by priority (see `INTERACTIVE` and `BACKGROUND`), then in order of arrival.
+
+    With a `broker`, each request also needs a token from the budget of `host` every process shares, see
+    `broker.Broker.reserve()`."""
+    limit: int
+    period: float
+    host: str
+    broker: Optional[Broker]
+
+    def __init__(self, limit: int = RATE_LIMIT, period: float = RATE_PERIOD, host: str = ""):
+        self.limit = limit
+        self.period = period
+        self.host = host
+        self.broker = None
+        self._spent: list[float] = []  # when each token in use comes back, as a heap
+        self._waiting: list[tuple[int, int]] = []  # (priority, ticket) of each waiting request, as a heap
+        self._tickets = itertools.count()
+        self._paused_until: float = 0
+        self._lock = threading.Condition()
+
+    def acquire(self, priority: int = INTERACTIVE) -> None:
+        """Block until a request of `priority` may be sent, then take a token for it. See `release()`."""
+        with self._lock:
+            ticket: tuple[int, int] = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now: float = time.monotonic()
+                while self._spent and self._spent[0] <= now:
+                    heapq.heappop(self._spent)
+
+                if self._waiting[0] == ticket and len(self._spent) < self.limit and now >= self._paused_until:
+                    shared_wait: float = self.broker.reserve(self.host, self.limit, self.period) \
+                        if self.broker is not None else 0
+                    if shared_wait > 0:  # other processes have spent the shared budget, stay first in line
+                        self._lock.wait(shared_wait)
+                        continue
+                    heapq.heappop(self._waiting)
+                    heapq.heappush(self._spent, float("inf"))  # in flight, see `release()`
+                    self._lock.notify_all()
+                    return
+
+                timeout: Optional[float] = None  # not our turn, or every token is in flight: wait to be notified
+                if self._waiting[0] == ticket and len(self._spent) < self.limit:  # only paused, see `pause()`
+                    timeout = max(self._paused_until - now, 0.01)
+                elif self._waiting[0] == ticket and self._spent[0] != float("inf"):
+                    timeout = max(self._paused_until - now, self._spent[0] - now, 0.01)
+                self._lock.wait(timeout)
+
+    def release(self) -> None:
+        """Start the cooldown of the token taken by the last `acquire()`, once its request has finished."""
+        with self._lock:
+            if self.broker is not None:
+                self.broker.release(self.host)
+            self._spent.remove(float("inf"))
+            heapq.heapify(self._spent)
+            heapq.heappush(self._spent, time.monotonic() + self.period)
+            self._lock.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request back for `seconds`, i.e. because the server answered with a `Retry-After` header."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            if self.broker is not None:
+                self.broker.pause(self.host, seconds)
+            self._lock.notify_all()
+
+
+scheduler = RequestScheduler()  # bible-api.com's, and that of any host without a limit of its own
+_schedulers: dict[str, RequestScheduler] = {}
+_priority = threading.local()
+_sessions: dict[str, "requests.Session"] = {}
+_sessions_lock = threading.Lock()
+_http_settings: Optional[dict] = None
+_api_url: Optional[str] = None
+_jsdelivr_url: Optional[str] = None
+_book_batch: Optional[int] = None
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Send every request made by the current thread within this block at priority `level`.
+
+    i.e. `with priority(BACKGROUND): get_chapter(...)` lets interactive requests from other threads go first."""
+    previous: int = getattr(_priority, "level", INTERACTIVE)
+    _priority.level = level
+    try:
+        yield
+    finally:
+        _priority.level = previous
 
 
-def get(url: str, params: Optional[dict] = None) -> requests.Response:
-    global _last_request_time
+def limit_host(url: str, limit: int, period: float = RATE_PERIOD) -> RequestScheduler:
+    """Give the host of `url` a rate limit of its own, so it neither waits on nor counts towards bible-api.com's.
+
+    :returns: The scheduler of the host.
+    :rtype RequestScheduler:
+    """
+    host: str = urllib.parse.urlsplit(url).netloc
+    with _sessions_lock:
+        if host not in _schedulers:
+            _schedulers[host] = RequestScheduler(limit=limit, period=period, host=host)
+        return _schedulers[host]
+
+
+def _scheduler(url: str) -> RequestScheduler:
+    limiter: RequestScheduler = _schedulers.get(urllib.parse.urlsplit(url).netloc, scheduler)
+    if limiter.broker is None:
+        limiter.broker = _get_broker()
+    return limiter
+
+
+def _session(url: str) -> "requests.Session":
+    """Returns the pooled, keep-alive session for the host of `url`, creating it on first use from the "http"
+    section of `etc/conf.json`."""
+    import requests  # deferred, as it takes longer to import than answering from the cache does
+    import requests.adapters
+    import requests.utils
+
+    host: str = urllib.parse.urlsplit(url).netloc
+    with _sessions_lock:
+        if host not in _sessions:
+            settings: dict = _http()
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=settings.get("pool_size", 4))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Accept-Encoding": requests.utils.DEFAULT_ACCEPT_ENCODING,  # gzip, deflate, and br if brotli is installed
+                "Connection": "keep-alive",
+                "User-Agent": "cli-bible"
+            })
+            _sessions[host] = session
+        return _sessions[host]
+
+
+def _http() -> dict:
+    """Returns the "http" section of `etc/conf.json`, read once."""
+    global _http_settings
+    if _http_settings is None:
+        _http_settings = get_config().get("http", {})
+    return _http_settings
+
+
+def api_url() -> str:
+    """Returns the base URL of bible-api.com, or of whatever stands in for it under "backends" -> "bible-api" -> "url"
+    in `etc/conf.json` (i.e. the fake server of `bench/server.py`), read once."""
+    global _api_url
+    if _api_url is None:
+        _api_url = get_config().get("backends", {}).get("bible-api", {}).get("url", API_URL).rstrip("/")
+    return _api_url
+
+
+def jsdelivr_url() -> str:
+    """Returns the base URL of the jsDelivr mirror, or of whatever stands in for it under "backends" -> "jsdelivr" ->
+    "url" in `etc/conf.json`, read once."""
+    global _jsdelivr_url
+    if _jsdelivr_url is None:
+        _jsdelivr_url = get_config().get("backends", {}).get("jsdelivr", {}).get("url", JSDELIVR_URL).rstrip("/")
+    return _jsdelivr_url
+
+
+def book_batch() -> int:
+    """Returns how many uncached chapters of a book are fetched per request, "book_batch" in `etc/conf.json`, read
+    once."""
+    global _book_batch
+    if _book_batch is None:
+        _book_batch = max(get_config().get("book_batch", 1), 1)
+    return _book_batch
+
+
+def _timeout() -> tuple[float, float]:
+    return _http().get("connect_timeout", 3.05), _http().get("read_timeout", 10)
+
+
+def close_sessions() -> None:
+    """Close every pooled session, and with them their open connections."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _retry_after(response: "requests.Response") -> Optional[float]:
+    """Returns how many seconds the `Retry-After` header of `response` asks us to wait, if it has one."""
+    value: Optional[str] = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    import email.utils
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
 
-    elapsed: float = time.time() - _last_request_time
-    if elapsed < MIN_DELAY:
-        time.sleep(MIN_DELAY - elapsed)
+def _fetch(url: str, params: Optional[dict] = None,
+           headers: Optional[dict[str, str]] = None) -> Union["requests.Response", FailedResponse]:
+    import curses
+    import requests
 
+    level: int = getattr(_priority, "level", INTERACTIVE)
+    session: "requests.Session" = _session(url)
+    limiter: RequestScheduler = _scheduler(url)
+    timeout: tuple[float, float] = _timeout()
     delay: float = 1
     notified: bool = False
+    failure = FailedResponse(503, "No attempts made")
     for attempt in range(MAX_RETRIES):
-        response = requests.get(url, params=params)
-
-        if response.status_code != 429:  # handle HTTP rate limit error
+        started: float = metrics.clock()
+        limiter.acquire(level)
+        metrics.record("http.throttle", started)  # waiting on the rate limit, and any Retry-After pause
+        started = metrics.clock()
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            failure = FailedResponse(503, str(e))
+            response = None
+            metrics.count("http.error")
+        finally:
+            limiter.release()
+        metrics.record("http.request", started)
+
+        if response is not None and response.status_code not in (429, 503):  # handle HTTP rate limit error
             return response
-
-        if not notified:
-            curses.beep()
+        if response is not None:
+            failure = FailedResponse(response.status_code, f"Gave up after {MAX_RETRIES} attempts")
+            metrics.count(f"http.{response.status_code}")
+        if attempt == MAX_RETRIES - 1:
+            break  # nothing will retry, so don't hold back the requests queued behind this one either
+        metrics.count("http.retry")
+
+        if not notified and level == INTERACTIVE:
+            try:
+                curses.beep()
+            except curses.error:
+                pass  # not running the TUI, i.e. `bible John 3:16`
             notified = True
         delay = min(delay * 2,
                     30)  # exponential backoff with a max limit of the 30 seconds if somehow you requested 15 chapters in under 1 second
-        time.sleep(delay)
+        wait: Optional[float] = _retry_after(response) if response is not None else None
+        limiter.pause(wait if wait is not None else delay)
+    return failure
 
 
 def available_bibles() -> tuple[int, list[dict]]:
-    response: requests.Response = get("https://bible-api.com/data")
+    response: requests.Response = get(f"{api_url()}/data")
     return response.status_code, response.json() if response.status_code == 200 else {}
 
 
 def available_books(translation: str) -> tuple[int, list[dict]]:
-    response: requests.Response = get(f"https://bible-api.com/data/{translation}")
+    bundle: Optional[Bundle] = get_bundle(translation)
+    if bundle is not None:
+        return 200, [{"id": book["id"], "name": book["name"], "url": ""} for book in bundle.books]
+
+    response: requests.Response = get(f"{api_url()}/data/{translation}",
+                                      key=cache_key(translation, "/data"))
     return response.status_code, response.json()["books"] if response.status_code == 200 else {}
 
 
+class CanonIndex:
+    """An in-memory index of the books of a translation, in canonical order.
+
+    Built once per translation (see `get_canon()`) so that chapter navigation, alias resolution and last chapter
+    lookups don't need to re-download the book list every time. Chapter counts are filled in lazily, one `get_book()`
+    call per book at most, and are persisted alongside the response cache if enabled."""
+    translation: str
+    book_ids: list[str]
+    names: dict[str, str]
+    aliases: dict[str, str]
+    chapters: dict[str, int]
+
+    def __init__(self, translation: str, books: list[dict], chapters: Optional[dict[str, int]] = None):
+        self.translation = translation
+        self.book_ids = [book["id"] for book in books]
+        self.names = {book["id"]: book["name"] for book in books}
+        self.chapters = dict(chapters) if chapters is not None else {}
+        self._positions: dict[str, int] = {book_id: idx for idx, book_id in enumerate(self.book_ids)}
+        self._book_index: Optional[BookIndex] = None
+
+        self.aliases = {}
+        for book in books:
+            self.aliases[book["id"].lower()] = book["id"]
+            self.aliases[book["name"].lower()] = book["id"]
+            self.aliases[book["name"].lower().replace(" ", "")] = book["id"]
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    def __contains__(self, book: str) -> bool:
+        return book.lower() in self.aliases or self.book_index.lookup(book) is not None
+
+    @property
+    def book_index(self) -> BookIndex:
+        """The completion and misspelling index of the books' aliases, built on first use."""
+        if self._book_index is None:
+            self._book_index = BookIndex(self)
+        return self._book_index
+
+    def canonical(self, book: str) -> str:
+        """Returns the canonical ID of `book`, which may be any alias of the book (i.e. 'john', 'JHN', '1john') or a
+        common abbreviation of it (i.e. 'psalm', 'II Kgs'), see `reference.ABBREVIATIONS`."""
+        found: Optional[str] = self.aliases.get(book.lower())
+        if found is None:
+            found = self.book_index.lookup(book)
+        if found is None:
+            raise KeyError(f"No book {book} in {self.translation} translation.")
+        return found
+
+    def position(self, book: str) -> int:
+        """Returns the index of `book` within the canon."""
+        return self._positions[self.canonical(book)]
+
+    def final_chapter(self, book: str) -> int:
+        """Returns the last chapter number of `book`, fetching and remembering it if it isn't known yet."""
+        book = self.canonical(book)
+        if book not in self.chapters:
+            code, response = get_book(self.translation, book)
+            if code != 200:
+                raise ValueError(f"No book {book} found in {self.translation} translation")
+            self.chapters[book] = max([chapter["chapter"] for chapter in response["chapters"]])
+            self.save()
+        return self.chapters[book]
+
+    def step(self, book: str, chapter: int, steps: int) -> Optional[tuple[str, int]]:
+        """Returns the (book ID, chapter) pair `steps` chapters away from `book` `chapter`, crossing book boundaries
+        if needed, or None if that would leave the canon."""
+        idx: int = self.position(book)
+        chapter += steps
+        while chapter < 1 or chapter > self.final_chapter(self.book_ids[idx]):
+            if chapter < 1:
+                idx -= 1
+                if idx < 0:
+                    return None
+                chapter += self.final_chapter(self.book_ids[idx])
+            else:
+                chapter -= self.final_chapter(self.book_ids[idx])
+                idx += 1
+                if idx >= len(self.book_ids):
+                    return None
+        return self.book_ids[idx], chapter
+
+    def to_dict(self) -> dict:
+        return {
+            "translation": self.translation,
+            "books": [{"id": book_id, "name": self.names[book_id]} for book_id in self.book_ids],
+            "chapters": self.chapters
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CanonIndex":
+        return cls(data["translation"], data["books"], data.get("chapters"))
+
+    @classmethod
+    def build(cls, translation: str) -> "CanonIndex":
+        """Build the index for `translation` from a persisted copy if there is one, or from a single request if not."""
+        bundle: Optional[Bundle] = get_bundle(translation)
+        if bundle is not None:
+            return cls(translation, bundle.books, {book["id"]: len(book["chapters"]) for book in bundle.books})
+
+        path: Optional[str] = _canon_path(translation)
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r") as fp:
+                    return cls.from_dict(json.load(fp))
+            except (OSError, ValueError, KeyError):
+                pass  # corrupt copy, just rebuild it
+
+        code, books = available_books(translation)
+        index = cls(translation, books if code == 200 else [])
+        if code == 200:
+            index.save()
+        return index
+
+    def save(self) -> None:
+        """Persist the index next to the response cache, if the cache is enabled."""
+        path: Optional[str] = _canon_path(self.translation)
+        if path is None or not self.book_ids:
+            return
+        try:
+            with open(path, "w") as fp:
+                json.dump(self.to_dict(), fp)
+        except OSError:
+            pass
+
+
+_canons: dict[str, CanonIndex] = {}
+
+
+def _canon_path(translation: str) -> Optional[str]:
+    store: Optional[ResponseCache] = _get_cache()
+    if store is None:
+        return None
+    return os.path.join(os.path.dirname(store.path), f"canon-{translation.lower()}.json")
+
+
+def known_canon(translation: str) -> Optional[CanonIndex]:
+    """Returns the `CanonIndex` of `translation` if it's already been built, without building it."""
+    return _canons.get(translation.lower())
+
+
+def remember_canon(index: CanonIndex) -> None:
+    """Use `index` for its translation from now on, i.e. one restored from a session snapshot."""
+    if len(index):
+        _canons.setdefault(index.translation.lower(), index)
+
+
+def get_canon(translation: str) -> CanonIndex:
+    """Returns the memoized `CanonIndex` of `translation`, building it on first use."""
+    translation = translation.lower()
+    if translation not in _canons:
+        index: CanonIndex = CanonIndex.build(translation)
+        if not len(index):
+            return index  # don't remember failed lookups, i.e. when offline
+        _canons[translation] = index
+    return _canons[translation]
+
+
 def _book_ids(translation: str) -> list[str]:
     """Returns a list of canonical book IDs for all available books in `translation`."""
-    return [book["id"] for book in available_books(translation)[1]]
+    return get_canon(translation).book_ids
 
 
 def _book_aliases(translation: str) -> tuple[int, dict[str, str]]:
     """Returns the status code of the request and a dictionary of all valid / possible book names to their respective canonical IDs for the `translation`."""
-    code, book_data = available_books(translation)
-    aliases: dict[str, str] = {}
-    for book in book_data:
-        aliases[book["id"].lower()] = book["id"]
-        aliases[book["name"].lower()] = book["id"]
-        aliases[book["name"].lower().replace(" ", "")] = book["id"]
-
-    return code, aliases
+    canon: CanonIndex = get_canon(translation)
+    return 200 if len(canon) else 404, canon.aliases
 
 
 def get_canonical_of_book(translation: str, book: str) -> str:
-    code, aliases = _book_aliases(translation)
-    book = book.lower() if not book.lower() == "psalm" else "psalms"
-    if book not in aliases:
-        raise KeyError(f"No book {book} in {translation} translation.")
-    return aliases[book]
+    return get_canon(translation).canonical(book)
 
 
 def get_final_chapter_id(translation: str, book: str) -> int:
@@ -79,32 +627,164 @@ def get_final_chapter_id(translation: str, book: str) -> int:
     :returns: The last chapter number in the `book` specified in `translation`.
     :rtype int:
     """
-    book: str = get_canonical_of_book(translation=translation, book=book)
-    code, response = get_book(translation, book)
-    if code != 200:
-        raise ValueError(f"No book {book} found in {translation} translation")
-    return max(
-        [chapter["chapter"] for chapter in response["chapters"]])  # return the largest ID from the returned chapters
+    return get_canon(translation).final_chapter(book)
 
 
 def get_random_verse(translation: str) -> tuple[int, dict]:
+    bundle: Optional[Bundle] = get_bundle(translation)
+    if bundle is not None and len(bundle):
+        return 200, {"random_verse": bundle.verse(random.randrange(len(bundle)))}
+
     response: requests.Response = get(
-        f"https://bible-api.com/data/{translation}/random"
+        f"{api_url()}/data/{translation}/random", cache=False
     )
     return response.status_code, response.json() if response.status_code == 200 else {}
 
 
 def get_book(translation: str, book: str) -> tuple[int, dict]:
+    bundle: Optional[Bundle] = get_bundle(translation)
+    if bundle is not None:
+        try:
+            book = get_canonical_of_book(translation, book)
+        except KeyError:
+            return 404, {}
+        name: str = get_canon(translation).names[book]
+        return 200, {"chapters": [{"book_id": book, "book": name, "chapter": chapter}
+                                  for chapter in range(1, get_final_chapter_id(translation, book) + 1)]}
+
     response: requests.Response = get(
-        f"https://bible-api.com/data/{translation}/{book}"
+        f"{api_url()}/data/{translation}/{book}", key=cache_key(translation, f"/data/{book}")
     )
     return response.status_code, response.json() if response.status_code == 200 else {}
 
 
 def get_chapter(translation: str, book: str, chapter: int) -> tuple[int, dict]:
-    response: requests.Response = get(
-        f"https://bible-api.com/{book}+{chapter}?translation={translation}&single_chapter_book_matching=indifferent")
-    return response.status_code, response.json() if response.status_code == 200 else {}
+    """Fetch `book` `chapter` of `translation` from the best backend for it, see `backends.fetch_chapter()`."""
+    from utils.backends import fetch_chapter  # deferred, as the backends are built on this module
+
+    return fetch_chapter(translation=translation, book=book, chapter=chapter)
+
+
+def iter_book(translation: str, book: str, batch: int = 1) -> Iterator[tuple[int, dict]]:
+    """Yields the status code and response of every chapter of `book` in `translation`, in order, as they arrive.
+
+    :param translation: The translation identifier to search in.
+    :type translation: str
+    :param book: The book to load, any valid identifier.
+    :type book: str
+    :param batch: How many chapters to request at once using a multi-chapter reference. Chapters missing from a batch's
+        response are requested one by one instead.
+    :type batch: int
+    """
+    book = get_canonical_of_book(translation, book)
+    final: int = get_final_chapter_id(translation, book)
+    batch = batch if get_bundle(translation) is None else 1  # offline chapters are already as cheap as they get
+
+    for first in range(1, final + 1, max(batch, 1)):
+        chapters: range = range(first, min(first + batch, final + 1))
+        fetched: dict[int, dict] = fetch_batch(translation, book, list(chapters)) if len(chapters) > 1 else {}
+        for chapter in chapters:
+            yield (200, fetched[chapter]) if chapter in fetched else get_chapter(translation=translation, book=book,
+                                                                                 chapter=chapter)
+
+
+def fetch_batch(translation: str, book: str, chapters: list[int]) -> dict[int, dict]:
+    """Request several chapters of `book` (a canonical ID) in one multi-chapter reference, caching each of them
+    separately so later visits to a single chapter don't need a request either.
+
+    :returns: The response of each chapter that was in the batch's response, by chapter number.
+    """
+    code, response = _get_raw_remote(translation=translation,
+                                     raw=f"{book} " + ",".join(f"{chapter}:1-999" for chapter in chapters))
+    grouped: dict[int, list[dict]] = {}
+    for verse in response.get("verses", []) if code == 200 else []:
+        grouped.setdefault(int(verse["chapter"]), []).append(verse)
+
+    fetched: dict[int, dict] = {}
+    store: Optional[ResponseCache] = _get_cache()
+    for chapter in chapters:
+        if chapter not in grouped:
+            continue
+        verses: list[dict] = grouped[chapter]
+        fetched[chapter] = _local_response(translation, verses, f"{verses[0]['book_name']} {chapter}")
+        if store is not None:
+            store.put(cache_key(translation, f"{book} {chapter}"), 200, json.dumps(fetched[chapter]).encode("utf-8"))
+    return fetched
+
+
+def is_cached(translation: str, book: str, chapter: int) -> bool:
+    """Returns whether `get_chapter()` can answer for `book` (a canonical ID) `chapter` without a request."""
+    from utils.backends import get_backends
+
+    return any(backend.available(translation) and backend.lookup(translation, book, chapter) is not None
+               for backend in get_backends())
+
+
+def _get_chapters(translation: str, chapters: list[tuple[str, int]]) -> dict[tuple[str, int], dict]:
+    """Fetch every (book ID, chapter) pair in `chapters` once, batching runs of chapters that aren't cached yet.
+
+    :returns: The response of every chapter that could be found, by (book ID, chapter).
+    """
+    fetched: dict[tuple[str, int], dict] = {}
+    missing: dict[str, list[int]] = {}
+    for book, chapter in dict.fromkeys(chapters):  # deduplicated, in order
+        if not is_cached(translation, book, chapter):
+            missing.setdefault(book, []).append(chapter)
+
+    batch: int = book_batch()
+    for book, numbers in missing.items():
+        for first in range(0, len(numbers), batch):
+            if len(numbers[first:first + batch]) > 1:
+                fetched.update({(book, chapter): response for chapter, response in
+                                fetch_batch(translation, book, numbers[first:first + batch]).items()})
+
+    for book, chapter in dict.fromkeys(chapters):
+        if (book, chapter) not in fetched:
+            code, response = get_chapter(translation=translation, book=book, chapter=chapter)
+            if code == 200:
+                fetched[(book, chapter)] = response
+    return fetched
+
+
+def get_passages(translation: str, passages: list[list[Span]]) -> list[tuple[int, dict]]:
+    """Returns the status code and response of each passage (as parsed by `reference.parse_reference`), fetching
+    every chapter they need between them only once.
+
+    :param translation: The translation identifier to search in.
+    :type translation: str
+    :param passages: The spans of each passage.
+    :type passages: list[list[Span]]
+
+    :returns: The status code and bible-api.com shaped response of each passage, in order. 404 if a passage is empty or
+        any of its chapters couldn't be found.
+    """
+    canon: CanonIndex = get_canon(translation)
+    needed: dict[int, list[tuple[str, int]]] = {}
+    missing: set[int] = set()  # passages of a whole book that can't be found, which are just a 404
+    for idx, spans in enumerate(passages):
+        needed[idx] = []
+        try:
+            for span in spans:
+                chapters: range = span.chapters if span.chapter is not None else \
+                    range(1, canon.final_chapter(span.book) + 1)
+                needed[idx].extend((span.book, chapter) for chapter in chapters)
+        except ValueError:
+            needed[idx] = []
+            missing.add(idx)
+    fetched: dict[tuple[str, int], dict] = _get_chapters(translation, [pair for pairs in needed.values()
+                                                                        for pair in pairs])
+
+    results: list[tuple[int, dict]] = []
+    for idx, spans in enumerate(passages):
+        if idx in missing or any(pair not in fetched for pair in needed[idx]):
+            results.append((404, {}))
+            continue
+        verses: list[dict] = [verse for span in spans for book, chapter in dict.fromkeys(needed[idx]) if
+                              book == span.book for verse in fetched[(book, chapter)]["verses"] if
+                              span.contains(int(verse["chapter"]), int(verse["verse"]))]
+        results.append((200, _local_response(translation, verses, format_reference(canon, spans))) if verses else
+                       (404, {}))
+    return results
 
 
 def get_next_chapter(translation: str, book: str, chapter: int, steps: int) -> tuple[int, dict]:
@@ -124,47 +804,152 @@ def get_next_chapter(translation: str, book: str, chapter: int, steps: int) -> t
 
     Returns status code 404 for chapter not available, and 200 if chapter exists.
     """
-    chapter += steps
-    book_ids = _book_ids(translation)
-    book = get_canonical_of_book(translation, book)
-    code, response = get_raw(translation=translation, raw=f"{book} {chapter}")
-    if code == 200:
-        return code, response
-
     try:
-        new_book = book_ids[book_ids.index(book) + steps]
-        new_chapter = 1 if steps > 0 else get_final_chapter_id(translation, new_book)
-        return get_raw(translation=translation, raw=f"{book} {chapter}")
-    except (ValueError, IndexError):
+        target: Optional[tuple[str, int]] = get_canon(translation).step(book, chapter, steps)
+    except (KeyError, ValueError):
+        return 404, {}
+    if target is None:
         return 404, {}  # no more books!
 
+    return get_chapter(translation=translation, book=target[0], chapter=target[1])
+
 
 def get_raw(translation: str, raw: str) -> tuple[int, dict]:
     """Uses the bible-api's User Input API to allow shorthand and verse ranges. May return a chapter or specific verses.
 
     :param translation: The translation identifier to search in.
     :type translation: str
-    :param raw: The user input to search for. May be 'Matthew 6', 'matt6', 'matt 6:3-5,8'
+    :param raw: The user input to search for. May be 'Matthew 6', 'matt6', 'matt 6:3-5,8', 'John 3:16-4:2'
     :type raw: str
 
+    References are parsed locally where possible (see `reference.parse_reference`), so only the chapters which aren't
+    cached yet are fetched. Anything the local parser doesn't understand is handed to the server as is.
+
     :returns: The status code of the request and the JSON response if applicable.
 
     Status code 404 if the query is invalid or could not be found, and 200 if request was successful.
     """
+    if raw.strip() == "":
+        return 404, {}
+    try:
+        spans: Optional[list[Span]] = parse_reference(get_canon(translation), raw)
+    except (KeyError, ValueError):
+        spans = None
+    if spans is not None:
+        return get_passages(translation, [spans])[0]
+    return _get_raw_remote(translation, raw)
+
+
+def get_raw_many(translation: str, raws: list[str]) -> list[tuple[int, dict]]:
+    """Like `get_raw()` for a whole reading list at once: every chapter needed between them is fetched only once, and
+    runs of uncached chapters are batched into as few requests as possible.
+
+    :returns: The status code and response of each query in `raws`, in order.
+    """
+    try:
+        canon: Optional[CanonIndex] = get_canon(translation)
+    except (KeyError, ValueError):
+        canon = None  # so everything is handed to the server, as `get_raw()` would
+    parsed: list[Optional[list[Span]]] = []
+    for raw in raws:
+        try:
+            parsed.append(parse_reference(canon, raw) if canon is not None and raw.strip() else None)
+        except (KeyError, ValueError):
+            parsed.append(None)
+    passages: list[list[Span]] = [spans for spans in parsed if spans is not None]
+    local: list[tuple[int, dict]] = get_passages(translation, passages) if passages else []
+    results: list[tuple[int, dict]] = []
+    for raw, spans in zip(raws, parsed):
+        if spans is not None:
+            results.append(local.pop(0))
+        else:
+            results.append(_get_raw_remote(translation, raw) if raw.strip() else (404, {}))
+    return results
+
+
+def _get_raw_remote(translation: str, raw: str) -> tuple[int, dict]:
+    """Have bible-api.com parse and answer `raw`, for queries `reference.parse_reference` doesn't understand."""
     response: requests.Response = get(
-        f"https://bible-api.com/{raw}?translation={translation}&single_chapter_book_matching=indifferent"
+        f"{api_url()}/{raw}?translation={translation}&single_chapter_book_matching=indifferent",
+        key=cache_key(translation, raw)
     )
     return response.status_code if raw != "" else 404, response.json() if response.status_code == 200 and raw != "" else {}
 
 
-def chapter_to_lines(data: list[dict], include_numbers: bool = True) -> list[str]:
-    lines = [f"{data[0]['book_name']} {data[0]['chapter']}:"]
-    for verse in data:
-        lines.append(verse_to_string(verse, include_numbers))
+def download_translation(translation: str,
+                         progress: Optional[Callable[[str, int, int], None]] = None) -> str:
+    """Download every chapter of `translation` into an offline bundle, see `bundle_path()`.
+
+    :param translation: The translation identifier to download.
+    :type translation: str
+    :param progress: Called with the book name, chapter number and final chapter number after every chapter.
+    :type progress: Callable[[str, int, int], None]
+
+    :returns: The path of the written bundle.
+    :rtype str:
+    """
+    translation = translation.lower()
+    code, books = available_books(translation)
+    if code != 200:
+        raise ValueError(f"No translation {translation} found.")
+
+    writer = BundleWriter(translation)
+    for book in books:
+        writer.add_book(book["id"], book["name"])
+        code, response = get_book(translation, book["id"])
+        if code != 200:
+            raise ValueError(f"Could not download {book['name']} from {translation} translation.")
+        final: int = max([chapter["chapter"] for chapter in response["chapters"]])
+        for chapter in range(1, final + 1):
+            code, response = get_chapter(translation, book["id"], chapter)
+            if code != 200:
+                raise ValueError(f"Could not download {book['name']} {chapter} from {translation} translation.")
+            writer.add_chapter(response["verses"])
+            if progress is not None:
+                progress(book["name"], chapter, final)
+
+    path: str = bundle_path(translation)
+    writer.write(path)
+    old: Optional[Bundle] = _bundles.pop(translation, None)
+    if old is not None:
+        old.close()
+    return path
+
+
+def chapter_to_lines(data: Union[list[dict], Chapter], include_numbers: bool = True) -> list[str]:
+    chapter: Chapter = data if isinstance(data, Chapter) else Chapter.from_verses(data)
+    return [f"{chapter.book_name} {chapter.number}:", *chapter.lines(include_numbers)]
+
+
+def align_chapters(chapters: list[Optional[Chapter]], include_numbers: bool = True) -> list[tuple[str, ...]]:
+    """Line up the verses of the same chapter in several translations, for a `widgets.ParallelFrame`.
+
+    Verses are matched by number rather than position, so where a translation splits or joins verses differently the
+    rest stay level; a verse missing from one translation just leaves its cell blank.
+
+    :param chapters: The chapter in each translation, or None where it couldn't be fetched.
+    :type chapters: list[Optional[Chapter]]
+    :param include_numbers: Whether to start each verse with its number.
+    :type include_numbers: bool
+
+    :returns: One tuple per verse number holding the verse in each translation, after a heading tuple.
+    :rtype list[tuple[str, ...]]:
+    """
+    if all(chapter is None for chapter in chapters):
+        return []
+    positions: list[dict[int, int]] = [{number: idx for idx, number in enumerate(chapter.numbers)}
+                                       if chapter is not None else {} for chapter in chapters]
+    lines: list[tuple[str, ...]] = [tuple(f"{chapter.book_name} {chapter.number}:" if chapter is not None
+                                          else "Not available" for chapter in chapters)]
+    for number in sorted(set().union(*positions)):
+        lines.append(tuple(chapter[position[number]].line(include_numbers) if number in position else ""
+                           for chapter, position in zip(chapters, positions)))
     return lines
 
 
-def verse_to_string(data: dict, include_number: bool = True) -> str:
+def verse_to_string(data: Union[dict, Verse], include_number: bool = True) -> str:
+    if isinstance(data, Verse):
+        return data.line(include_number)
     prefix: str = ""
     if include_number:
         prefix = f"{data['verse']} "
@@ -173,5 +958,6 @@ def verse_to_string(data: dict, include_number: bool = True) -> str:
 
 def get_verse(translation: str, book: str, chapter: int, verse: int) -> tuple[int, dict]:
     response: requests.Response = get(
-        f"https://cdn.jsdelivr.net/gh/wldeh/bible-api/bibles/{translation}/books/{book}/chapters/{chapter}/verses/{verse}.json")
+        f"{jsdelivr_url()}/{translation}/books/{book}/chapters/{chapter}/verses/{verse}.json",
+        key=cache_key(translation, f"{book} {chapter}:{verse}@jsdelivr"))
     return response.status_code, response.json() if response.status_code == 200 else {}
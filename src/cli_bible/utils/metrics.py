@@ -0,0 +1,166 @@
+# imports - metrics.py, by McSnurtle
+import atexit
+import collections
+import os
+import threading
+import time
+
+from typing import Optional
+
+# ===== Variables =====
+RECENT: int = 512  # samples kept per series for its percentiles, the oldest are dropped first
+enabled: bool = False  # checked before anything is measured, so instrumented code costs next to nothing while off
+_series: dict[str, "Series"] = {}
+_counters: collections.Counter = collections.Counter()
+_lock = threading.RLock()
+_export_path: Optional[str] = None
+_profile_path: Optional[str] = None
+_profiler = None  # cProfile.Profile, while profiling
+
+
+# ===== Classes =====
+class Series:
+    """Timings of one thing, i.e. every frame rendered: how many, how long in total and at worst, and the most recent
+    `RECENT` of them for percentiles."""
+    __slots__ = ("count", "total", "peak", "recent")
+
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0
+        self.peak: float = 0
+        self.recent: collections.deque[float] = collections.deque(maxlen=RECENT)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.peak = max(self.peak, value)
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        """Returns the `q`th (0 to 100) percentile of the recent samples, in seconds."""
+        with _lock:  # it's recorded into from other threads
+            ordered: list[float] = sorted(self.recent)
+        if not ordered:
+            return 0
+        return ordered[min(int(len(ordered) * q / 100), len(ordered) - 1)]
+
+    def to_dict(self) -> dict:
+        """Returns the series summarised in milliseconds, see `summary()`."""
+        return {"count": self.count, "total_ms": self.total * 1000, "max_ms": self.peak * 1000,
+                "p50_ms": self.percentile(50) * 1000, "p90_ms": self.percentile(90) * 1000,
+                "p99_ms": self.percentile(99) * 1000}
+
+
+# ===== Functions =====
+def clock() -> float:
+    """Returns the time to pass to `record()` once whatever is being timed is done, or 0 while disabled.
+
+    i.e. `started = metrics.clock()`, do the work, then `metrics.record("render", started)`."""
+    return time.perf_counter() if enabled else 0
+
+
+def record(name: str, started: float) -> None:
+    """Add the time since `started` (from `clock()`) to the series `name`. Does nothing while disabled, or if it was
+    only enabled after `started`."""
+    if not enabled or not started:
+        return
+    elapsed: float = time.perf_counter() - started
+    with _lock:
+        if name not in _series:
+            _series[name] = Series()
+        _series[name].add(elapsed)
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add `amount` to the counter `name`, i.e. `count("cache.hit")`. Does nothing while disabled."""
+    if enabled:
+        with _lock:
+            _counters[name] += amount
+
+
+def series(name: str) -> Optional[Series]:
+    return _series.get(name)
+
+
+def counter(name: str) -> int:
+    return _counters[name]
+
+
+def cache_ratio() -> Optional[float]:
+    """Returns the share of cache lookups answered without downloading the response again, or None if there were none.
+    Revalidated entries count as hits, as only their headers came over the network."""
+    hits: int = _counters["cache.hit"] + _counters["cache.revalidated"]
+    lookups: int = hits + _counters["cache.miss"]
+    return hits / lookups if lookups else None
+
+
+def summary() -> dict:
+    """Returns everything measured so far: each series (see `Series.to_dict()`), each counter, and the cache hit
+    ratio."""
+    with _lock:
+        return {"series": {name: timings.to_dict() for name, timings in sorted(_series.items())},
+                "counters": dict(sorted(_counters.items())),
+                "cache_hit_ratio": cache_ratio()}
+
+
+def reset() -> None:
+    with _lock:
+        _series.clear()
+        _counters.clear()
+
+
+def export(path: Optional[str] = None) -> None:
+    """Write `summary()` to `path` as JSON, or to wherever `enable()` was asked to export to."""
+    path = path if path is not None else _export_path
+    if path is None:
+        return
+    try:
+        from utils.config import write_json
+        write_json(path, summary())
+    except (OSError, TypeError, ValueError):
+        pass  # never worth crashing over on the way out
+
+
+def _stop_profiling() -> None:
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    try:
+        os.makedirs(os.path.dirname(_profile_path) or ".", exist_ok=True)
+        _profiler.dump_stats(_profile_path)
+    except OSError:
+        pass
+    _profiler = None
+
+
+def enable(export_path: Optional[str] = None, profile_path: Optional[str] = None) -> None:
+    """Start measuring, and optionally write what was measured to `export_path` as JSON (see `summary()`) and a
+    cProfile dump of the calling thread to `profile_path` at exit, which `python -m pstats` can open."""
+    global enabled, _export_path, _profile_path, _profiler
+    enabled = True
+    if export_path is not None and _export_path is None:
+        _export_path = os.path.expanduser(export_path)
+        atexit.register(export)
+    if profile_path is not None and _profiler is None:
+        import cProfile  # only when asked for, it's not free to import
+
+        _profile_path = os.path.expanduser(profile_path)
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        atexit.register(_stop_profiling)
+
+
+def disable() -> None:
+    """Stop measuring. What was already measured is kept, see `reset()`."""
+    global enabled
+    enabled = False
+
+
+def configure(settings: dict, export_path: Optional[str] = None, profile_path: Optional[str] = None) -> None:
+    """Enable metrics as the "metrics" section of `etc/conf.json` (`settings`) asks, or as `export_path` and
+    `profile_path` (i.e. from the command line) do, which take precedence."""
+    export_path = export_path if export_path is not None else settings.get("export")
+    profile_path = profile_path if profile_path is not None else settings.get("profile")
+    if settings.get("enabled", False) or export_path is not None or profile_path is not None:
+        enable(export_path, profile_path)
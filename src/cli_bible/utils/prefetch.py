@@ -0,0 +1,118 @@
+# imports - prefetch.py, by McSnurtle
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+from utils.getter import BACKGROUND, get_canon, get_chapter, get_next_chapter, priority
+from utils.verses import Chapter
+
+
+# ===== Classes =====
+class Prefetcher:
+    """Fetches the chapters surrounding the one being read on a background thread, so page turns can be served
+    straight from memory. Chapters are kept packed as `Chapter`s rather than the responses they arrived in.
+
+    Every call to `focus()` starts a new generation; the worker drops whatever is left of the previous one as soon as
+    its current request finishes, so jumping elsewhere never leaves a queue of stale chapters to wait behind."""
+    translation: str
+    window: int
+    capacity: int
+
+    def __init__(self, translation: str, window: int = 1, capacity: int = 32):
+        self.translation = translation
+        self.window = window
+        self.capacity = capacity
+        self._store: OrderedDict[tuple[str, int], Chapter] = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._generation: int = 0
+        self._target: Optional[tuple[str, int]] = None
+        self._running: bool = True
+
+        self._thread = threading.Thread(target=self._work, name="prefetch", daemon=True)
+        if self.window > 0:
+            self._thread.start()
+
+    def get(self, book: str, chapter: int) -> Optional[dict]:
+        """Returns the stored response for `book` (a canonical ID) `chapter`, or None if it hasn't been fetched."""
+        with self._lock:
+            if (book, chapter) not in self._store:
+                return None
+            self._store.move_to_end((book, chapter))
+            return self._store[(book, chapter)].to_response()
+
+    def put(self, book: str, chapter: int, response: dict) -> None:
+        packed: Chapter = Chapter.from_verses(response["verses"])
+        with self._lock:
+            self._store[(book, chapter)] = packed
+            self._store.move_to_end((book, chapter))
+            while len(self._store) > self.capacity:
+                self._store.popitem(last=False)
+
+    def focus(self, book: str, chapter: int) -> None:
+        """Start prefetching the chapters around `book` `chapter`, abandoning any previous prefetches."""
+        with self._lock:
+            self._generation += 1
+            self._target = (book, chapter)
+            self._wake.notify()
+
+    def get_next_chapter(self, book: str, chapter: Optional[int], steps: int) -> tuple[int, dict]:
+        """Like `getter.get_next_chapter()`, but served from memory if the chapter was already prefetched. A `chapter`
+        of None (a whole book) counts as its first."""
+        chapter = chapter or 1
+        try:
+            target: Optional[tuple[str, int]] = get_canon(self.translation).step(book, chapter, steps)
+        except (KeyError, ValueError):
+            target = None
+        if target is not None:
+            response: Optional[dict] = self.get(*target)
+            if response is not None:
+                return 200, response
+
+        code, response = get_next_chapter(translation=self.translation, book=book, chapter=chapter, steps=steps)
+        if code == 200:
+            first: dict = response["verses"][0]
+            self.put(first["book_id"], int(first["chapter"]), response)
+        return code, response
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+            self._wake.notify()
+
+    def _stale(self, generation: int) -> bool:
+        with self._lock:
+            return not self._running or generation != self._generation
+
+    def _work(self) -> None:
+        while True:
+            with self._lock:
+                while self._running and self._target is None:
+                    self._wake.wait()
+                if not self._running:
+                    return
+                generation: int = self._generation
+                book, chapter = self._target
+                self._target = None
+
+            try:
+                self._prefetch(generation, book, chapter)
+            except (KeyError, ValueError):
+                pass  # unknown book or chapter, nothing sensible to prefetch
+
+    def _prefetch(self, generation: int, book: str, chapter: int) -> None:
+        with priority(BACKGROUND):  # never hold up what the user is actually waiting for
+            canon = get_canon(self.translation)
+            book = canon.canonical(book)
+            for distance in range(1, self.window + 1):
+                for steps in (distance, -distance):  # nearest chapters first, forwards before backwards
+                    if self._stale(generation):
+                        break
+                    target: Optional[tuple[str, int]] = canon.step(book, chapter, steps)
+                    if target is None or self.get(*target) is not None:
+                        continue
+                    code, response = get_chapter(translation=self.translation, book=target[0],
+                                                 chapter=target[1])
+                    if code == 200:
+                        self.put(target[0], target[1], response)
@@ -0,0 +1,349 @@
+# imports - reference.py, by McSnurtle
+import re
+
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from utils.getter import CanonIndex
+
+# ===== Variables =====
+# Common abbreviations which aren't simply the start of the book's name, by canonical (USFM) book ID
+ABBREVIATIONS: dict[str, str] = {
+    "gn": "GEN", "ex": "EXO", "lv": "LEV", "nm": "NUM", "dt": "DEU", "jsh": "JOS", "jdg": "JDG", "jg": "JDG",
+    "rth": "RUT", "1sm": "1SA", "2sm": "2SA", "1kgs": "1KI", "2kgs": "2KI", "1chr": "1CH", "2chr": "2CH",
+    "nh": "NEH", "est": "EST", "jb": "JOB", "ps": "PSA", "pss": "PSA", "psalm": "PSA", "prv": "PRO", "qoh": "ECC",
+    "sos": "SNG", "sng": "SNG", "canticles": "SNG", "jer": "JER", "ezk": "EZK", "dn": "DAN", "hs": "HOS", "jl": "JOL",
+    "am": "AMO", "ob": "OBA", "jnh": "JON", "mic": "MIC", "nah": "NAM", "hb": "HAB", "zp": "ZEP", "hg": "HAG",
+    "zc": "ZEC", "ml": "MAL", "mt": "MAT", "mk": "MRK", "mrk": "MRK", "lk": "LUK", "jn": "JHN", "jhn": "JHN",
+    "rm": "ROM", "1cor": "1CO", "2cor": "2CO", "gl": "GAL", "php": "PHP", "phil": "PHP", "1thess": "1TH",
+    "2thess": "2TH", "1tm": "1TI", "2tm": "2TI", "ti": "TIT", "phm": "PHM", "phlm": "PHM", "jas": "JAS", "jm": "JAS",
+    "1pt": "1PE", "2pt": "2PE", "1jn": "1JN", "2jn": "2JN", "3jn": "3JN", "jd": "JUD", "rv": "REV", "rev": "REV"
+}
+# Books with only the one chapter, in which a bare number like "Jude 3" is a verse, as bible-api.com reads it too
+SINGLE_CHAPTER_BOOKS: frozenset[str] = frozenset({"OBA", "PHM", "2JN", "3JN", "JUD"})
+_ROMAN: dict[str, str] = {"i": "1", "ii": "2", "iii": "3", "first": "1", "second": "2", "third": "3"}
+_SPLIT = re.compile(r"^\s*((?:\d\s*)?[^\d]+?)\s*(\d[\d\s:,\-–]*)?\s*$")
+_SEGMENT = re.compile(r"^(\d+)(?::(\d+))?(?:-(\d+)(?::(\d+))?)?$")
+COMPLETIONS: int = 5  # the most books `complete_book()` offers at once
+
+
+# ===== Classes =====
+class Span(NamedTuple):
+    """A contiguous run of verses within one book. `chapter` is None for the whole book, `verse` is None to start at the
+    beginning of `chapter`, and `end_verse` is None to run to the end of `end_chapter`."""
+    book: str
+    chapter: Optional[int] = None
+    verse: Optional[int] = None
+    end_chapter: Optional[int] = None
+    end_verse: Optional[int] = None
+
+    @property
+    def chapters(self) -> range:
+        """Returns the chapter numbers this span touches (empty for a whole book)."""
+        if self.chapter is None:
+            return range(0)
+        return range(self.chapter, self.end_chapter + 1)
+
+    def contains(self, chapter: int, verse: int) -> bool:
+        if self.chapter is None:
+            return True
+        if (chapter, verse) < (self.chapter, self.verse or 0):
+            return False
+        return chapter < self.end_chapter or (chapter == self.end_chapter and
+                                              (self.end_verse is None or verse <= self.end_verse))
+
+    def __str__(self) -> str:
+        if self.chapter is None:
+            return ""
+        start: str = f"{self.chapter}" if self.verse is None else f"{self.chapter}:{self.verse}"
+        if self.end_chapter == self.chapter and self.end_verse == self.verse:
+            return start
+        if self.end_chapter == self.chapter and self.verse is not None:
+            return f"{start}-{self.end_verse}"
+        end: str = f"{self.end_chapter}" if self.end_verse is None else f"{self.end_chapter}:{self.end_verse}"
+        return f"{start}-{end}"
+
+
+class _Node:
+    """A node of the trie of `BookIndex`."""
+    __slots__ = ("children", "books", "ends")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.books: set[str] = set()  # every book with an alias running through (or ending at) this node
+        self.ends: set[str] = set()  # the books with an alias ending here
+
+
+class BookIndex:
+    """Every alias of every book of a translation (see `CanonIndex.aliases`), plus the `ABBREVIATIONS` of them, by
+    their normalized keys (see `_book_key()`).
+
+    Prefixes are completed with a walk down a trie of the keys. Misspellings are looked up in an index of every key
+    with up to `MAX_TYPOS` letters deleted: two strings within that many edits of each other always share such a
+    deletion, so a handful of dictionary lookups (and checking the few keys they turn up) finds every alias within
+    reach, in well under a millisecond and without a single request."""
+    MAX_TYPOS: int = 2
+
+    def __init__(self, canon: "CanonIndex"):
+        self._positions: dict[str, int] = {book_id: idx for idx, book_id in enumerate(canon.book_ids)}
+        self._root = _Node()
+        self._keys: dict[str, set[str]] = {}  # the books each key is an alias of
+        for alias, book_id in canon.aliases.items():
+            self._add(_book_key(alias), book_id)
+        for alias, book_id in ABBREVIATIONS.items():
+            if book_id in self._positions:
+                self._add(alias, book_id)
+        self._deletes: Optional[dict[str, set[str]]] = None  # built on the first misspelling, see `nearest()`
+
+    def _add(self, key: str, book_id: str) -> None:
+        self._keys.setdefault(key, set()).add(book_id)
+        node: _Node = self._root
+        node.books.add(book_id)
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            node.books.add(book_id)
+        node.ends.add(book_id)
+
+    def _find(self, key: str) -> Optional[_Node]:
+        node: Optional[_Node] = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _ordered(self, found: dict[str, int]) -> list[tuple[str, int]]:
+        return sorted(found.items(), key=lambda item: (item[1], self._positions[item[0]]))
+
+    @staticmethod
+    def typos(key: str) -> int:
+        """Returns how many edits away from an alias `key` may be and still be taken for it: none for the shortest keys,
+        where a single edit reaches half the canon."""
+        return 0 if len(key) < 3 else 1 if len(key) < 6 else 2
+
+    def exact(self, key: str) -> Optional[str]:
+        """Returns the book `key` is an alias of, if it's an alias of exactly one."""
+        books: set[str] = self._keys.get(key, set())
+        return next(iter(books)) if len(books) == 1 else None
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Like `exact()`, for `text` as typed rather than already normalized."""
+        return self.exact(_book_key(text))
+
+    def complete(self, key: str) -> list[str]:
+        """Returns the books with an alias starting with `key`, in canonical order."""
+        node: Optional[_Node] = self._find(key)
+        return sorted(node.books, key=self._positions.__getitem__) if node is not None and key else []
+
+    def nearest(self, key: str, prefix: bool = False) -> list[tuple[str, int]]:
+        """Returns the books with an alias at most `typos()` edits away from `key` (or with an alias starting that
+        close to `key` if `prefix`), with how many edits away, nearest first and then in canonical order."""
+        bound: int = self.typos(key)
+        if not key or not bound:
+            return []
+        if prefix:
+            return self._ordered(self._walk(key, bound))
+        if self._deletes is None:
+            self._deletes = {}
+            for alias in self._keys:
+                for variant in _deletions(alias, self.MAX_TYPOS):
+                    self._deletes.setdefault(variant, set()).add(alias)
+
+        candidates: set[str] = set()
+        for variant in _deletions(key, bound):
+            candidates.update(self._deletes.get(variant, ()))
+        found: dict[str, int] = {}
+        for alias in candidates:
+            distance: int = _distance(key, alias, bound)
+            if distance <= bound:
+                for book_id in self._keys[alias]:
+                    found[book_id] = min(found.get(book_id, distance), distance)
+        return self._ordered(found)
+
+    def _walk(self, key: str, bound: int) -> dict[str, int]:
+        """Walk the trie with a row of the edit distance table per node, skipping every branch that's already further
+        than `bound` from `key`. Returns the books an alias of which starts within `bound` of `key`."""
+        found: dict[str, int] = {}
+        limit: int = bound + 1  # anything further off is as good as infinitely far
+        stack: list[tuple[_Node, str, str, list[int], Optional[list[int]], int]] = [
+            (child, char, "", [min(idx, limit) for idx in range(len(key) + 1)], None, 1)
+            for char, child in self._root.children.items()]
+        while stack:
+            node, char, last, row, above, depth = stack.pop()
+            current: list[int] = [min(depth, limit)] + [limit] * len(key)
+            for idx in range(max(depth - bound, 1), min(depth + bound, len(key)) + 1):  # the rest can't be in bounds
+                distance: int = min(current[idx - 1] + 1, row[idx] + 1, row[idx - 1] + (key[idx - 1] != char), limit)
+                if above is not None and idx > 1 and key[idx - 1] == last and key[idx - 2] == char:
+                    distance = min(distance, above[idx - 2] + 1)  # two neighbouring letters swapped
+                current[idx] = distance
+            if current[-1] <= bound:
+                for book_id in node.books:
+                    found[book_id] = min(found.get(book_id, limit), current[-1])
+            if min(current) <= bound:
+                stack.extend((child, next_char, char, current, row, depth + 1)
+                             for next_char, child in node.children.items())
+        return found
+
+
+# ===== Functions =====
+def _book_key(text: str) -> str:
+    words: list[str] = text.lower().replace(".", " ").split()
+    if len(words) > 1 and words[0] in _ROMAN:  # i.e. "II Kings" or "First John"
+        words[0] = _ROMAN[words[0]]
+    return "".join(words)
+
+
+def _deletions(key: str, count: int) -> set[str]:
+    """Returns `key` with every combination of up to `count` of its letters deleted."""
+    variants: set[str] = {key}
+    frontier: set[str] = {key}
+    for _ in range(count):
+        frontier = {variant[:idx] + variant[idx + 1:] for variant in frontier for idx in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def _distance(a: str, b: str, bound: int) -> int:
+    """Returns how many edits (insertions, deletions, substitutions and swaps of neighbouring letters) turn `a` into
+    `b`, or `bound` + 1 as soon as it's clear it takes more than `bound`."""
+    limit: int = bound + 1
+    if abs(len(a) - len(b)) > bound:
+        return limit
+    above: Optional[list[int]] = None
+    row: list[int] = [min(j, limit) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current: list[int] = [min(i, limit)] + [limit] * len(b)
+        for j in range(max(i - bound, 1), min(i + bound, len(b)) + 1):  # further off the diagonal is out of bounds
+            distance: int = min(current[j - 1] + 1, row[j] + 1, row[j - 1] + (a[i - 1] != b[j - 1]), limit)
+            if above is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, above[j - 2] + 1)
+            current[j] = distance
+        if min(current) > bound:
+            return limit
+        above, row = row, current
+    return row[-1]
+
+
+def resolve_book(canon: "CanonIndex", text: str) -> Optional[str]:
+    """Returns the canonical ID of the book `text` refers to, by name, ID, common abbreviation, the start of a name as
+    long as only one book starts that way, or failing all that, the one book it's a slight misspelling of (see
+    `BookIndex.nearest()`). Returns None if it can't be resolved."""
+    key: str = _book_key(text)
+    if not key:
+        return None
+    index: BookIndex = canon.book_index
+    book: Optional[str] = index.exact(key)
+    if book is not None:
+        return book
+
+    matches: list[str] = index.complete(key)
+    if matches:
+        return matches[0] if len(matches) == 1 else None
+    nearest: list[tuple[str, int]] = index.nearest(key)
+    if not nearest or (len(nearest) > 1 and nearest[0][1] == nearest[1][1]):
+        return None  # nothing close, or as close to one book as to another
+    return nearest[0][0]
+
+
+def complete_book(canon: "CanonIndex", text: str) -> list[str]:
+    """Returns the canonical IDs of the books `text` could be the start of, to offer as it's typed. Nearest first if
+    it's misspelt, and nothing once it names a book outright or has moved on to the chapter.
+
+    :param canon: The index of the translation to complete book names from.
+    :type canon: CanonIndex
+    :param text: What's been typed so far, i.e. "1 Jo".
+    :type text: str
+
+    :returns: At most `COMPLETIONS` book IDs.
+    :rtype list[str]:
+    """
+    match = _SPLIT.match(text)
+    if match is None or match.group(2) is not None:
+        return []
+    key: str = _book_key(match.group(1))
+    if not key:
+        return []
+    index: BookIndex = canon.book_index
+    books: list[str] = index.complete(key) or [book for book, distance in index.nearest(key, prefix=True)]
+    named: Optional[str] = index.exact(key)
+    return [book for book in books if book != named][:COMPLETIONS]
+
+
+def _spans(book: str, passage: str, single: bool = False) -> Optional[list[Span]]:
+    """Parse the chapter and verse part of a reference, i.e. '6:3-5,8' or '3:16-4:2'. If `book` is `single` chapter,
+    bare numbers are verses of it, i.e. 'Jude 3', except for a lone '1' which is the whole chapter."""
+    spans: list[Span] = []
+    context: Optional[int] = None  # the chapter bare numbers are verses of, once a verse has been mentioned
+    for segment in passage.replace(" ", "").replace("–", "-").split(","):
+        match = _SEGMENT.match(segment)
+        if match is None:
+            return None
+        first, second, third, fourth = (int(group) if group is not None else None for group in match.groups())
+
+        if single and context is None and second is None and (first, third) != (1, None):
+            context = 1
+        if second is not None:  # C:V, C:V-V or C:V-C:V
+            chapter, verse = first, second
+            end_chapter, end_verse = (third, fourth) if fourth is not None else (chapter, third or verse)
+            context = end_chapter
+        elif context is not None:  # V or V-V, within the last chapter mentioned
+            if fourth is not None:  # V-C:V
+                chapter, verse, end_chapter, end_verse = context, first, third, fourth
+                context = end_chapter
+            else:
+                chapter, verse, end_chapter, end_verse = context, first, context, third or first
+        else:  # C, C-C or C-C:V
+            chapter, verse, end_chapter, end_verse = first, None, third or first, fourth
+            if fourth is not None:
+                context = end_chapter
+
+        if chapter < 1 or (end_chapter, end_verse or 0) < (chapter, verse or 0):
+            return None
+        spans.append(Span(book, chapter, verse, end_chapter, end_verse))
+    return spans
+
+
+def parse_reference(canon: "CanonIndex", text: str) -> Optional[list[Span]]:
+    """Parse a reference like 'matt 6:3-5,8', '1 John 3', 'Song of Solomon 2', 'John 3:16-4:2' or 'Gen 1; Exo 2'
+    into spans of canonical verses, or return None if any part of it isn't understood.
+
+    :param canon: The index of the translation to resolve book names against.
+    :type canon: CanonIndex
+    :param text: The reference to parse. Several references can be separated with ';'.
+    :type text: str
+
+    :returns: The spans the reference covers, in the order given.
+    :rtype list[Span]:
+    """
+    spans: list[Span] = []
+    for part in text.split(";"):
+        if not part.strip():
+            continue
+        match = _SPLIT.match(part)
+        if match is None:
+            return None
+        book: Optional[str] = resolve_book(canon, match.group(1))
+        if book is None:
+            return None
+        if match.group(2) is None:
+            spans.append(Span(book))
+            continue
+        single: bool = canon.chapters[book] == 1 if book in canon.chapters else book in SINGLE_CHAPTER_BOOKS
+        parsed: Optional[list[Span]] = _spans(book, match.group(2), single)
+        if parsed is None:
+            return None
+        spans.extend(parsed)
+    return spans if spans else None
+
+
+def format_reference(canon: "CanonIndex", spans: list[Span]) -> str:
+    """Returns the canonical way of writing `spans`, i.e. 'Matthew 6:3-5,8; John 3'."""
+    parts: list[str] = []
+    book: Optional[str] = None
+    for span in spans:
+        if span.book != book:
+            book = span.book
+            parts.append(f"{canon.names[book]} {span}".strip())
+        else:
+            parts[-1] += f",{span}"
+    return "; ".join(parts)
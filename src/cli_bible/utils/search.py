@@ -0,0 +1,247 @@
+# imports - search.py, by McSnurtle
+import array
+import bisect
+import math
+import os
+import re
+import struct
+
+from typing import Iterator, Optional
+
+from utils.bundle import Bundle
+
+# ===== Variables =====
+# File layout, all little endian:
+#   header    MAGIC (which includes the format version), number of verses indexed so far, number of terms
+#   lengths   one unsigned short per indexed verse: its length in tokens
+#   terms     per term: term length, UTF-8 term, document frequency, postings length, postings
+# Postings are varint encoded (verse ID delta, term frequency) pairs, so common words stay small on disk and in memory.
+MAGIC: bytes = b"CLIBIDX1"
+HEADER = struct.Struct("<8sII")
+TERM = struct.Struct("<HII")
+CHECKPOINT: int = 2048  # save the index every this many verses while building
+DECODED_CACHE: int = 256  # how many decoded posting lists to keep around for repeated queries
+K1: float = 1.2
+B: float = 0.75
+
+_TOKEN = re.compile(r"[\w']+")
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+
+# ===== Functions =====
+def tokenize(text: str) -> list[str]:
+    """Split `text` into lowercase words, ignoring punctuation and surrounding apostrophes."""
+    return [token.strip("'") for token in _TOKEN.findall(text.lower()) if token.strip("'")]
+
+
+def _encode(value: int, out: bytearray) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode(data: bytes) -> Iterator[tuple[int, int]]:
+    """Yields the (verse ID, term frequency) pairs of varint encoded `data`."""
+    values: list[int] = []
+    value: int = 0
+    shift: int = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value, shift = 0, 0
+
+    verse: int = 0
+    for idx in range(0, len(values), 2):
+        verse += values[idx]
+        yield verse, values[idx + 1]
+
+
+def index_path(bundle: Bundle) -> str:
+    """Returns where the search index of `bundle` lives: right next to it."""
+    return f"{os.path.splitext(bundle.path)[0]}.index"
+
+
+# ===== Classes =====
+class SearchIndex:
+    """A word level inverted index over the verses of an offline `Bundle`, ranked with BM25.
+
+    Queries are whitespace separated clauses which must all match (AND), unless separated by `OR`. A clause may be a
+    word, a `prefix*`, or a `"quoted phrase"`."""
+    bundle: Bundle
+    path: str
+    lengths: array.array
+    postings: dict[str, bytearray]
+    frequencies: dict[str, int]
+
+    def __init__(self, bundle: Bundle, path: Optional[str] = None):
+        self.bundle = bundle
+        self.path = path if path is not None else index_path(bundle)
+        self.lengths = array.array("H")
+        self.postings = {}
+        self.frequencies = {}
+        self._last: dict[str, int] = {}  # last verse ID in each posting list, for delta encoding when appending
+        self._terms: Optional[list[str]] = None
+        self._decoded: dict[str, list[tuple[int, int]]] = {}
+
+    @property
+    def complete(self) -> bool:
+        return len(self.lengths) >= len(self.bundle)
+
+    @classmethod
+    def open(cls, bundle: Bundle) -> "SearchIndex":
+        """Load the saved index of `bundle` and finish building it if it was interrupted part way through."""
+        index = cls(bundle)
+        if os.path.exists(index.path):
+            try:
+                index.load()
+            except (OSError, ValueError, struct.error):
+                index = cls(bundle)  # corrupt index, start over
+        if not index.complete:
+            index.build()
+        return index
+
+    def build(self) -> None:
+        """Index every verse of the bundle that isn't indexed yet, saving a checkpoint along the way."""
+        if self.postings and not self._last:  # resuming a loaded index, recover where each posting list left off
+            self._last = {term: verse for term in self.postings for verse, _ in _decode(self.postings[term])}
+        for verse_id in range(len(self.lengths), len(self.bundle)):
+            counts: dict[str, int] = {}
+            tokens: list[str] = tokenize(self.bundle.verse(verse_id)["text"])
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                if token not in self.postings:
+                    self.postings[token] = bytearray()
+                    self.frequencies[token] = 0
+                _encode(verse_id - self._last.get(token, 0), self.postings[token])
+                _encode(count, self.postings[token])
+                self._last[token] = verse_id
+                self.frequencies[token] += 1
+            self.lengths.append(min(len(tokens), 0xFFFF))
+
+            if (verse_id + 1) % CHECKPOINT == 0:
+                self.save()
+        self._terms = None
+        self._decoded.clear()
+        self.save()
+
+    def load(self) -> None:
+        with open(self.path, "rb") as fp:
+            data: bytes = fp.read()
+        magic, verse_count, term_count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a cli-bible search index.")
+
+        pos: int = HEADER.size
+        self.lengths = array.array("H", data[pos:pos + verse_count * 2])
+        pos += verse_count * 2
+        for _ in range(term_count):
+            term_length, frequency, postings_length = TERM.unpack_from(data, pos)
+            pos += TERM.size
+            term: str = data[pos:pos + term_length].decode("utf-8")
+            pos += term_length
+            self.postings[term] = bytearray(data[pos:pos + postings_length])
+            self.frequencies[term] = frequency
+            pos += postings_length
+        self._last = {}
+        self._terms = None
+
+    def save(self) -> None:
+        """Atomically write the index next to the bundle."""
+        with open(f"{self.path}.part", "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, len(self.lengths), len(self.postings)))
+            fp.write(self.lengths.tobytes())
+            for term, postings in self.postings.items():
+                encoded: bytes = term.encode("utf-8")
+                fp.write(TERM.pack(len(encoded), self.frequencies[term], len(postings)))
+                fp.write(encoded)
+                fp.write(postings)
+        os.replace(f"{self.path}.part", self.path)
+
+    def _postings(self, term: str) -> list[tuple[int, int]]:
+        """Returns the decoded (verse ID, term frequency) pairs of `term`, remembering the most recently used ones."""
+        if term in self._decoded:
+            self._decoded[term] = self._decoded.pop(term)  # move to the back, i.e. most recently used
+            return self._decoded[term]
+        if term not in self.postings:
+            return []
+        if len(self._decoded) >= DECODED_CACHE:
+            del self._decoded[next(iter(self._decoded))]
+        self._decoded[term] = list(_decode(self.postings[term]))
+        return self._decoded[term]
+
+    def _expand(self, prefix: str) -> list[str]:
+        """Returns every indexed term starting with `prefix`."""
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        terms: list[str] = []
+        for idx in range(bisect.bisect_left(self._terms, prefix), len(self._terms)):
+            if not self._terms[idx].startswith(prefix):
+                break
+            terms.append(self._terms[idx])
+        return terms
+
+    def _clause(self, clause: str, phrase: bool) -> dict[int, dict[str, int]]:
+        """Returns every verse matching `clause`, mapped to the frequencies of the terms that matched in it."""
+        words: list[str] = tokenize(clause)
+        if not words:
+            return {}
+
+        if not phrase and clause.endswith("*"):
+            terms: list[str] = self._expand(words[0])
+            matches: dict[int, dict[str, int]] = {}
+            for term in terms:
+                for verse, frequency in self._postings(term):
+                    matches.setdefault(verse, {})[term] = frequency
+            return matches
+
+        matches = {}
+        for idx, word in enumerate(words):
+            found: dict[int, int] = dict(self._postings(word))
+            if idx == 0:
+                matches = {verse: {word: frequency} for verse, frequency in found.items()}
+            else:
+                matches = {verse: {**terms, word: found[verse]} for verse, terms in matches.items() if verse in found}
+            if not matches:
+                return {}
+
+        if phrase and len(words) > 1:
+            needle: str = f" {' '.join(words)} "
+            matches = {verse: terms for verse, terms in matches.items()
+                       if needle in f" {' '.join(tokenize(self.bundle.verse(verse)['text']))} "}
+        return matches
+
+    def search(self, query: str, limit: int = 50) -> list[tuple[int, float]]:
+        """Returns up to `limit` (verse ID, score) pairs matching `query`, best first."""
+        if not self.lengths:
+            return []
+        average: float = sum(self.lengths) / len(self.lengths)
+
+        results: dict[int, dict[str, int]] = {}
+        for group in re.split(r"\s+(?:OR|\|)\s+", query.strip()):
+            matched: Optional[dict[int, dict[str, int]]] = None
+            for match in _QUERY.finditer(group):
+                phrase: bool = match.group(1) is not None
+                found: dict[int, dict[str, int]] = self._clause(match.group(1) if phrase else match.group(2), phrase)
+                if matched is None:
+                    matched = found
+                else:
+                    matched = {verse: {**terms, **found[verse]} for verse, terms in matched.items() if verse in found}
+            for verse, terms in (matched or {}).items():
+                results.setdefault(verse, {}).update(terms)
+
+        scores: list[tuple[int, float]] = []
+        for verse, terms in results.items():
+            score: float = 0
+            for term, frequency in terms.items():
+                documents: int = self.frequencies[term]
+                idf: float = math.log(1 + (len(self.lengths) - documents + 0.5) / (documents + 0.5))
+                score += idf * frequency * (K1 + 1) / (
+                        frequency + K1 * (1 - B + B * self.lengths[verse] / average))
+            scores.append((verse, score))
+        scores.sort(key=lambda result: (-result[1], result[0]))
+        return scores[:limit]
@@ -0,0 +1,89 @@
+# imports - session.py, by McSnurtle
+import json
+import os
+
+from typing import Optional
+
+from utils.config import WriteBehind, get_config
+
+# ===== Variables =====
+VERSION: int = 1
+_writer: Optional[WriteBehind] = None
+_snapshot: Optional[dict] = None  # the last one handed to `_writer`, see `save_offset()`
+
+
+# ===== Functions =====
+def session_path() -> Optional[str]:
+    """Returns where the session snapshot lives, from the "session" section of `etc/conf.json`, or None if disabled."""
+    settings: dict = get_config().get("session", {})
+    if not settings.get("enabled", True):
+        return None
+    return os.path.expanduser(settings.get("path", "~/.local/state/cli-bible/session.json"))
+
+
+def load_session(translation: str) -> Optional[dict]:
+    """Returns the snapshot saved by `save_session()`, or None if there isn't a usable one for `translation`."""
+    path: Optional[str] = session_path()
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as fp:
+            snapshot: dict = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("version") != VERSION or snapshot.get("translation") != translation.lower():
+        return None
+    return snapshot
+
+
+def save_session(translation: str, book: Optional[str], chapter: Optional[int], lines: list[str], offset: int,
+                 canon: Optional[dict] = None) -> None:
+    """Snapshot what's on screen, so the next launch can paint it before anything else is loaded.
+
+    Written in the background and at most every so often, see `config.WriteBehind`, so it's cheap to call on every
+    change.
+
+    :param translation: The translation being read.
+    :type translation: str
+    :param book: The canonical ID of the book being read, if any.
+    :type book: str
+    :param chapter: The chapter being read, if any.
+    :type chapter: int
+    :param lines: The lines of the frame.
+    :type lines: list[str]
+    :param offset: How far the frame is scrolled, see `ScrollableFrame.offset`.
+    :type offset: int
+    :param canon: The `CanonIndex.to_dict()` of the translation, so navigation works before it's rebuilt.
+    :type canon: dict
+    """
+    global _writer, _snapshot
+    if _writer is None:
+        path: Optional[str] = session_path()
+        if path is None:
+            return
+        _writer = WriteBehind(path)
+    _snapshot = {
+        "version": VERSION,
+        "translation": translation.lower(),
+        "book": book,
+        "chapter": chapter,
+        "lines": list(lines),  # a copy, as the frame carries on changing
+        "offset": offset,
+        "canon": canon
+    }
+    _writer.write(_snapshot)
+
+
+def save_offset(offset: int) -> None:
+    """Like `save_session()` when only the frame's offset changed, i.e. it was scrolled: the lines already copied for
+    the last snapshot are reused rather than copied again, so this costs the same however long the frame is."""
+    global _snapshot
+    if _writer is None or _snapshot is None:
+        return
+    _snapshot = {**_snapshot, "offset": offset}  # a new one, as the last may be being written out right now
+    _writer.write(_snapshot)
+
+
+def flush_session() -> None:
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,124 @@
+# imports - verses.py, by McSnurtle
+import array
+import sys
+
+from typing import Iterable, Iterator, Optional, Union
+
+# ===== Variables =====
+_FIELDS: frozenset[str] = frozenset(("book_id", "book_name", "chapter", "verse", "text"))
+
+
+# ===== Classes =====
+class Verse:
+    """A lightweight view of one verse of a `Chapter`. Created on demand, so it costs nothing while it isn't used.
+
+    Can be indexed like a bible-api.com verse (i.e. `verse["text"]`), so it can stand in for one wherever a verse dict
+    is only read."""
+    __slots__ = ("_chapter", "_idx")
+
+    def __init__(self, chapter: "Chapter", idx: int):
+        self._chapter = chapter
+        self._idx = idx
+
+    @property
+    def book_id(self) -> str:
+        return self._chapter.book_id
+
+    @property
+    def book_name(self) -> str:
+        return self._chapter.book_name
+
+    @property
+    def chapter(self) -> int:
+        return self._chapter.number
+
+    @property
+    def verse(self) -> int:
+        return self._chapter.numbers[self._idx]
+
+    @property
+    def text(self) -> str:
+        return self._chapter.text(self._idx)
+
+    def __getitem__(self, key: str) -> Union[str, int]:
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def line(self, include_number: bool = True) -> str:
+        """Returns the verse as a line of text, prefixed with its number unless `include_number` is False."""
+        text: str = self.text.strip()
+        return f"{self.verse} {text}" if include_number else text
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in ("book_id", "book_name", "chapter", "verse", "text")}
+
+    def __repr__(self) -> str:
+        return f"<Verse {self.book_id} {self.chapter}:{self.verse}>"
+
+
+class Chapter:
+    """The verses of one chapter, stored column wise: one string holding every verse's text back to back, and compact
+    arrays of verse numbers and text offsets. Book IDs and names are interned, so every chapter of a book shares them.
+
+    A few hundred bytes of overhead per chapter rather than per verse, so a whole book (or translation) of them stays
+    small. Behaves as a read only sequence of `Verse` views."""
+    __slots__ = ("book_id", "book_name", "number", "numbers", "_offsets", "_text")
+    book_id: str
+    book_name: str
+    number: int
+    numbers: array.array
+
+    def __init__(self, book_id: str, book_name: str, number: int):
+        self.book_id = sys.intern(book_id)
+        self.book_name = sys.intern(book_name)
+        self.number = number
+        self.numbers = array.array("H")
+        self._offsets = array.array("I", [0])
+        self._text: str = ""
+
+    @classmethod
+    def from_verses(cls, verses: Iterable[dict]) -> "Chapter":
+        """Pack the verses of one chapter, as found in a bible-api.com response, into a `Chapter`."""
+        chapter: Optional[Chapter] = None
+        texts: list[str] = []
+        for verse in verses:
+            if chapter is None:
+                chapter = cls(verse["book_id"], verse["book_name"], int(verse["chapter"]))
+            chapter.numbers.append(int(verse["verse"]))
+            texts.append(verse["text"])
+            chapter._offsets.append(chapter._offsets[-1] + len(verse["text"]))
+        if chapter is None:
+            raise ValueError("A chapter needs at least one verse.")
+        chapter._text = "".join(texts)
+        return chapter
+
+    def text(self, idx: int) -> str:
+        """Returns the text of the `idx`th verse of the chapter (counting from 0, not its verse number)."""
+        return self._text[self._offsets[idx]:self._offsets[idx + 1]]
+
+    def lines(self, include_numbers: bool = True) -> Iterator[str]:
+        """Yields each verse as a line of text, see `Verse.line()`."""
+        for idx in range(len(self.numbers)):
+            text: str = self.text(idx).strip()
+            yield f"{self.numbers[idx]} {text}" if include_numbers else text
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __getitem__(self, idx: int) -> Verse:
+        if idx < 0:
+            idx += len(self.numbers)
+        if not 0 <= idx < len(self.numbers):
+            raise IndexError("verse index out of range")
+        return Verse(self, idx)
+
+    def __iter__(self) -> Iterator[Verse]:
+        return (Verse(self, idx) for idx in range(len(self.numbers)))
+
+    def to_response(self) -> dict:
+        """Shape the chapter like a bible-api.com chapter response, without unpacking its verses."""
+        return {"reference": f"{self.book_name} {self.number}", "verses": self, "text": self._text}
+
+    def __repr__(self) -> str:
+        return f"<Chapter {self.book_id} {self.number}, {len(self)} verses>"
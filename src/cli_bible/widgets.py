@@ -1,16 +1,97 @@
 # imports, widgets.py - by Mc_Snurtle
+import bisect
 import curses
 import curses.textpad
+import os
+import queue
+import selectors
+import signal
+import sys
 import textwrap
+import threading
+import time
 
-from typing import Any
+from typing import Any, Callable, Iterable, Optional
+
+from utils import metrics
 
 # ===== Constants =====
 HORIZONTAL: int = 0
 VERTICAL: int = 1
 
 
+# ===== Functions =====
+def _overlaps(a: tuple[int, int, int, int], b: tuple[int, int, int, int]) -> bool:
+    """Returns whether the (y, x, height, width) areas `a` and `b` overlap."""
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
 # ===== Classes =====
+class Lines(list):
+    """A list of lines which remembers the lowest index changed since `clean()` was last called, so layouts built from
+    it only need redoing from there on (i.e. appending a chapter never re-wraps the chapters before it)."""
+    dirty: int
+
+    def __init__(self, lines: Iterable[str] = ()):
+        super().__init__(lines)
+        self.dirty = 0
+
+    def clean(self) -> None:
+        self.dirty = len(self)
+
+    def _touch(self, idx: int) -> None:
+        self.dirty = max(min(self.dirty, idx), 0)
+
+    def _index(self, idx: Any) -> int:
+        if isinstance(idx, slice):
+            return idx.indices(len(self))[0] if idx.step in (None, 1) else 0
+        return idx if idx >= 0 else len(self) + idx
+
+    def append(self, line: str) -> None:
+        self._touch(len(self))
+        super().append(line)
+
+    def extend(self, lines: Iterable[str]) -> None:
+        self._touch(len(self))
+        super().extend(lines)
+
+    def __iadd__(self, lines: Iterable[str]) -> "Lines":
+        self.extend(lines)
+        return self
+
+    def insert(self, idx: int, line: str) -> None:
+        self._touch(min(self._index(idx), len(self)))
+        super().insert(idx, line)
+
+    def __setitem__(self, idx: Any, value: Any) -> None:
+        self._touch(self._index(idx))
+        super().__setitem__(idx, value)
+
+    def __delitem__(self, idx: Any) -> None:
+        self._touch(self._index(idx))
+        super().__delitem__(idx)
+
+    def pop(self, idx: int = -1) -> str:
+        self._touch(self._index(idx))
+        return super().pop(idx)
+
+    def remove(self, line: str) -> None:
+        self._touch(self.index(line))
+        super().remove(line)
+
+    def clear(self) -> None:
+        self._touch(0)
+        super().clear()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        self._touch(0)
+        super().sort(*args, **kwargs)
+
+    def reverse(self) -> None:
+        self._touch(0)
+        super().reverse()
+
+
 class Widget:
     x: int
     y: int
@@ -18,15 +99,45 @@ class Widget:
     focused: bool = False
     stdscr: Any
     binds: list[int]
+    dirty: bool
+    damage: Optional[list[tuple[int, int, int, int]]]
 
     def __init__(self, stdscr, x: int, y: int):
         self.stdscr = stdscr
         self.x = x
         self.y = y
+        self.dirty = True
+        self.damage = None
 
     def update(self) -> None:
         pass
 
+    def invalidate(self, region: Optional[tuple[int, int, int, int]] = None) -> None:
+        """Mark the widget as needing a redraw on the next `Screen.update()`.
+
+        Params:
+            :param region: only this (y, x, height, width) part of the widget needs redrawing (optional, defaults to
+                all of it)
+            :type region: tuple[int, int, int, int]"""
+        if region is None:
+            self.damage = None
+        elif not self.dirty or self.damage is not None:
+            self.damage = (self.damage or []) + [region]
+        self.dirty = True
+
+    def needs_redraw(self) -> bool:
+        return self.dirty
+
+    def validate(self) -> None:
+        """Mark the widget as drawn, see `invalidate()`."""
+        self.dirty = False
+        self.damage = None
+
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        """Returns the (y, x, height, width) area of the screen this widget draws over."""
+        return self.y, self.x, 0, 0
+
     def handle_event(self, event: int) -> bool:
         """Custom event handler meant to be overwritten.
 
@@ -51,12 +162,16 @@ class Entry(Widget):
     widget_type = "Entry"
     binds = [curses.KEY_ENTER, 9, 10, 13, 27]
 
-    def __init__(self, stdscr: Any, x: int, y: int, width: int, title: str, prompt: str = "i.e. A Squirrel"):
+    def __init__(self, stdscr: Any, x: int, y: int, width: int, title: str, prompt: str = "i.e. A Squirrel",
+                 completer: Optional[Callable[[str], list[str]]] = None):
         super().__init__(stdscr, x, y)
         self.width = width
         self.title = f"{title}: "
         self.prompt = prompt
         self.contents: str = ("" if not self.prompt else self.prompt)
+        # Offers what's being typed could be completed to, listed under the box as it's typed. TAB takes the first.
+        self.completer = completer
+        self.completions: list[str] = []
 
         self.editing: bool = False
 
@@ -69,11 +184,17 @@ class Entry(Widget):
                                       self.y + 1, self.x + 1 + len(self.title))
         self.edit_win.keypad(True)
         self.textbox = curses.textpad.Textbox(self.edit_win, insert_mode=True)
+        self.hint_win = curses.newwin(1, self.width + 2, self.y + 3, self.x + len(self.title)) \
+            if self.completer is not None else None
 
     def __len__(self):
         """Returns the length in cols the entire textbox will take up including titles and borders."""
         return len(self.title) + len(self.contents) + 2
 
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        return self.y, self.x, 3 if self.hint_win is None else 4, len(self.title) + self.width + 2
+
     def update(self) -> None:
         self.title_win.noutrefresh()
         # self.outer_win.erase()
@@ -93,19 +214,53 @@ class Entry(Widget):
         curses.curs_set(1)
         self.update()
 
+        self._suggest()
         self.contents = self.textbox.edit(validate=self._enter_validator).strip()
 
         self.editing = False
+        self.completions = []
+        if self.hint_win is not None:
+            self.hint_win.erase()
+            self.hint_win.noutrefresh()
         curses.curs_set(0)
         self.update()
+        self.invalidate()  # so whatever it was drawn over gets redrawn too
         return self.contents
 
-    @classmethod
-    def _enter_validator(cls, ch: int) -> int:
-        """Allow TAB, ENTER, ESC, or CTRL+G to exit focus of an Entry()."""
+    def _enter_validator(self, ch: int) -> int:
+        """Allow TAB, ENTER, ESC, or CTRL+G to exit focus of an Entry(). TAB takes the first completion instead, if
+        there is one."""
+        if ch == 9 and self.completions:
+            self._complete(self.completions[0])
+            return 0  # handled
         if ch in (curses.KEY_ENTER, 10, 13, 9):
             return 7  # Ctrl + G
-        return ch
+        if self.completer is None:
+            return ch
+        if not self.textbox.do_command(ch):  # the key has to land before the completions of it can be worked out
+            return 7
+        self._suggest()
+        return 0
+
+    def _complete(self, completion: str) -> None:
+        """Replace what's been typed with `completion`, ready for the chapter to be typed after it."""
+        text: str = f"{completion} "[:self.width - 1]
+        self.edit_win.erase()
+        self.edit_win.addstr(0, 0, text)
+        self._suggest()
+
+    def _suggest(self) -> None:
+        """List the completions of what's been typed so far under the box."""
+        if self.completer is None:
+            return
+        self.completions = self.completer(self.get())
+        hint: str = "Tab: " + "  ".join(self.completions) if self.completions else ""
+        y, x = self.edit_win.getyx()
+        self.hint_win.erase()
+        self.hint_win.addstr(0, 0, hint[:self.width + 1])
+        self.hint_win.noutrefresh()
+        self.edit_win.move(y, x)  # back where the cursor was, rather than wherever the hint ended
+        self.edit_win.refresh()
 
     def unfocus(self) -> None:
         self.focused = False
@@ -115,6 +270,7 @@ class Entry(Widget):
             self.contents = self.prompt
         curses.curs_set(0)
         self.update()
+        self.invalidate()
 
     def handle_event(self, event: int) -> bool:
         if self.editing and event in [curses.KEY_ENTER, 10, 13, 9, 27]:  # Grok AI told me these keycodes
@@ -129,7 +285,6 @@ class Entry(Widget):
 
 class ScrollableFrame(Widget):
     offset: int
-    lines: list[str] = []
     widget_type = "ScrollableFrame"
     binds = [curses.KEY_UP, curses.KEY_DOWN, curses.KEY_PPAGE, curses.KEY_NPAGE, ord("j"), ord("k")]
     width: int
@@ -140,35 +295,112 @@ class ScrollableFrame(Widget):
 
         self.width, self.height = width, height
         self.wrapper = textwrap.TextWrapper(width=self.width - 2)
+        self._rows: list[list[str]] = []  # the wrapped rows of each line
+        self._starts: list[int] = []  # the document row each line starts at
+        self._length: int = 0
+        self._wrapped_width: int = self.wrapper.width
         self.lines = lines
 
         self.offset = 1
+        self._drawn_offset: Optional[int] = None  # the offset of what's currently in the window, if anything
+        # Only the rows in view are ever drawn (see `update()`), so a plain window does the job of the `curses.newpad()`
+        # this used to be planned as, without a pad's size limit on very long documents.
         self._window = curses.newwin(height, width)
-        # TODO: make this ^^^ a `curses.newpad()` instead, see: https://docs.python.org/3/library/curses.html#curses.newpad
+        self._window.scrollok(True)
+        self._window.idlok(True)  # let curses scroll the terminal itself rather than resend every row
+        self._window.setscrreg(1, max(height - 2, 1))
 
-    def update(self) -> None:
-        self._window.erase()
-        self._window.border()
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        return self.y, self.x, self.height, self.width
 
-        idx = 0
-        for line in self.lines:
-            f_lines = self.wrapper.wrap(text=line)
-            try:
+    def needs_redraw(self) -> bool:
+        return self.dirty or self._lines.dirty < len(self._lines) or len(self._rows) != len(self._lines)
 
-                for f_idx, f_line in enumerate(f_lines):
-                    idx += f_idx
-                    y_dest = idx + self.offset
-                    if self.height - 1 > y_dest > 0:  # don't render over window borders
-                        self._window.addstr(idx + self.offset,
-                                            1, f_line)
+    @property
+    def lines(self) -> Lines:
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines: list[str]) -> None:
+        self._lines = lines if isinstance(lines, Lines) else Lines(lines)
+        self._lines.dirty = 0
+        self.invalidate()
+
+    def _layout(self) -> None:
+        """Wrap any lines changed since the last layout, and recompute where each line starts from there on. Every line
+        takes up its wrapped rows, plus one blank row for spacing."""
+        if self.wrapper.width != self._wrapped_width:  # resized, everything needs re-wrapping
+            self._wrapped_width = self.wrapper.width
+            self._lines.dirty = 0
+        dirty: int = min(self._lines.dirty, len(self._rows))
+        if dirty >= len(self._lines) and len(self._rows) == len(self._lines):
+            return
 
-            except curses.error:  # if outside screen bounds
-                pass
+        started: float = metrics.clock()
+        del self._rows[dirty:]
+        del self._starts[dirty:]
+        row: int = self._starts[-1] + len(self._rows[-1]) + 1 if self._rows else 0
+        for line in self._lines[dirty:]:
+            self._starts.append(row)
+            self._rows.append(self._wrap(line))
+            row += len(self._rows[-1]) + 1
+        self._length = row
+        self._lines.clean()
+        metrics.record("wrap", started)
+
+    def _wrap(self, line: Any) -> list[str]:
+        """Returns the rows `line` takes up once wrapped to the width of the frame."""
+        return self.wrapper.wrap(text=line)
 
-            idx += 2
+    def update(self) -> None:
+        if self._lines.dirty < len(self._lines) or len(self._rows) != len(self._lines):
+            self.damage = None  # the content changed, so all of it needs redrawing no matter what scrolled
+        self._layout()
+
+        if self.damage is None or self._drawn_offset is None:
+            self._window.erase()
+            self._window.border()
+            self._draw_rows(1, self.height - 2)
+        else:
+            self._window.border()  # rows scrolled in come without their side borders
+            for y, x, height, width in self.damage:
+                top, bottom = max(y, 1), min(y + height - 1, self.height - 2)
+                for y_dest in range(top, bottom + 1):
+                    self._window.addstr(y_dest, 1, " " * (self.width - 2))
+                self._draw_rows(top, bottom)
+        self._drawn_offset = self.offset
 
         self._window.noutrefresh()
-        # self._window.noutrefresh(self.offset - 1, 0, self.y, self.x, self.y + self.height - 1, self.x + self.width - 1 )
+
+    def _draw_rows(self, top: int, bottom: int) -> None:
+        """Draw the document rows that land between window rows `top` and `bottom`, inclusive."""
+        first_row: int = top - self.offset
+        last_row: int = bottom - self.offset
+        idx: int = max(bisect.bisect_right(self._starts, first_row) - 1, 0)
+        while idx < len(self._rows) and self._starts[idx] <= last_row:
+            for f_idx, f_line in enumerate(self._rows[idx]):
+                y_dest = self._starts[idx] + f_idx + self.offset
+                if bottom >= y_dest >= top:  # don't render over window borders
+                    try:
+                        self._window.addstr(y_dest, 1, f_line)
+                    except curses.error:  # if outside screen bounds
+                        pass
+            idx += 1
+
+    def _scroll_to(self, offset: int) -> None:
+        """Move the view to `offset`, shifting what's already drawn and only marking the newly exposed rows damaged."""
+        delta: int = offset - self.offset
+        self.offset = offset
+        if delta == 0:
+            return
+        view: int = self.height - 2
+        if not self.needs_redraw() and self._drawn_offset is not None and abs(delta) < view:
+            self._window.scroll(-delta)
+            self._drawn_offset = offset
+            self.invalidate((1, 0, delta, self.width) if delta > 0 else (view + delta + 1, 0, -delta, self.width))
+        else:
+            self.invalidate()
 
     def handle_event(self, event: int) -> bool:
 
@@ -187,32 +419,195 @@ class ScrollableFrame(Widget):
 
     @property
     def f_lines(self) -> list[str]:
-        lines: list[str] = []
-        for line in self.lines:
-            for f_line in self.wrapper.wrap(line):
-                lines.append(f_line)
-        return lines
+        self._layout()
+        return [f_line for rows in self._rows for f_line in rows]
 
     @property
     def content_length(self) -> int:
-        lines_from_wraps: int = len(self.f_lines) - len(self.lines)
-        print("EXTRA:", lines_from_wraps)
-        return len(self.lines) * 2 + lines_from_wraps
+        """Returns the height of the whole document in rows, including the blank rows between lines."""
+        self._layout()
+        return self._length
+
+    @property
+    def rows_above(self) -> int:
+        """Returns how many rows of the document are scrolled past, above the view."""
+        return max(1 - self.offset, 0)
+
+    @property
+    def rows_below(self) -> int:
+        """Returns how many rows of the document are still to come, below the view. The blank row after the last line
+        never is, see `scroll_down()`."""
+        return max(self.content_length - 1 - (self.height - 2) - self.rows_above, 0)
+
+    def line_at(self, row: int) -> tuple[int, int]:
+        """Returns the index of the line document row `row` belongs to, and which of the line's rows it is."""
+        self._layout()
+        if not self._starts:
+            return 0, 0
+        idx: int = max(bisect.bisect_right(self._starts, row) - 1, 0)
+        return idx, row - self._starts[idx]
+
+    def line_rows(self, start: int, stop: int) -> int:
+        """Returns how many rows lines `start` up to `stop` take up, including the blank rows after each."""
+        self._layout()
+        stop = min(stop, len(self._starts))
+        if start >= stop:
+            return 0
+        return (self._starts[stop] if stop < len(self._starts) else self._length) - self._starts[start]
+
+    def top_line(self) -> tuple[int, int]:
+        """Returns the index of the line at the top of the view, and how many of its rows are scrolled past."""
+        return self.line_at(self.rows_above)
+
+    def scroll_to_line(self, idx: int, within: int = 0) -> None:
+        """Scroll so that line `idx` (or `within` rows into it) is at the top of the view."""
+        self._layout()
+        if not self._starts:
+            return
+        idx = min(max(idx, 0), len(self._starts) - 1)
+        self.offset = min(1 - (self._starts[idx] + within), 1)
+        self.invalidate()
+
+    def _shift(self, idx: int, rows: int) -> None:
+        """Move every line from `idx` on `rows` rows down the document (or up, if negative)."""
+        self._starts[idx:] = [start + rows for start in self._starts[idx:]]
+        self._length += rows
+
+    def insert_lines(self, idx: int, lines: list[str]) -> None:
+        """Insert `lines` before line `idx`, keeping what's in view where it is even if they land above it.
+
+        Only `lines` are wrapped, the layout of the rest is just shifted down past them, so prepending a chapter to a
+        long document costs about as much as appending one."""
+        top, within = self.top_line()  # which also brings the layout up to date
+        started: float = metrics.clock()
+        idx = min(max(idx, 0), len(self._lines))
+        row: int = self._starts[idx] if idx < len(self._starts) else self._length
+        rows: list[list[str]] = [self._wrap(line) for line in lines]
+        starts: list[int] = []
+        for wrapped in rows:
+            starts.append(row)
+            row += len(wrapped) + 1
+        self._shift(idx, row - (starts[0] if starts else row))
+        self._rows[idx:idx] = rows
+        self._starts[idx:idx] = starts
+        self._lines[idx:idx] = lines
+        self._lines.clean()  # laid out above already
+        metrics.record("wrap", started)
+        self.scroll_to_line(top + len(lines) if idx <= top else top, within)
+
+    def delete_lines(self, start: int, stop: int) -> None:
+        """Delete lines `start` up to `stop`, keeping what's in view where it is if they're above it. The layout of the
+        lines after them is shifted up rather than redone."""
+        top, within = self.top_line()
+        start, stop = max(start, 0), min(stop, len(self._lines))
+        if start >= stop:
+            return
+        removed: int = self.line_rows(start, stop)
+        del self._rows[start:stop]
+        del self._starts[start:stop]
+        self._shift(start, -removed)
+        del self._lines[start:stop]
+        self._lines.clean()
+        if top >= stop:
+            top -= stop - start
+        elif top >= start:
+            top, within = start, 0
+        self.scroll_to_line(top, within)
 
     def scroll_up(self, lines: int) -> None:
         if self.content_length > self.height - 2:
-            self.offset = min(self.offset + lines, 1)
-            self.update()
+            self._scroll_to(min(self.offset + lines, 1))
 
     def scroll_down(self, lines: int) -> None:
-        print("\n\n\nTOILET\n\n\n", self.content_length)
-        if len(self.lines) * 2 > self.height - 2:  # if the lines even exceed the page...
-            self.offset = max(self.offset - lines, -self.content_length + self.height)
-            self.update()
+        if self.content_length > self.height - 2:  # if the lines even exceed the page...
+            self._scroll_to(max(self.offset - lines, -self.content_length + self.height))
+
+
+class ParallelFrame(ScrollableFrame):
+    """A `ScrollableFrame` split into side by side columns, i.e. one per translation.
+
+    Each line is a tuple holding one cell per column. A line takes up as many rows as its tallest cell, so the cells of
+    a line always start on the same row and every column scrolls together."""
+    widget_type = "ParallelFrame"
+    columns: int
+    separator: str = " | "
+
+    def __init__(self, stdscr, x: int, y: int, width: int, height: int, lines: list[tuple[str, ...]], columns: int):
+        self.columns = max(columns, 1)
+        super().__init__(stdscr, x, y, width, height, lines)
+        self.column_width: int = max((self.width - 2 - len(self.separator) * (self.columns - 1)) // self.columns, 1)
+        self.cell_wrapper = textwrap.TextWrapper(width=self.column_width)
+
+    def _wrap(self, line: tuple[str, ...]) -> list[str]:
+        cells: list[list[str]] = [self.cell_wrapper.wrap(text=cell) for cell in line]
+        height: int = max((len(cell) for cell in cells), default=0)
+        return [self.separator.join((cell[row] if row < len(cell) else "").ljust(self.column_width)
+                                    for cell in cells).rstrip() for row in range(height)]
+
+
+class MetricsOverlay(Widget):
+    """A box in the top right corner of the screen showing what `utils.metrics` has measured so far: percentiles of
+    frame render, wrap and request times, how long requests were held back by the rate limit, retries, and the cache
+    hit ratio. Hidden until `toggle()`d, which also starts the measuring."""
+    widget_type = "MetricsOverlay"
+    binds = []
+    width: int = 34
+    height: int = 10
+    refresh: float = 0.5  # seconds between redraws while nothing else draws over it
+    visible: bool
+    rows: list[tuple[str, str]] = [("render", "render"), ("wrap", "wrap"), ("request", "http.request"),
+                                   ("throttle", "http.throttle")]
+
+    def __init__(self, stdscr, x: int, y: int):
+        super().__init__(stdscr, x, y)
+        self.visible = False
+        self._drawn: float = 0
+        self._window = curses.newwin(self.height, self.width, self.y, self.x)
+
+    @property
+    def bounds(self) -> tuple[int, int, int, int]:
+        return self.y, self.x, self.height, self.width
+
+    def needs_redraw(self) -> bool:
+        return self.visible and (self.dirty or time.monotonic() - self._drawn >= self.refresh)
+
+    def toggle(self) -> None:
+        """Show or hide the overlay. Whatever it covered has to be redrawn by the caller once it's hidden."""
+        self.visible = not self.visible
+        if self.visible:
+            metrics.enable()
+        self.invalidate()
+
+    def lines(self) -> list[str]:
+        """Returns the rows of text shown inside the border."""
+        lines: list[str] = [f"{'ms':<9}{'p50':>8}{'p90':>8}{'n':>7}"]
+        for label, name in self.rows:
+            timings: Optional[metrics.Series] = metrics.series(name)
+            if timings is None:
+                lines.append(f"{label:<9}{'-':>8}{'-':>8}{0:>7}")
+            else:
+                lines.append(f"{label:<9}{timings.percentile(50) * 1000:>8.2f}{timings.percentile(90) * 1000:>8.2f}"
+                             f"{timings.count:>7}")
+        throttle: Optional[metrics.Series] = metrics.series("http.throttle")
+        lines.append(f"throttled {throttle.total if throttle is not None else 0:.1f}s in total")
+        lines.append(f"{metrics.counter('http.retry')} retries, {metrics.counter('http.429')} after a 429")
+        ratio: Optional[float] = metrics.cache_ratio()
+        lines.append(f"cache hits {ratio:.0%}" if ratio is not None else "cache hits -")
+        return lines
+
+    def update(self) -> None:
+        self._window.erase()
+        self._window.border()
+        self._window.addstr(0, 2, " Metrics ")
+        for y, line in enumerate(self.lines()[:self.height - 2], start=1):
+            self._window.addstr(y, 1, line[:self.width - 2])
+        self._window.noutrefresh()
+        self._drawn = time.monotonic()
 
 
 class Screen:
     widgets: list[Widget] = []
+    overlays: list[Widget] = []
     windows: list[dict[str, Any]] = []
     current_widget: int = 0
     widget_type = "Screen"
@@ -220,30 +615,158 @@ class Screen:
     def __init__(self, stdscr):
         self.stdscr = stdscr
         curses.curs_set(0)
-        self.stdscr.nodelay(True)
+        self.stdscr.nodelay(True)  # only read once `wait_for_events()` knows there's input, then drain all of it
         self.stdscr.keypad(True)
+        self.stdscr.refresh()  # get the initial clear over with now, or the first getch() would do it over the first frame
+
+        self._posted: queue.Queue[Callable[[], Any]] = queue.Queue()
+        self._resized: bool = False
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        try:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(sys.stdin, selectors.EVENT_READ)
+            self._selector.register(self._wake_r, selectors.EVENT_READ)
+        except (OSError, ValueError):  # i.e. Windows, which can't select() on stdin
+            self._selector = None
+            self.stdscr.timeout(100)
+        if hasattr(signal, "SIGWINCH") and self._selector is not None:
+            signal.signal(signal.SIGWINCH, self._on_resize)
+
+    def _on_resize(self, signum: int, frame: Any) -> None:
+        self._resized = True
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # the pipe is full, so the loop is waking up anyway
+
+    def post(self, callback: Callable[[], Any]) -> None:
+        """Run `callback` on the UI thread as soon as the event loop wakes up. Safe to call from any thread."""
+        self._posted.put(callback)
+        self._wake()
+
+    def run_in_background(self, func: Callable[[], Any], done: Optional[Callable[[Any], Any]] = None,
+                          failed: Optional[Callable[[Exception], Any]] = None) -> threading.Thread:
+        """Run `func` on a worker thread, then hand its result to `done` on the UI thread (see `post()`). If `func`
+        raises instead, the exception goes to `failed` on the UI thread, so whatever `done` would have reset (i.e. a
+        "Loading..." status) can be reset either way; it's never printed over the screen.
+
+        Workers are daemon threads, so quitting never waits on a request that's still in flight."""
+        def work() -> None:
+            try:
+                result: Any = func()
+            except Exception as error:
+                if failed is not None:
+                    self.post(lambda error=error: failed(error))
+                return
+            if done is not None:
+                self.post(lambda: done(result))
+
+        thread = threading.Thread(target=work, name="screen-worker", daemon=True)
+        thread.start()
+        return thread
+
+    def wait_for_events(self, timeout: Optional[float] = None) -> list[int]:
+        """Sleep until there's input, a resize, or a callback from `post()`, without spinning the CPU.
+
+        Runs any posted callbacks, then returns every key pressed in the meantime.
+
+        Params:
+            :param timeout: give up waiting after this many seconds (optional, defaults to waiting forever)
+            :type timeout: float"""
+        if self._selector is not None and self._posted.empty():
+            self._selector.select(timeout)
+            try:
+                while os.read(self._wake_r, 512):
+                    pass
+            except BlockingIOError:
+                pass
+
+        while True:
+            try:
+                self._posted.get_nowait()()
+            except queue.Empty:
+                break
+
+        keys: list[int] = []
+        if self._resized:
+            self._resized = False
+            try:
+                size = os.get_terminal_size(sys.__stdout__.fileno())
+                curses.resizeterm(size.lines, size.columns)
+            except OSError:
+                pass
+            keys.append(curses.KEY_RESIZE)
+        while True:
+            key: int = self.stdscr.getch()
+            if key == -1:
+                break
+            keys.append(key)
+        return keys
+
+    def close(self) -> None:
+        """Release the event loop's resources."""
+        if self._selector is not None:
+            self._selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
 
     def add_window(self, window: Any, fill: list[int]):
         """Register a _CursesWindow to the class"""
         self.windows.append({
             "object": window,
-            "fill": fill
+            "fill": fill,
+            "dirty": True
         })
 
     def add_widget(self, widget: Widget):
         """Register a Widget to the class"""
         self.widgets.append(widget)
 
-    def update(self):
-        """Call `.update()` on all registered `Widget` objects, and refresh the screen."""
-        for window in self.windows:
-            window["object"].border()
-            window["object"].noutrefresh()
-        # [window["object"].noutrefresh() for window in self.windows]
-        [widget.update() for widget in self.widgets]
+    def add_overlay(self, widget: Widget):
+        """Register a Widget drawn over all the others, which never takes focus (i.e. `MetricsOverlay`)"""
+        self.overlays.append(widget)
 
-        self.stdscr.noutrefresh()
+    def invalidate_window(self, window: Any) -> None:
+        """Mark a registered _CursesWindow as needing a redraw on the next `update()`."""
+        for winfo in self.windows:
+            if winfo["object"] is window:
+                winfo["dirty"] = True
+
+    def update(self, force: bool = False):
+        """Call `.update()` on every registered `Widget` that needs redrawing, and refresh the screen in one go.
+
+        Params:
+            :param force: redraw everything, whether it changed or not (i.e. after a resize)
+            :type force: bool"""
+        started: float = metrics.clock()
+        drawn: bool = force
+        for window in self.windows:
+            if window["dirty"] or force:
+                window["object"].border()
+                window["object"].noutrefresh()
+                window["dirty"] = False
+                drawn = True
+
+        redrawn: list[Widget] = []
+        for widget in self.widgets + self.overlays:
+            if force or any(_overlaps(widget.bounds, other.bounds) for other in redrawn):
+                widget.invalidate()  # drawn after (so over) something that was just redrawn
+            if widget.needs_redraw():
+                widget.update()
+                widget.validate()
+                redrawn.append(widget)
+
+        if force:
+            self.stdscr.noutrefresh()
         curses.doupdate()
+        if drawn or redrawn:  # frames with nothing to draw would only drag the timings down
+            metrics.record("render", started)
 
     def resize_all(self) -> None:
         for winfo in self.windows: